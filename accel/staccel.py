@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 """Driver for accelerometer on STM32F4-Discovery board.
 
-Sets accelerometer range at +-2g.
+Sets accelerometer range at +-2g and 100 Hz sampling rate by default, which
+can be changed with ``configure()``.
 
 Returns tuple containing (X, Y, Z) axis acceleration values in 'g' units
-(9.8m/s^2).
+(9.8m/s^2). The ``raw_xyz()`` and ``mg_xyz()`` methods return integers
+(raw signed values or milli-g) instead, which don't need heap allocations for
+floats and are faster at high sampling rates.
+
+The LIS302DL outputs 8-bit values, the LIS3DSH 16-bit values, which are read
+in full resolution.
 
 See:
 
@@ -18,7 +24,18 @@ See:
 
 """
 
-from pyb import Pin, SPI
+from array import array
+
+try:
+    from pyb import Pin, SPI
+except ImportError:
+    Pin = SPI = None
+
+try:
+    const
+except NameError:
+    def const(x):
+        return x
 
 
 READWRITE_CMD = const(0x80)
@@ -28,63 +45,269 @@ OUT_X_ADDR = const(0x29)
 OUT_Y_ADDR = const(0x2b)
 OUT_Z_ADDR = const(0x2d)
 OUT_T_ADDR = const(0x0c)
+# Number of registers from OUT_X_ADDR to OUT_Z_ADDR
+OUT_XYZ_LEN = const(5)
+# Fraction bits of the fixed-point milli-g scale factors
+MG_SHIFT = const(14)
+MG_ROUND = const(1 << (MG_SHIFT - 1))
 
 LIS302DL_WHO_AM_I_VAL = const(0x3b)
 LIS302DL_CTRL_REG1_ADDR = const(0x20)
+LIS302DL_CTRL_REG3_ADDR = const(0x22)
 # Configuration for 100Hz sampling rate, +-2g range
 LIS302DL_CONF = const(0b01000111)
+# Data rate bit of CTRL_REG1 for each sampling rate
+LIS302DL_RATES = {100: 0, 400: 0x80}
+# Full scale bit of CTRL_REG1 and mg per digit for each range in g
+LIS302DL_RANGES = {2: (0, 18), 8: (0x20, 72)}
+# Data ready signal on INT1
+LIS302DL_CTRL_REG3_DRDY = const(0b00000100)
 
 LIS3DSH_WHO_AM_I_VAL = const(0x3f)
 LIS3DSH_CTRL_REG4_ADDR = const(0x20)
+LIS3DSH_CTRL_REG3_ADDR = const(0x23)
 LIS3DSH_CTRL_REG5_ADDR = const(0x24)
+LIS3DSH_CTRL_REG6_ADDR = const(0x25)
+LIS3DSH_OUT_X_L_ADDR = const(0x28)
+LIS3DSH_FIFO_CTRL_ADDR = const(0x2e)
+LIS3DSH_FIFO_SRC_ADDR = const(0x2f)
+# Number of registers from OUT_X_L to OUT_Z_H
+LIS3DSH_OUT_XYZ_LEN = const(6)
+# ODR bits of CTRL_REG4 for each sampling rate (3 and 6 are 3.125, 6.25 Hz)
+LIS3DSH_RATES = {3: 0x10, 6: 0x20, 12: 0x30, 25: 0x40, 50: 0x50, 100: 0x60,
+                 400: 0x70, 800: 0x80, 1600: 0x90}
+# FSCALE bits of CTRL_REG5 and mg per digit for each range in g
+LIS3DSH_RANGES = {2: (0x00, 0.06), 4: (0x08, 0.12), 6: (0x10, 0.18),
+                  8: (0x18, 0.24), 16: (0x20, 0.73)}
+# Data ready signal on INT1, active high
+LIS3DSH_CTRL_REG3_DRDY = const(0b11001000)
+# INT1 enabled, active high, for FIFO watermark
+LIS3DSH_CTRL_REG3_INT1 = const(0b01001000)
+# FIFO and watermark enabled, watermark interrupt on INT1, auto-increment
+LIS3DSH_CTRL_REG6_FIFO = const(0b01110100)
+# Stream mode: FIFO keeps the newest 32 samples
+LIS3DSH_FIFO_STREAM = const(0b01000000)
+LIS3DSH_FIFO_SIZE = const(32)
 # Configuration for 100Hz sampling rate, +-2g range
 LIS3DSH_CTRL_REG4_CONF = const(0b01100111)
 LIS3DSH_CTRL_REG5_CONF = const(0b00000000)
+# Register address auto-increment for multiple byte reads
+LIS3DSH_CTRL_REG6_CONF = const(0b00010000)
+
+
+def _signed(value):
+    return value - 256 if value & 0x80 else value
+
+
+def _signed16(low, high):
+    value = low | high << 8
+    return value - 65536 if value & 0x8000 else value
+
+
+class LIS302DL:
+    """Register map and settings of the LIS302DL (8-bit output)."""
+
+    name = 'LIS302DL'
+    who_am_i = LIS302DL_WHO_AM_I_VAL
+    rates = LIS302DL_RATES
+    ranges = LIS302DL_RANGES
+    bits = 8
+    fifo = False
+    # First output register for burst reads and number of output registers
+    out_addr = OUT_X_ADDR
+    out_len = OUT_XYZ_LEN
+    # Auto-increment is selected by a bit of the command byte
+    multi = MULTIPLEBYTE_CMD
+    ctrl_reg3 = LIS302DL_CTRL_REG3_ADDR
+    drdy = LIS302DL_CTRL_REG3_DRDY
+
+    @staticmethod
+    def init_regs():
+        return ()
+
+    @staticmethod
+    def config_regs(rate, fs):
+        return ((LIS302DL_CTRL_REG1_ADDR,
+                 LIS302DL_CONF | LIS302DL_RATES[rate] |
+                 LIS302DL_RANGES[fs][0]),)
+
+
+class LIS3DSH:
+    """Register map and settings of the LIS3DSH (16-bit output, FIFO)."""
+
+    name = 'LIS3DSH'
+    who_am_i = LIS3DSH_WHO_AM_I_VAL
+    rates = LIS3DSH_RATES
+    ranges = LIS3DSH_RANGES
+    bits = 16
+    fifo = True
+    out_addr = LIS3DSH_OUT_X_L_ADDR
+    out_len = LIS3DSH_OUT_XYZ_LEN
+    # Auto-increment is enabled in CTRL_REG6, the bit used for it by the
+    # LIS302DL is part of the register address
+    multi = 0
+    ctrl_reg3 = LIS3DSH_CTRL_REG3_ADDR
+    drdy = LIS3DSH_CTRL_REG3_DRDY
+
+    @staticmethod
+    def init_regs():
+        return ((LIS3DSH_CTRL_REG6_ADDR, LIS3DSH_CTRL_REG6_CONF),)
+
+    @staticmethod
+    def config_regs(rate, fs):
+        return ((LIS3DSH_CTRL_REG4_ADDR,
+                 LIS3DSH_CTRL_REG4_CONF & 0x0F | LIS3DSH_RATES[rate]),
+                (LIS3DSH_CTRL_REG5_ADDR,
+                 LIS3DSH_CTRL_REG5_CONF | LIS3DSH_RANGES[fs][0]))
+
+
+CHIPS = {LIS302DL_WHO_AM_I_VAL: LIS302DL, LIS3DSH_WHO_AM_I_VAL: LIS3DSH}
 
 
 class STAccel:
-    def __init__(self, cs='PE3', spi=1, debug=False):
+    """Driver for the LIS302DL or LIS3DSH accelerometer.
+
+    ``cs`` is the name of the chip select pin or a pin object, ``spi`` the
+    number of the SPI bus or a configured ``pyb.SPI`` object. ``rate`` is the
+    output data rate in Hz and ``range`` the full scale range in g. The
+    detected chip is available as ``chip`` (``LIS302DL`` or ``LIS3DSH``).
+
+    """
+
+    def __init__(self, cs='PE3', spi=1, debug=False, rate=100, range=2):
         self._debug = debug
-        self.cs_pin = Pin(cs, Pin.OUT_PP, Pin.PULL_NONE)
+
+        if isinstance(cs, str):
+            cs = Pin(cs, Pin.OUT_PP, Pin.PULL_NONE)
+
+        self.cs_pin = cs
         self.cs_pin.high()
-        self.spi = SPI(spi, SPI.MASTER, baudrate=328125, polarity=0, phase=1,
-                       bits=8)
+
+        if isinstance(spi, int):
+            spi = SPI(spi, SPI.MASTER, baudrate=328125, polarity=0, phase=1,
+                      bits=8)
+
+        self.spi = spi
+        self.rate = rate
+        self.range = range
+        self.sensitivity = 0
+        # Milli-g per raw digit and per digit of the high byte << MG_SHIFT
+        self._scale = self._scale_hi = 0
+        self._mg = array('i', [0, 0, 0])
 
         self.read_id()
         # First SPI read always returns 255 --> discard and read ID again
         self.who_am_i = self.read_id()
         self.debug("Accel-ID: %s" % self.who_am_i)
+        self.chip = chip = CHIPS.get(self.who_am_i)
 
-        if self.who_am_i == LIS302DL_WHO_AM_I_VAL:
-            self.write_bytes(LIS302DL_CTRL_REG1_ADDR, LIS302DL_CONF)
-            self.sensitivity = 18
-        elif self.who_am_i == LIS3DSH_WHO_AM_I_VAL:
-            self.write_bytes(LIS3DSH_CTRL_REG4_ADDR, LIS3DSH_CTRL_REG4_CONF)
-            self.write_bytes(LIS3DSH_CTRL_REG5_ADDR, LIS3DSH_CTRL_REG5_CONF)
-            self.sensitivity = 0.06 * 256
-        else:
+        if chip is None:
             msg = 'LIS302DL or LIS3DSH accelerometer not present'
 
             if self._debug:
                 self.debug(msg)
+                chip = LIS302DL
             else:
                 raise IOError(msg)
 
+        # Settings of the read path, which don't change with configure()
+        self.rates = chip.rates
+        self.ranges = chip.ranges
+        self._multi = chip.multi
+        self._bits16 = chip.bits == 16
+        # Index of the (high) byte of X in the buffer returned by read_raw()
+        self.high_byte_offset = 2 if self._bits16 else 1
+        # Command and data bytes for burst reads of the output registers
+        self._tx = bytearray(1 + chip.out_len)
+        self._rx = bytearray(1 + chip.out_len)
+        self._tx[0] = chip.out_addr | READWRITE_CMD | chip.multi
+
+        if self.chip is not None:
+            for addr, value in chip.init_regs():
+                self.write_bytes(addr, value)
+
+            self.configure(rate, range)
+
+    @property
+    def has_fifo(self):
+        return self.chip is not None and self.chip.fifo
+
+    def configure(self, rate=None, range=None):
+        """Set output data rate in Hz and/or full scale range in g.
+
+        Supported values are the keys of ``rates`` and ``ranges``. The scale
+        factors for converting samples are calculated here, so the read path
+        doesn't depend on the configuration.
+
+        """
+        rate = self.rate if rate is None else rate
+        range = self.range if range is None else range
+
+        if rate not in self.rates:
+            raise ValueError("Unsupported rate for this chip: %r" % rate)
+
+        if range not in self.ranges:
+            raise ValueError("Unsupported range for this chip: %r" % range)
+
+        for addr, value in self.chip.config_regs(rate, range):
+            self.write_bytes(addr, value)
+
+        mg = self.ranges[range][1]
+        self.rate = rate
+        self.range = range
+        self.sensitivity = mg
+        self._scale = int(mg * (1 << MG_SHIFT) + 0.5)
+        mg_hi = mg * 256 if self._bits16 else mg
+        self._scale_hi = int(mg_hi * (1 << MG_SHIFT) + 0.5)
+
+    def set_rate(self, rate):
+        """Set output data rate in Hz (one of the keys of ``rates``)."""
+        self.configure(rate=rate)
+
+    def set_range(self, range):
+        """Set full scale range in g (one of the keys of ``ranges``)."""
+        self.configure(range=range)
+
+    def enable_data_ready(self, enable=True):
+        """Signal new samples on the INT1 pin."""
+        self.write_bytes(self.chip.ctrl_reg3, self.chip.drdy if enable else 0)
+
     def debug(self, *msg):
         if self._debug:
             print(" ".join(str(m) for m in msg))
 
-    def _convert_raw_to_g(self, x):
-        if x & 0x80:
-            x -= 256
+    def to_mg(self, raw):
+        """Convert a signed raw value to milli-g (an int)."""
+        return (raw * self._scale + MG_ROUND) >> MG_SHIFT
 
-        return x * self.sensitivity / 1000
+    def convert_mg(self, buf, out=None, count=None, high_bytes=False):
+        """Convert signed raw values in ``buf`` to milli-g.
+
+        The results are stored in ``out`` or, if not given, in ``buf`` itself,
+        which then must be able to hold them, e.g. an ``array('h')``. Converts
+        ``count`` values or all of them and returns ``out``. Pass
+        ``high_bytes=True`` for 8-bit values, which are only the high bytes of
+        16-bit samples, like the ones collected by ``STAccelSampler``.
+
+        """
+        if out is None:
+            out = buf
+
+        if count is None:
+            count = len(buf)
+
+        scale = self._scale_hi if high_bytes else self._scale
+
+        for i in range(count):
+            out[i] = (buf[i] * scale + MG_ROUND) >> MG_SHIFT
+
+        return out
 
     def read_bytes(self, addr, nbytes):
         self.cs_pin.low()
 
         if nbytes > 1:
-            self.spi.send(addr | READWRITE_CMD | MULTIPLEBYTE_CMD)
+            self.spi.send(addr | READWRITE_CMD | self._multi)
         else:
             self.spi.send(addr | READWRITE_CMD)
 
@@ -98,7 +321,7 @@ class STAccel:
             buf = bytes(buf)
 
         if not isinstance(buf, int) and len(buf) > 1:
-            addr |= MULTIPLEBYTE_CMD
+            addr |= self._multi
 
         self.cs_pin.low()
         self.spi.send(addr)
@@ -108,14 +331,85 @@ class STAccel:
     def read_id(self):
         return self.read_bytes(WHO_AM_I_ADDR, 1)[0]
 
+    def read_axis(self, axis):
+        """Return the signed raw value of axis 0 (X), 1 (Y) or 2 (Z)."""
+        if self._bits16:
+            buf = self.read_bytes(LIS3DSH_OUT_X_L_ADDR + 2 * axis, 2)
+            return _signed16(buf[0], buf[1])
+
+        return _signed(self.read_bytes(OUT_X_ADDR + 2 * axis, 1)[0])
+
+    # The float API scales raw values directly, as milli-g would round
+    # away the small values of 16-bit chips
     def x(self):
-        return self._convert_raw_to_g(self.read_bytes(OUT_X_ADDR, 1)[0])
+        return self.read_axis(0) * self.sensitivity / 1000
 
     def y(self):
-        return self._convert_raw_to_g(self.read_bytes(OUT_Y_ADDR, 1)[0])
+        return self.read_axis(1) * self.sensitivity / 1000
 
     def z(self):
-        return self._convert_raw_to_g(self.read_bytes(OUT_Z_ADDR, 1)[0])
+        return self.read_axis(2) * self.sensitivity / 1000
+
+    def read_raw(self):
+        """Read all output registers in one transfer into the receive buffer.
+
+        Returns the buffer, which is overwritten by the next read. The (high)
+        bytes of the X, Y and Z axes are at index ``high_byte_offset``,
+        ``high_byte_offset + 2`` and ``high_byte_offset + 4``. On 16-bit
+        chips, the low bytes precede them.
+
+        """
+        self.cs_pin.low()
+        self.spi.send_recv(self._tx, self._rx)
+        self.cs_pin.high()
+        return self._rx
+
+    def raw_xyz(self, out=None):
+        """Return signed raw values of all three axes.
+
+        The axes are read in one multiple byte transfer. If ``out`` is given,
+        e.g. an ``array('h', [0, 0, 0])``, the values are stored in it and it
+        is returned instead of a new tuple. This applies to ``mg_xyz()`` and
+        ``xyz()`` as well.
+
+        """
+        rx = self.read_raw()
+
+        if self._bits16:
+            x = _signed16(rx[1], rx[2])
+            y = _signed16(rx[3], rx[4])
+            z = _signed16(rx[5], rx[6])
+        else:
+            x = _signed(rx[1])
+            y = _signed(rx[3])
+            z = _signed(rx[5])
+
+        if out is None:
+            return (x, y, z)
+
+        out[0] = x
+        out[1] = y
+        out[2] = z
+        return out
+
+    def mg_xyz(self, out=None):
+        """Return acceleration of all three axes in milli-g (ints)."""
+        if out is None:
+            mg = self.convert_mg(self.raw_xyz(self._mg))
+            return (mg[0], mg[1], mg[2])
+
+        self.raw_xyz(out)
+        return self.convert_mg(out, count=3)
+
+    def xyz(self, out=None):
+        """Return acceleration of all three axes in g."""
+        raw = self.raw_xyz(self._mg)
+        g = self.sensitivity / 1000
+
+        if out is None:
+            return (raw[0] * g, raw[1] * g, raw[2] * g)
 
-    def xyz(self):
-        return (self.x(), self.y(), self.z())
+        out[0] = raw[0] * g
+        out[1] = raw[1] * g
+        out[2] = raw[2] * g
+        return out
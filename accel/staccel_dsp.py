@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""Integer signal processing for accelerometer sample blocks.
+
+All stages work on blocks of interleaved X, Y, Z integer values, e.g. an
+``array('h')`` filled by ``STAccelSampler.read_into()`` and converted with
+``STAccel.convert_mg()``, and keep their state between calls, so a stream
+of samples can be processed block by block. Only integer arithmetic is used
+and no objects are allocated per sample.
+
+Usage::
+
+    from array import array
+    from staccel import STAccel
+    from staccel_sampler import STAccelSampler
+    from staccel_dsp import LowPass, TapDetector, tilt
+
+    accel = STAccel()
+    sampler = STAccelSampler(accel, rate=400)
+    smooth = LowPass(shift=3)
+    taps = TapDetector(threshold=800)
+    buf = array('h', bytes(2 * 3 * 32))
+    sampler.start()
+
+    while True:
+        n = 3 * sampler.read_into(buf)
+        accel.convert_mg(buf, count=n, high_bytes=True)
+
+        if taps.process(buf, n):
+            print("Tap!")
+
+        smooth.process(buf, n)
+        pitch, roll = tilt(buf[n - 3], buf[n - 2], buf[n - 1])
+
+Angles are in tenths of degrees.
+
+"""
+
+import math
+from array import array
+
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
+
+# Fraction bits of the IIR filter state
+FRAC_BITS = const(8)
+# Resolution of the arctangent table (entries per unit of y / x)
+ATAN_STEPS = const(64)
+# atan(i / ATAN_STEPS) in tenths of degrees for i = 0 .. ATAN_STEPS
+ATAN_TABLE = array('H', [int(math.degrees(math.atan(i / ATAN_STEPS)) * 10 +
+                             0.5) for i in range(ATAN_STEPS + 1)])
+
+
+def _scratch(buf, count):
+    """Return ``buf`` or a new ``array('i')``, if it holds less than count."""
+    # Grows to the largest block size once, then is reused
+    if len(buf) < count:
+        return array('i', bytes(4 * count))
+
+    return buf
+
+
+def _atan_ratio(num, den):
+    """Return atan(num / den) for 0 <= num <= den, den > 0."""
+    pos = num * ATAN_STEPS
+    i = pos // den
+    angle = ATAN_TABLE[i]
+
+    if i < ATAN_STEPS:
+        # Linear interpolation between table entries
+        angle += (ATAN_TABLE[i + 1] - angle) * (pos - i * den) // den
+
+    return angle
+
+
+def atan2(y, x):
+    """Return the angle of the vector (x, y) in tenths of degrees.
+
+    The result is in the range -1800 to 1800, like ``math.atan2()``.
+
+    """
+    ax = -x if x < 0 else x
+    ay = -y if y < 0 else y
+
+    if not ax and not ay:
+        return 0
+
+    if ay <= ax:
+        angle = _atan_ratio(ay, ax)
+    else:
+        angle = 900 - _atan_ratio(ax, ay)
+
+    if x < 0:
+        angle = 1800 - angle
+
+    return -angle if y < 0 else angle
+
+
+def hypot(a, b):
+    """Return the integer square root of a * a + b * b."""
+    a = -a if a < 0 else a
+    b = -b if b < 0 else b
+    n = a * a + b * b
+
+    # a + b / 2 (for a >= b) is never below the result, so Newton's method
+    # needs only a few steps
+    x = a + (b >> 1) if a >= b else b + (a >> 1)
+
+    if not x:
+        return 0
+
+    y = (x + n // x) >> 1
+
+    while y < x:
+        x = y
+        y = (x + n // x) >> 1
+
+    return x
+
+
+def tilt(x, y, z):
+    """Return (pitch, roll) in tenths of degrees from one sample."""
+    return atan2(-x, hypot(y, z)), atan2(y, z)
+
+
+def tilt_into(buf, out, count=None):
+    """Compute (pitch, roll) of all samples in ``buf`` into ``out``.
+
+    ``out`` receives two values per sample. ``count`` is the number of
+    values in ``buf`` to process (default: all). Returns the number of
+    samples.
+
+    """
+    if count is None:
+        count = len(buf)
+
+    j = 0
+
+    for i in range(0, count - 2, 3):
+        x = buf[i]
+        y = buf[i + 1]
+        z = buf[i + 2]
+        out[j] = atan2(-x, hypot(y, z))
+        out[j + 1] = atan2(y, z)
+        j += 2
+
+    return j >> 1
+
+
+class LowPass:
+    """First order IIR low-pass filter for each channel.
+
+    Computes ``y += (x - y) / 2**shift``, which has a cut-off frequency of
+    about ``rate / (2 * pi * 2**shift)``. The state keeps ``FRAC_BITS``
+    fraction bits, so small signals are not lost to truncation. The filter
+    starts from the first sample to avoid a step response.
+
+    """
+
+    def __init__(self, shift=3, channels=3):
+        self.shift = shift
+        self.channels = channels
+        self.state = array('i', bytes(4 * channels))
+        self._primed = False
+
+    def reset(self):
+        self._primed = False
+
+    def _prime(self, buf):
+        for c in range(self.channels):
+            self.state[c] = buf[c] << FRAC_BITS
+
+        self._primed = True
+
+    def process(self, buf, count=None, out=None):
+        """Filter ``count`` values of ``buf`` into ``out`` (default: ``buf``).
+
+        Returns ``out``.
+
+        """
+        if out is None:
+            out = buf
+
+        if count is None:
+            count = len(buf)
+
+        if not count:
+            return out
+
+        if not self._primed:
+            self._prime(buf)
+
+        state = self.state
+        shift = self.shift
+        channels = self.channels
+
+        for c in range(channels):
+            s = state[c]
+
+            for i in range(c, count, channels):
+                s += ((buf[i] << FRAC_BITS) - s) >> shift
+                out[i] = s >> FRAC_BITS
+
+            state[c] = s
+
+        return out
+
+
+class HighPass(LowPass):
+    """First order IIR high-pass filter for each channel.
+
+    Outputs the difference between the input and a ``LowPass`` filter of
+    it, i.e. removes gravity and slow movements.
+
+    """
+
+    def __init__(self, shift=3, channels=3):
+        super().__init__(shift, channels)
+        self._low = array('i')
+
+    def process(self, buf, count=None, out=None):
+        if out is None:
+            out = buf
+
+        if count is None:
+            count = len(buf)
+
+        self._low = low = _scratch(self._low, count)
+        super().process(buf, count, low)
+
+        for i in range(count):
+            out[i] = buf[i] - low[i]
+
+        return out
+
+
+class MovingAverage:
+    """Moving average of the last ``length`` samples for each channel.
+
+    The samples are kept in a ring buffer with a running sum per channel,
+    so the cost per sample doesn't depend on ``length``.
+
+    """
+
+    def __init__(self, length=8, channels=3):
+        self.length = length
+        self.channels = channels
+        self.ring = array('i', bytes(4 * length * channels))
+        self.sums = array('i', bytes(4 * channels))
+        self._pos = 0
+        self._primed = False
+
+    def reset(self):
+        self._primed = False
+
+    def process(self, buf, count=None, out=None):
+        """Average ``count`` values of ``buf`` into ``out`` (default: ``buf``).
+
+        Returns ``out``.
+
+        """
+        if out is None:
+            out = buf
+
+        if count is None:
+            count = len(buf)
+
+        if not count:
+            return out
+
+        ring = self.ring
+        sums = self.sums
+        length = self.length
+        channels = self.channels
+
+        if not self._primed:
+            # Start as if the first sample had been repeated
+            for c in range(channels):
+                for k in range(c, length * channels, channels):
+                    ring[k] = buf[c]
+
+                sums[c] = buf[c] * length
+
+            self._primed = True
+
+        for c in range(channels):
+            total = sums[c]
+            pos = self._pos
+
+            for i in range(c, count, channels):
+                k = pos * channels + c
+                x = buf[i]
+                total += x - ring[k]
+                ring[k] = x
+                out[i] = total // length
+                pos += 1
+
+                if pos == length:
+                    pos = 0
+
+            sums[c] = total
+
+        self._pos = (self._pos + count // channels) % length
+        return out
+
+
+class TapDetector:
+    """Detect short acceleration peaks (taps) in blocks of X, Y, Z samples.
+
+    The input is high-pass filtered internally (the buffer is not changed)
+    and a tap is detected, when the sum of the absolute values of the axes
+    exceeds ``threshold`` for at most ``duration`` samples. After a tap,
+    further peaks are ignored for ``quiet`` samples. ``threshold`` is in the
+    units of the input values, e.g. milli-g.
+
+    """
+
+    def __init__(self, threshold=1000, duration=8, quiet=40, shift=4):
+        self.threshold = threshold
+        self.duration = duration
+        self.quiet = quiet
+        self.taps = 0
+        # Index of the start of the last detected event in the stream
+        self.last = -1
+        self._filter = HighPass(shift)
+        self._buf = array('i')
+        self._above = 0
+        self._holdoff = 0
+        self._index = 0
+
+    def process(self, buf, count=None):
+        """Process ``count`` values of ``buf``. Returns the number of taps."""
+        taps = self._detect(buf, count)
+        self.taps += taps
+        return taps
+
+    def _pulse(self, start, width):
+        """Return True if a pulse of ``width`` samples is an event."""
+        return width <= self.duration
+
+    def _detect(self, buf, count):
+        """Find pulses above the threshold, return the number of events."""
+        if count is None:
+            count = len(buf)
+
+        self._buf = hp = _scratch(self._buf, count)
+        self._filter.process(buf, count, hp)
+        threshold = self.threshold
+        above = self._above
+        holdoff = self._holdoff
+        index = self._index
+        events = 0
+
+        for i in range(0, count - 2, 3):
+            x = hp[i]
+            y = hp[i + 1]
+            z = hp[i + 2]
+            mag = ((-x if x < 0 else x) + (-y if y < 0 else y) +
+                   (-z if z < 0 else z))
+
+            if holdoff:
+                holdoff -= 1
+            elif mag > threshold:
+                above += 1
+            elif above:
+                if self._pulse(index - above, above):
+                    events += 1
+                    self.last = index - above
+                    holdoff = self.quiet
+
+                above = 0
+
+            index += 1
+
+        self._above = above
+        self._holdoff = holdoff
+        self._index = index
+        return events
+
+
+class ShakeDetector(TapDetector):
+    """Detect shaking in blocks of X, Y, Z samples.
+
+    A shake is detected, when the high-pass filtered acceleration (sum of
+    the absolute values of the axes) rises above ``threshold`` at least
+    ``peaks`` times within ``window`` samples. It is reported at the end of
+    the last peak. After a shake, detection pauses for ``quiet`` samples.
+
+    """
+
+    def __init__(self, threshold=1500, peaks=4, window=200, quiet=100,
+                 shift=3):
+        super().__init__(threshold, quiet=quiet, shift=shift)
+        self.peaks = peaks
+        self.window = window
+        self.shakes = 0
+        # Sample indexes of the previous peaks - 1 peaks
+        self._peaks = array('i', [-window] * (peaks - 1))
+        self._peak = 0
+
+    def process(self, buf, count=None):
+        """Process ``count`` values of ``buf``. Returns the shake count."""
+        shakes = self._detect(buf, count)
+        self.shakes += shakes
+        return shakes
+
+    def _pulse(self, start, width):
+        peaks = self._peaks
+        n = len(peaks)
+
+        if not n:
+            return True
+
+        # Compare with the peak self.peaks - 1 peaks back, which is the
+        # oldest in the ring and replaced
+        oldest = peaks[self._peak]
+        peaks[self._peak] = start
+        self._peak = (self._peak + 1) % n
+
+        if start - oldest < self.window:
+            for k in range(n):
+                peaks[k] = start - self.window
+
+            return True
+
+        return False
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""Interrupt-driven sampling of the STM32F4-Discovery accelerometer.
+
+Samples are collected into a preallocated ring buffer of signed 8-bit raw
+values (X, Y, Z interleaved), triggered by the INT1 pin of the accelerometer
+(PE0 on the STM32F4-Discovery). On the LIS3DSH, the chip's 32-sample FIFO is
+used and the interrupt only fires when ``watermark`` samples are stored, which
+are then fetched in a single SPI transfer. Only the high bytes of its 16-bit
+samples are stored (see ``STAccel.convert_mg(..., high_bytes=True)``).
+
+Usage::
+
+    from staccel import STAccel
+    from staccel_sampler import STAccelSampler
+
+    sampler = STAccelSampler(STAccel(), rate=400)
+    sampler.start()
+
+    while True:
+        for x, y, z in sampler:
+            process(x, y, z)
+
+Or with asyncio::
+
+    async def consumer():
+        async for x, y, z in sampler:
+            process(x, y, z)
+
+"""
+
+from array import array
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+try:
+    from pyb import Pin
+except ImportError:
+    Pin = None
+
+try:
+    from micropython import schedule
+except ImportError:
+    # CPython (tests): no interrupts, so poll at once
+    def schedule(func, arg):
+        func(arg)
+
+from staccel import (LIS3DSH_CTRL_REG3_ADDR, LIS3DSH_CTRL_REG3_INT1,
+                     LIS3DSH_CTRL_REG6_ADDR, LIS3DSH_CTRL_REG6_CONF,
+                     LIS3DSH_CTRL_REG6_FIFO, LIS3DSH_FIFO_CTRL_ADDR,
+                     LIS3DSH_FIFO_SIZE, LIS3DSH_FIFO_SRC_ADDR,
+                     LIS3DSH_FIFO_STREAM, LIS3DSH_OUT_X_L_ADDR, READWRITE_CMD,
+                     _signed)
+
+# Cleared after waking up, so an Event will do without ThreadSafeFlag
+ThreadSafeFlag = getattr(asyncio, 'ThreadSafeFlag', asyncio.Event)
+
+# FIFO_SRC bits
+FIFO_OVERRUN = 0x40
+FIFO_COUNT = 0x1F
+# Bytes per sample in FIFO burst reads (OUT_X_L .. OUT_Z_H)
+FIFO_SAMPLE = 6
+
+
+class STAccelSampler:
+    """Collect accelerometer samples into a ring buffer of ``size`` samples.
+
+    ``pin`` is the name or object of the input pin connected to INT1 of the
+    accelerometer. ``watermark`` is the number of samples, which the LIS3DSH
+    collects in its FIFO before it raises the interrupt (1 to 31, 0 disables
+    the FIFO). The LIS302DL has no FIFO and signals each new sample.
+
+    When the ring buffer is full, new samples are dropped and counted in
+    ``overruns``. Samples lost because the FIFO of the chip overflowed are
+    counted in ``fifo_overruns``.
+
+    """
+
+    def __init__(self, accel, size=256, rate=400, pin='PE0', watermark=16):
+        self.accel = accel
+        self.size = size
+        self.rate = rate
+        self.watermark = watermark if accel.has_fifo else 0
+        self.pin = Pin(pin, Pin.IN) if isinstance(pin, str) else pin
+        self.ring = array('b', bytes(3 * size))
+        self.overruns = 0
+        self.fifo_overruns = 0
+        self.samples = 0
+        # Read and write position in ring (in samples)
+        self._head = 0
+        self._tail = 0
+        self._count = 0
+        self._running = False
+        self._flag = ThreadSafeFlag()
+        nbytes = 1 + FIFO_SAMPLE * LIS3DSH_FIFO_SIZE if self.watermark else 1
+        self._tx = bytearray(nbytes)
+        self._rx = bytearray(nbytes)
+        self._rxmv = memoryview(self._rx)
+        self._txmv = memoryview(self._tx)
+        self._src = bytearray(2)
+        self._src_cmd = bytearray((LIS3DSH_FIFO_SRC_ADDR | READWRITE_CMD, 0))
+        # Passed to schedule() in interrupt context, where _poll would
+        # allocate a new bound method
+        self._poll_cb = self._poll
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._count:
+            raise StopIteration
+
+        return self._pop()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._count:
+            await self._flag.wait()
+            self._flag.clear()
+
+        return self._pop()
+
+    def start(self):
+        """Configure the accelerometer and start sampling."""
+        accel = self.accel
+        accel.set_rate(self.rate)
+
+        if self.watermark:
+            accel.write_bytes(LIS3DSH_FIFO_CTRL_ADDR,
+                              LIS3DSH_FIFO_STREAM | self.watermark)
+            accel.write_bytes(LIS3DSH_CTRL_REG6_ADDR, LIS3DSH_CTRL_REG6_FIFO)
+            accel.write_bytes(LIS3DSH_CTRL_REG3_ADDR, LIS3DSH_CTRL_REG3_INT1)
+        else:
+            accel.enable_data_ready()
+
+        self._running = True
+        self.pin.irq(handler=self._irq, trigger=self.pin.IRQ_RISING)
+        # Fetch samples, which are already waiting, so INT1 goes low again
+        if self.pin.value():
+            self._poll(None)
+
+    def stop(self):
+        """Stop sampling. Samples in the ring buffer can still be read."""
+        self._running = False
+        self.pin.irq(handler=None)
+        accel = self.accel
+
+        if self.watermark:
+            accel.write_bytes(LIS3DSH_CTRL_REG3_ADDR, 0)
+            accel.write_bytes(LIS3DSH_CTRL_REG6_ADDR, LIS3DSH_CTRL_REG6_CONF)
+            accel.write_bytes(LIS3DSH_FIFO_CTRL_ADDR, 0)
+        else:
+            accel.enable_data_ready(False)
+
+    def read_into(self, buf):
+        """Move up to len(buf) // 3 samples into buf (X, Y, Z interleaved).
+
+        Returns the number of samples.
+
+        """
+        ring = self.ring
+        n = min(len(buf) // 3, self._count)
+        tail = self._tail
+
+        for i in range(3 * n):
+            buf[i] = ring[3 * tail + i % 3]
+
+            if i % 3 == 2:
+                tail = (tail + 1) % self.size
+
+        self._tail = tail
+        self._count -= n
+        return n
+
+    def clear(self):
+        self._tail = self._head
+        self._count = 0
+
+    def _pop(self):
+        ring = self.ring
+        pos = 3 * self._tail
+        self._tail = (self._tail + 1) % self.size
+        self._count -= 1
+        return (ring[pos], ring[pos + 1], ring[pos + 2])
+
+    def _irq(self, pin):
+        # Runs in interrupt context: read samples later
+        try:
+            schedule(self._poll_cb, None)
+        except RuntimeError:
+            pass
+
+    def _poll(self, arg):
+        """Fetch all available samples from the accelerometer."""
+        if not self._running:
+            return
+
+        if self.watermark:
+            self._read_fifo()
+        else:
+            rx = self.accel.read_raw()
+            high = self.accel.high_byte_offset
+            self._put(rx[high], rx[high + 2], rx[high + 4])
+
+        self._flag.set()
+
+        # No new rising edge, if more data arrived while reading
+        if self.pin.value():
+            self._irq(self.pin)
+
+    def _read_fifo(self):
+        accel = self.accel
+        accel.cs_pin.low()
+        accel.spi.send_recv(self._src_cmd, self._src)
+        accel.cs_pin.high()
+        src = self._src[1]
+
+        if src & FIFO_OVERRUN:
+            self.fifo_overruns += 1
+
+        count = src & FIFO_COUNT
+
+        if not count:
+            return
+
+        # Address wraps from OUT_Z_H to OUT_X_L while the FIFO is enabled
+        nbytes = 1 + FIFO_SAMPLE * count
+        tx = self._txmv[:nbytes]
+        tx[0] = LIS3DSH_OUT_X_L_ADDR | READWRITE_CMD
+        accel.cs_pin.low()
+        accel.spi.send_recv(tx, self._rxmv[:nbytes])
+        accel.cs_pin.high()
+        rx = self._rx
+
+        for pos in range(1, nbytes, FIFO_SAMPLE):
+            # High bytes of X, Y and Z
+            self._put(rx[pos + 1], rx[pos + 3], rx[pos + 5])
+
+    def _put(self, x, y, z):
+        self.samples += 1
+
+        if self._count == self.size:
+            self.overruns += 1
+            return
+
+        ring = self.ring
+        pos = 3 * self._head
+        ring[pos] = _signed(x)
+        ring[pos + 1] = _signed(y)
+        ring[pos + 2] = _signed(z)
+        self._head = (self._head + 1) % self.size
+        self._count += 1
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Simulated LIS302DL / LIS3DSH accelerometer on a SPI bus.
+
+Implements the register file, the read / write bit and register address
+auto-increment of both chips. As observed on the STM32F4-Discovery board,
+the first read after creating the bus returns 0xFF.
+
+Samples added with ``push_sample()`` drive the INT1 pin (data ready) or, on
+the LIS3DSH with the FIFO enabled, go into the 32-sample FIFO, which raises
+INT1 when the watermark is reached.
+
+"""
+
+LIS302DL = 0x3B
+LIS3DSH = 0x3F
+READ = 0x80
+FIFO_SIZE = 32
+
+
+class MockPin:
+    """INT1 input pin with the ``pyb.Pin`` interrupt methods."""
+
+    IRQ_RISING = 1
+
+    def __init__(self):
+        self.level = 0
+        self.handler = None
+
+    def irq(self, handler=None, trigger=IRQ_RISING):
+        self.handler = handler
+
+    def value(self):
+        return self.level
+
+    def drive(self, level):
+        rising = level and not self.level
+        self.level = level
+
+        if rising and self.handler:
+            self.handler(self)
+
+
+class MockCS:
+    def __init__(self, chip):
+        self.chip = chip
+        self.state = 1
+
+    def low(self):
+        self.state = 0
+        self.chip.select()
+
+    def high(self):
+        if not self.state:
+            self.state = 1
+            self.chip.deselect()
+
+
+class MockSPI:
+    """Bus interface with the ``pyb.SPI`` methods used by STAccel."""
+
+    def __init__(self, chip):
+        self.chip = chip
+        self.calls = 0
+
+    def send(self, data):
+        self.calls += 1
+        self.chip.transfer(bytes([data]) if isinstance(data, int)
+                           else bytes(data))
+
+    def recv(self, recv):
+        self.calls += 1
+        buf = bytearray(recv) if isinstance(recv, int) else recv
+        buf[:] = self.chip.transfer(bytes(len(buf)))
+        return buf
+
+    def send_recv(self, send, recv):
+        self.calls += 1
+        recv[:] = self.chip.transfer(bytes(send))
+        return recv
+
+
+class MockLIS:
+    def __init__(self, who_am_i=LIS3DSH):
+        self.who_am_i = who_am_i
+        self.regs = bytearray(128)
+        self.regs[0x0F] = who_am_i
+        self.cs = MockCS(self)
+        self.spi = MockSPI(self)
+        self.int1 = MockPin()
+        self.transactions = 0
+        self.fifo = []
+        self.overrun = False
+        self.data_ready = False
+        self._first = True
+        self._cmd = None
+
+    def set_xyz(self, x, y, z):
+        """Set output registers from signed 16-bit values."""
+        for i, value in enumerate((x, y, z)):
+            value &= 0xFFFF
+            self.regs[0x28 + 2 * i] = value & 0xFF
+            self.regs[0x29 + 2 * i] = value >> 8
+
+    def push_sample(self, x, y, z):
+        """Output a new sample from signed 16-bit values."""
+        if self._fifo_enabled():
+            if len(self.fifo) == FIFO_SIZE:
+                # Stream mode: the oldest sample is overwritten
+                del self.fifo[0]
+                self.overrun = True
+
+            self.fifo.append((x, y, z))
+        else:
+            self.set_xyz(x, y, z)
+            self.data_ready = True
+
+        self._update_int1()
+
+    def _fifo_enabled(self):
+        return self.who_am_i == LIS3DSH and self.regs[0x25] & 0x40
+
+    def _update_int1(self):
+        if self.who_am_i == LIS302DL:
+            level = self.data_ready and self.regs[0x22] & 0x04
+        elif self._fifo_enabled():
+            wtm = self.regs[0x2E] & 0x1F
+            level = (self.regs[0x23] & 0x08 and self.regs[0x25] & 0x04 and
+                     len(self.fifo) >= wtm)
+        else:
+            level = self.data_ready and self.regs[0x23] & 0x80
+
+        self.int1.drive(1 if level else 0)
+
+    def _read(self, addr):
+        if addr == 0x2F:
+            count = len(self.fifo)
+            wtm = self.regs[0x2E] & 0x1F
+            value = ((0x80 if count >= wtm else 0) |
+                     (0x40 if self.overrun else 0) |
+                     (0x20 if not count else 0) | min(count, 0x1F))
+            self.overrun = False
+            return value
+
+        if self._fifo_enabled() and 0x28 <= addr <= 0x2D:
+            if not self.fifo:
+                return 0
+
+            value = self.fifo[0][(addr - 0x28) // 2] & 0xFFFF
+
+            if addr == 0x2D:
+                del self.fifo[0]
+
+            return value >> 8 if addr & 1 else value & 0xFF
+
+        if addr == 0x2D:
+            self.data_ready = False
+
+        return self.regs[addr]
+
+    def _auto_increment(self, cmd):
+        if self.who_am_i == LIS302DL:
+            return bool(cmd & 0x40)
+
+        # LIS3DSH: ADD_INC bit of CTRL_REG6
+        return bool(self.regs[0x25] & 0x10)
+
+    def _address(self, cmd):
+        return cmd & (0x3F if self.who_am_i == LIS302DL else 0x7F)
+
+    def select(self):
+        self._cmd = None
+
+    def deselect(self):
+        if self._cmd is not None:
+            self.transactions += 1
+
+        self._update_int1()
+
+    def transfer(self, data):
+        """Clock bytes in and return the bytes clocked out."""
+        out = bytearray(len(data))
+
+        for i, byte in enumerate(data):
+            if self._cmd is None:
+                self._cmd = byte
+                self._addr = self._address(byte)
+                out[i] = 0xFF
+                continue
+
+            if self._cmd & READ:
+                if self._first:
+                    out[i] = 0xFF
+                    self._first = False
+                else:
+                    out[i] = self._read(self._addr)
+            else:
+                out[i] = 0xFF
+                self.regs[self._addr] = byte
+
+            if self._auto_increment(self._cmd):
+                if self._addr == 0x2D and self._fifo_enabled():
+                    # Rolls over to the next sample in the FIFO
+                    self._addr = 0x28
+                else:
+                    self._addr = (self._addr + 1) & 0x7F
+
+        return bytes(out)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the accelerometer signal processing stages."""
+
+import sys
+sys.path.insert(0, '..')
+
+import math
+from array import array
+
+from staccel_dsp import (HighPass, LowPass, MovingAverage, ShakeDetector,
+                         TapDetector, atan2, hypot, tilt, tilt_into)
+
+
+def block(samples):
+    return array('h', [v for sample in samples for v in sample])
+
+
+def test_atan2():
+    for deg in range(-179, 181, 7):
+        rad = math.radians(deg)
+        x, y = int(1000 * math.cos(rad)), int(1000 * math.sin(rad))
+        assert abs(atan2(y, x) - 10 * math.degrees(math.atan2(y, x))) <= 2
+
+    assert atan2(0, 0) == 0
+    assert atan2(5, 0) == 900
+    assert atan2(0, -5) == 1800
+
+
+def test_hypot_and_tilt():
+    for a, b in ((0, 0), (3, 4), (-1000, 1), (1234, -987), (7, 7)):
+        assert hypot(a, b) == int(math.sqrt(a * a + b * b))
+
+    assert tilt(0, 0, 1000) == (0, 0)
+    pitch, roll = tilt(-500, 0, 866)
+    assert abs(pitch - 300) <= 2 and roll == 0
+    out = array('h', bytes(2 * 4))
+    assert tilt_into(block([(0, 0, 1000), (0, 1000, 0)]), out) == 2
+    assert list(out) == [0, 0, 0, 900]
+
+
+def test_low_pass_block_equals_stream():
+    samples = [(i * 37 % 200, -i * 11 % 90, 1000) for i in range(60)]
+    buf = block(samples)
+    LowPass(shift=2).process(buf)
+    lp = LowPass(shift=2)
+    blocks = block(samples)
+
+    for start in range(0, len(blocks), 12):
+        out = array('h', bytes(2 * 12))
+        lp.process(blocks[start:start + 12], out=out)
+        blocks[start:start + 12] = out
+
+    assert blocks == buf
+    # Constant input passes unchanged
+    assert list(buf[2::3]) == [1000] * 60
+
+
+def test_high_pass_removes_offset():
+    buf = block([(1000, -200, 50)] * 10 + [(1500, -200, 50)])
+    HighPass(shift=2).process(buf)
+    assert list(buf[:30]) == [0] * 30
+    assert buf[30] == 375 and buf[31:] == array('h', [0, 0])
+
+
+def test_moving_average():
+    avg = MovingAverage(length=4, channels=1)
+    buf = array('h', [8, 8, 8, 0, 0])
+    assert list(avg.process(buf)) == [8, 8, 8, 6, 4]
+    buf = array('h', [0, 0, 4])
+    assert list(avg.process(buf)) == [2, 0, 1]
+
+
+def test_tap_detector():
+    rest = [(0, 0, 1000)] * 50
+    tap = [(0, 0, 3000), (0, 0, 2500)]
+    det = TapDetector(threshold=800)
+    assert det.process(block(rest)) == 0
+    assert det.process(block(tap + rest)) == 1
+    assert det.last == 50
+    # A long push isn't a tap
+    assert det.process(block([(0, 0, 3000)] * 30 + rest)) == 0
+    assert det.taps == 1
+
+
+def test_shake_detector():
+    # One peak each
+    shake = [(3000, 0, 1000)] * 2 + [(0, 0, 1000)] * 8
+    rest = [(0, 0, 1000)] * 20
+    det = ShakeDetector(threshold=1500, peaks=4, window=100)
+    assert det.process(block(rest + shake * 3)) == 0
+    assert det.process(block(shake + rest)) == 1
+    assert det.last == 50
+    assert det.shakes == 1
+    # Peaks too far apart
+    det = ShakeDetector(threshold=1500, peaks=4, window=100)
+    assert det.process(block(rest + (shake + rest * 2) * 4)) == 0
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for interrupt-driven sampling with STAccelSampler."""
+
+import sys
+sys.path.insert(0, '..')
+
+import asyncio
+from array import array
+
+import staccel_sampler
+from staccel import STAccel
+from staccel_sampler import STAccelSampler
+from mocklis import LIS302DL, LIS3DSH, MockLIS
+
+scheduled = []
+
+
+def setup_module():
+    staccel_sampler.schedule = lambda func, arg: scheduled.append((func, arg))
+
+
+def run_scheduled():
+    while scheduled:
+        func, arg = scheduled.pop(0)
+        func(arg)
+
+
+def make_sampler(who_am_i=LIS3DSH, **kwargs):
+    chip = MockLIS(who_am_i)
+    accel = STAccel(chip.cs, chip.spi)
+    del scheduled[:]
+    return chip, STAccelSampler(accel, pin=chip.int1, **kwargs)
+
+
+def push(chip, first, count):
+    for i in range(first, first + count):
+        chip.push_sample(i << 8, -i << 8, (i + 50) << 8)
+        run_scheduled()
+
+
+def test_data_ready():
+    chip, sampler = make_sampler(LIS302DL, rate=400)
+    sampler.start()
+    assert chip.regs[0x20] & 0x80
+    assert chip.regs[0x22] == 0x04
+    push(chip, 1, 10)
+    assert len(sampler) == 10
+    assert list(sampler) == [(i, -i, i + 50) for i in range(1, 11)]
+    assert len(sampler) == 0
+    sampler.stop()
+    assert chip.regs[0x22] == 0
+
+
+def test_fifo_watermark():
+    chip, sampler = make_sampler(LIS3DSH, rate=1600, watermark=8)
+    sampler.start()
+    assert chip.regs[0x20] >> 4 == 9
+    assert chip.regs[0x2E] == 0x48
+    push(chip, 1, 7)
+    assert len(sampler) == 0
+    transactions = chip.transactions
+    push(chip, 8, 1)
+    assert len(sampler) == 8
+    # FIFO_SRC and one burst read of all samples
+    assert chip.transactions == transactions + 2
+    push(chip, 9, 12)
+    assert list(sampler) == [(i, -i, i + 50) for i in range(1, 17)]
+    assert len(chip.fifo) == 4
+    sampler.stop()
+    assert not chip.regs[0x25] & 0x40
+
+
+def test_overruns():
+    chip, sampler = make_sampler(LIS3DSH, size=20, watermark=10)
+    sampler.start()
+    # Not read in time: the FIFO overflows
+    chip.int1.handler = None
+    push(chip, 1, 40)
+    chip.int1.handler = sampler._irq
+    sampler._poll(None)
+    run_scheduled()
+    assert sampler.fifo_overruns == 1
+    assert sampler.samples == 31
+    # Ring buffer is full, the rest is dropped
+    assert len(sampler) == 20
+    assert sampler.overruns == 11
+    buf = array('b', bytes(3 * 8))
+    assert sampler.read_into(buf) == 8
+    assert list(buf[:3]) == [9, -9, 59]
+    assert len(sampler) == 12
+
+
+def test_async_consumer():
+    chip, sampler = make_sampler(LIS302DL)
+    sampler.start()
+    received = []
+
+    async def consumer():
+        async for sample in sampler:
+            received.append(sample)
+
+            if len(received) == 5:
+                break
+
+    async def producer():
+        for i in range(5):
+            await asyncio.sleep(0)
+            push(chip, i, 1)
+
+    async def main():
+        await asyncio.gather(consumer(), producer())
+
+    asyncio.run(main())
+    assert received == [(i, -i, i + 50) for i in range(5)]
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the STAccel accelerometer driver."""
+
+import sys
+sys.path.insert(0, '..')
+
+from array import array
+
+from staccel import STAccel
+from mocklis import LIS302DL, LIS3DSH, MockLIS
+
+
+def make_accel(who_am_i=LIS3DSH):
+    chip = MockLIS(who_am_i)
+    return chip, STAccel(chip.cs, chip.spi)
+
+
+def approx(values, expected):
+    return all(abs(v - e) < 1e-6 for v, e in zip(values, expected))
+
+
+def test_init():
+    chip, accel = make_accel(LIS302DL)
+    assert accel.who_am_i == LIS302DL
+    assert chip.regs[0x20] == 0b01000111
+    chip, accel = make_accel(LIS3DSH)
+    assert chip.regs[0x20] == 0b01100111
+    assert chip.regs[0x25] & 0x10
+
+
+def test_xyz_burst_read():
+    for who_am_i in (LIS302DL, LIS3DSH):
+        chip, accel = make_accel(who_am_i)
+        chip.set_xyz(10 << 8, -20 << 8, 56 << 8)
+        expected = (accel.x(), accel.y(), accel.z())
+        assert expected[0] > 0 and expected[1] < 0
+        count = chip.transactions
+        assert approx(accel.xyz(), expected)
+        # One transaction instead of three
+        assert chip.transactions == count + 1
+
+
+def test_xyz_into_array():
+    chip, accel = make_accel(LIS302DL)
+    chip.set_xyz(1 << 8, 2 << 8, -3 << 8)
+    out = array('f', [0, 0, 0])
+    assert accel.xyz(out) is out
+    assert approx(out, (0.018, 0.036, -0.054))
+
+
+def test_integer_api():
+    chip, accel = make_accel(LIS302DL)
+    chip.set_xyz(1 << 8, -2 << 8, 56 << 8)
+    assert accel.raw_xyz() == (1, -2, 56)
+    assert accel.mg_xyz() == (18, -36, 1008)
+    out = array('h', [0, 0, 0])
+    assert accel.mg_xyz(out) is out
+    assert list(out) == [18, -36, 1008]
+    chip, accel = make_accel(LIS3DSH)
+    chip.set_xyz(65 << 8, -65 << 8, 0)
+    assert accel.mg_xyz() == (998, -998, 0)
+    assert approx(accel.xyz(), (0.9984, -0.9984, 0))
+
+
+def test_convert_mg_in_place():
+    chip, accel = make_accel(LIS302DL)
+    buf = array('h', [0, 1, -1, 127, -128, 5])
+    assert accel.convert_mg(buf, count=5) is buf
+    assert list(buf) == [0, 18, -18, 2286, -2304, 5]
+    raw = array('b', [3, -3, 100])
+    assert list(accel.convert_mg(raw, array('h', [0] * 3))) == [54, -54, 1800]
+
+
+def test_lis3dsh_16_bit():
+    chip, accel = make_accel(LIS3DSH)
+    assert accel.chip.name == 'LIS3DSH'
+    chip.set_xyz(1000, -1, 0x1234)
+    assert accel.raw_xyz() == (1000, -1, 0x1234)
+    assert accel.mg_xyz() == (60, 0, 280)
+    assert accel.read_axis(2) == 0x1234
+    assert approx((accel.x(), accel.y(), accel.z()),
+                  (0.06, -0.00006, 0.2796))
+    # Burst read of OUT_X_L .. OUT_Z_H
+    assert len(accel._rx) == 7
+    rx = accel.read_raw()
+    high = accel.high_byte_offset
+    assert (rx[high], rx[high + 2], rx[high + 4]) == (0x03, 0xFF, 0x12)
+
+
+def test_small_values_in_g():
+    chip, accel = make_accel(LIS3DSH)
+    # Less than 1 mg at 0.06 mg per digit
+    chip.set_xyz(1, -8, 0)
+    assert accel.mg_xyz() == (0, 0, 0)
+    assert approx(accel.xyz(), (0.00006, -0.00048, 0))
+    assert approx((accel.x(), accel.y()), (0.00006, -0.00048))
+    assert accel.x() > 0
+
+
+def test_configure():
+    chip, accel = make_accel(LIS3DSH)
+    accel.configure(rate=800, range=16)
+    assert chip.regs[0x20] == 0x87
+    assert chip.regs[0x24] == 0x20
+    chip.set_xyz(1000, 0, 0)
+    assert accel.mg_xyz()[0] == 730
+    assert accel.convert_mg(array('b', [100]), array('h', [0]),
+                            high_bytes=True)[0] == 18688
+    chip, accel = make_accel(LIS302DL)
+    accel.set_range(8)
+    assert chip.regs[0x20] == 0b01100111
+    chip.set_xyz(10 << 8, 0, 0)
+    assert accel.mg_xyz()[0] == 720
+
+    for kwargs in ({'rate': 800}, {'range': 4}):
+        try:
+            accel.configure(**kwargs)
+        except ValueError:
+            pass
+        else:
+            assert False, "ValueError not raised"
@@ -11,7 +11,16 @@ Based on:
 
 """
 
-import pyb
+try:
+    import pyb
+except ImportError:
+    # Only needed for the default pin setup and delays
+    pyb = None
+
+try:
+    import stm
+except ImportError:
+    stm = None
 
 try:
     const
@@ -23,13 +32,14 @@ HIGH = 1
 LOW = 0
 
 # Timing constants
-E_PULSE = const(1)
 E_DELAY = const(50)
+# Max. number of busy flag reads before giving up
+BUSY_TIMEOUT = const(1000)
 
 # Pin names, don't change
 PIN_NAMES = ('RS', 'EN', 'D4', 'D5', 'D6', 'D7')
 # Pin mode, push-pull control
-PIN_MODE = pyb.Pin.OUT_PP
+PIN_MODE = pyb.Pin.OUT_PP if pyb else None
 
 # Command / character mode
 LCD_CHR = HIGH
@@ -74,17 +84,235 @@ LCD_5x10DOTS = const(0x04)
 LCD_5x8DOTS = const(0x00)
 
 
+def encode(text):
+    """Return bytes of the character codes of a str, one byte per character.
+
+    Codes above 0x7F select characters of the HD44780 character ROM, e.g.
+    ``'\xdf'`` is the degree sign, so text must not be encoded as UTF-8.
+
+    """
+    if isinstance(text, str):
+        return bytes(ord(c) for c in text)
+
+    return text
+
+
+def bsrr_table(bits, extra=0):
+    """Return GPIO BSRR register values for all 16 possible nibble values.
+
+    ``bits`` are the bit numbers of the D4-D7 pins within their GPIO port.
+    Each value sets the bits of the pins, which should be high, and resets
+    the bits of the others. Bits set in ``extra`` are set in every value.
+
+    """
+    table = []
+
+    for nibble in range(16):
+        value = extra
+
+        for i, bit in enumerate(bits):
+            if nibble >> i & 1:
+                value |= 1 << bit
+            else:
+                value |= 1 << (bit + 16)
+
+        table.append(value)
+
+    return tuple(table)
+
+
+class GPIOBus:
+    """Send data to the LCD controller via six GPIO output pins.
+
+    ``pins`` is a sequence of pin objects for RS, EN and D4-D7, in this order.
+    They only need to provide a ``value`` method, so any object with a
+    compatible interface, e.g. a mock for testing, can be used.
+
+    If the R/W pin of the controller is connected to a GPIO pin instead of
+    ground, pass its pin object as ``rw`` to enable reading the busy flag.
+    The data pins then also need an ``init`` method to change their mode.
+
+    Other bus backends must provide the ``set_mode()`` and ``write_nibble()``
+    methods and the ``batch`` and ``can_read`` attributes. If ``batch`` is
+    true, they must also provide ``write(data, mode)``, which sends a sequence
+    of bytes, keeping within the execution time of each instruction itself.
+    If ``can_read`` is true, they must provide ``read_busy()``.
+
+    """
+
+    # Bytes are sent one by one with a delay after each
+    batch = False
+
+    def __init__(self, pins, rw=None):
+        self.pins = tuple(pins)
+        rs, en, d4, d5, d6, d7 = self.pins
+        self.rw = rw
+        self.can_read = rw is not None
+        # Cache bound methods to save attribute lookups when sending data
+        self._rs = rs.value
+        self._en = en.value
+        self._data = (d4.value, d5.value, d6.value, d7.value)
+        self._reading = False
+        self._en(LOW)
+
+        if rw is not None:
+            self._rw = rw.value
+            self._rw(LOW)
+
+    def set_mode(self, mode):
+        """Set RS pin to send a command (LCD_CMD) or data (LCD_CHR).
+
+        Must be called before sending data after ``read_busy()``, since it
+        switches the data pins back to outputs.
+
+        """
+        if self._reading:
+            self._rw(LOW)
+            self._set_data_dir(True)
+            self._reading = False
+
+        self._rs(mode)
+
+    def read_busy(self):
+        """Read the busy flag of the controller and return it.
+
+        The data pins are left as inputs until the next call to
+        ``set_mode()``, so repeated reads only need to pulse EN.
+
+        """
+        en = self._en
+
+        if not self._reading:
+            self._rs(LCD_CMD)
+            self._set_data_dir(False)
+            self._rw(HIGH)
+            self._reading = True
+
+        en(HIGH)
+        busy = self._data[3]()
+        en(LOW)
+        # The second nibble holds the lower bits of the address counter
+        en(HIGH)
+        en(LOW)
+        return busy
+
+    def write_nibble(self, nibble):
+        """Set data pins D4-7 to the lower four bits of nibble and pulse EN.
+
+        The overhead of a Python method call is larger than the minimum
+        enable pulse width (450 ns), so no explicit delay is needed.
+
+        """
+        d4, d5, d6, d7 = self._data
+        d4(nibble & 1)
+        d5(nibble >> 1 & 1)
+        d6(nibble >> 2 & 1)
+        d7(nibble >> 3 & 1)
+        en = self._en
+        en(HIGH)
+        en(LOW)
+
+    def _set_data_dir(self, output):
+        """Switch data pins D4-D7 to output or input mode."""
+        for pin in self.pins[2:]:
+            pin.init(pin.OUT if output else pin.IN)
+
+
+class PortBus(GPIOBus):
+    """Send data to the LCD controller with GPIO port register writes.
+
+    Only works on STM32 MCUs and requires D4-D7 to be on the same GPIO port.
+    All four data pins are set with a single write to the port's BSRR
+    register, using a pre-computed table of register values. If EN is on the
+    same port as well, it is raised in the same write. The direction of the
+    data pins is switched with a single write to the port's MODER register.
+
+    """
+
+    def __init__(self, pins, rw=None):
+        en = pins[1]
+        data = pins[2:]
+        port = data[0].port()
+        base = getattr(stm, 'GPIO' + 'ABCDEFGHIJK'[port])
+        self._bsrr = base + stm.GPIO_BSRR
+        self._moder = base + stm.GPIO_MODER
+        self._moder_mask = sum(3 << 2 * pin.pin() for pin in data)
+        self._moder_out = sum(1 << 2 * pin.pin() for pin in data)
+        en_bit = 1 << en.pin() if en.port() == port else 0
+        self._en_reset = en_bit << 16
+        self.table = bsrr_table([pin.pin() for pin in data], en_bit)
+        super().__init__(pins, rw)
+
+    def write_nibble(self, nibble):
+        """Set data pins D4-7 to the lower four bits of nibble and pulse EN."""
+        stm.mem32[self._bsrr] = self.table[nibble & 0xF]
+
+        if self._en_reset:
+            stm.mem32[self._bsrr] = self._en_reset
+        else:
+            en = self._en
+            en(HIGH)
+            en(LOW)
+
+    def _set_data_dir(self, output):
+        """Switch data pins D4-D7 to output or input mode."""
+        mem32 = stm.mem32
+        value = mem32[self._moder] & ~self._moder_mask
+        mem32[self._moder] = value | self._moder_out if output else value
+
+
+def _init_pin(pin):
+    if pyb and isinstance(pin, (str, pyb.Pin)):
+        return pyb.Pin(pin, PIN_MODE)
+
+    return pin
+
+
+def gpio_bus(pins, rw=None):
+    """Return the fastest available GPIO bus backend for given pins.
+
+    ``pins`` is a sequence of pin names or pin objects for RS, EN and D4-D7,
+    in this order. ``rw`` is the optional pin name or object for R/W. Pin
+    names and ``pyb.Pin`` instances are (re-)initialized as outputs.
+
+    """
+    pins = [_init_pin(pin) for pin in pins]
+
+    if rw is not None:
+        rw = _init_pin(rw)
+
+    if (stm and all(hasattr(pin, 'port') for pin in pins) and
+            len(set(pin.port() for pin in pins[2:])) == 1):
+        return PortBus(pins, rw)
+
+    return GPIOBus(pins, rw)
+
+
 class HD44780:
-    """Interface to a HD44780 LCD controller in 4-bit mode."""
+    """Interface to a HD44780 LCD controller in 4-bit mode.
+
+    The controller is connected via the GPIO pins given by ``pins`` (see
+    ``gpio_bus()``) or, if given, via the bus backend instance ``bus``.
+
+    If the bus can read from the controller, i.e. the R/W pin is connected
+    (see the ``rw`` argument), the busy flag is polled before each instruction
+    instead of waiting for the worst-case execution time after it.
+
+    """
 
     _default_pins = ('Y1', 'Y2', 'Y3', 'Y4', 'Y5', 'Y6')
     row_offsets = (0x00, 0x40, 0x14, 0x54)
 
-    def __init__(self, width=16, lines=2, pins=None, init=True):
-        """Initialize instance and dictionary of output pin objects."""
-        # Initialize dict of pin objects
-        self.pins = {name: pyb.Pin(pin, PIN_MODE) for name, pin in
-                     zip(PIN_NAMES, pins if pins else self._default_pins)}
+    def __init__(self, width=16, lines=2, pins=None, init=True, bus=None,
+                 rw=None):
+        """Initialize instance and bus backend."""
+        self.bus = bus if bus else gpio_bus(pins if pins else
+                                            self._default_pins, rw)
+        # Poll busy flag instead of using fixed delays?
+        self._poll_busy = self.bus.can_read
+        # Send strings with a single bus transfer?
+        self._batch = self.bus.batch
+        self._byte = bytearray(1)
         # Maximum characters per line
         self.width = width
         # Number of display rows
@@ -93,6 +321,12 @@ class HD44780:
         self._displaycontrol = LCD_DISPLAYON | LCD_CURSOROFF | LCD_BLINKOFF
         # State of text flow direction and auto-scrolling
         self._displaymode = LCD_ENTRYLEFT | LCD_ENTRYSHIFTDECREMENT
+        # Shadow of the display RAM, written to by fb_write(), and the state
+        # last sent to the display by flush()
+        self.fb = bytearray(b' ' * (width * lines))
+        self._sent = bytearray(self.fb)
+        # DDRAM address the controller points to, if known
+        self._addr = None
 
         if init:
             self.init()
@@ -117,10 +351,22 @@ class HD44780:
 
         """
         self._usleep(50000)
+        self._init_interface()
+
+        # Clear the display
+        self.clear()
+
+        # Set the entry mode; initialize to default text direction
+        # (for romanic languages)
+        self.command(LCD_ENTRYMODESET | self._displaymode)
+
+    def _init_interface(self):
+        """Set 4-bit interface, number of lines, font and display control."""
+        # The busy flag can't be read until the interface is set to 4-bit
+        poll_busy, self._poll_busy = self._poll_busy, False
 
         # Pull RS low to begin commands
-        self._set_pin('RS', LOW)
-        self._set_pin('EN', LOW)
+        self.bus.set_mode(LCD_CMD)
 
         # Put the LCD into 4 bit or 8 bit mode.
         # This is according to the hitachi HD44780 datasheet figure 24, p. 46
@@ -138,6 +384,7 @@ class HD44780:
 
         # Finally, set to 4-bit interface
         self._send_nibble(0x02)
+        self._poll_busy = poll_busy
 
         # Finally, set # lines, font size, etc.
         display_functions = LCD_4BITMODE | LCD_1LINE | LCD_5x8DOTS
@@ -150,21 +397,18 @@ class HD44780:
         # Turn the display on with no cursor or blinking default
         self.command(LCD_DISPLAYCONTROL | self._displaycontrol)
 
-        # Clear the display
-        self.clear()
-
-        # Set the entry mode; initialize to default text direction
-        # (for romanic languages)
-        self.command(LCD_ENTRYMODESET | self._displaymode)
-
     def clear(self):
-        """Clear the display."""
+        """Clear the display and the framebuffer."""
         self.command(LCD_CLEARDISPLAY)
-        self._usleep(2000)
+        self._delay(2000)
+        self.fb_clear()
+        self._sent[:] = self.fb
+        self._addr = 0
 
     def home(self):
         self.command(LCD_RETURNHOME)
-        self._usleep(2000)
+        self._delay(2000)
+        self._addr = 0
 
     def display(self, on=True):
         """Turn the display on or off."""
@@ -219,7 +463,8 @@ class HD44780:
 
     def set_cursor(self, col, row=0):
         """Set the cursor the given column and row (default 0)."""
-        self.command(LCD_SETDDRAMADDR | col + self.row_offsets[row])
+        self._addr = col + self.row_offsets[row]
+        self.command(LCD_SETDDRAMADDR | self._addr)
 
     def send_byte(self, byte, mode=LCD_CHR):
         """Send a byte to the data pins.
@@ -234,20 +479,120 @@ class HD44780:
         elif isinstance(byte, str):
             byte = ord(byte[0])
 
-        self._set_pin('RS', mode)
-        self._send_nibble(byte >> 4)
-        self._send_nibble(byte)
+        if self._poll_busy:
+            self._wait_ready()
+
+        bus = self.bus
+
+        if self._batch:
+            self._byte[0] = byte
+            bus.write(self._byte, mode)
+            return
+
+        bus.set_mode(mode)
+        bus.write_nibble(byte >> 4)
+        bus.write_nibble(byte)
+        # The controller only starts executing after the second nibble
+        self._delay(E_DELAY)
 
     def command(self, command):
         self.send_byte(command, mode=LCD_CMD)
 
     def write(self, message, col=None, row=None):
-        """Write message to given row."""
+        """Write message to given row.
+
+        The message is sent to the display immediately and bypasses the
+        framebuffer. Call ``flush(force=True)`` to redraw the framebuffer
+        contents after mixing ``write()`` and ``fb_write()``.
+
+        """
         if col is not None or row is not None:
             self.set_cursor(col or 0, row or 0)
 
-        for c in message:
-            self.send_byte(c)
+        # Writing moves the address counter, we don't track it here
+        self._addr = None
+        self._send_data(message)
+
+    def fb_clear(self):
+        """Fill the framebuffer with spaces.
+
+        The display is not changed until the next call to ``flush()``.
+
+        """
+        fb = self.fb
+        for i in range(len(fb)):
+            fb[i] = 0x20
+
+    def fb_write(self, message, col=0, row=0):
+        """Write message to the framebuffer at given column and row.
+
+        Text extending past the end of the row is cut off. The display is not
+        changed until the next call to ``flush()``.
+
+        """
+        message = encode(message)
+        width = self.width
+        n = min(len(message), width - col)
+
+        if n > 0 and 0 <= row < self.lines:
+            pos = row * width + col
+            self.fb[pos:pos + n] = message[:n]
+
+    def flush(self, force=False):
+        """Send changed framebuffer contents to the display.
+
+        Compares the framebuffer with the state last sent to the display and
+        only sends runs of changed characters, setting the cursor address only
+        when the controller doesn't already point to the start of a run.
+
+        Pass ``force=True`` to redraw the whole framebuffer.
+
+        Assumes left-to-right text direction with autoscrolling turned off.
+
+        Returns the number of characters sent.
+
+        """
+        fb = self.fb
+        sent = self._sent
+        width = self.width
+        count = 0
+
+        for row in range(self.lines):
+            start = row * width
+            end = start + width
+            pos = start
+
+            while pos < end:
+                if not force and fb[pos] == sent[pos]:
+                    pos += 1
+                    continue
+
+                # Start of a run of changed characters. Unchanged single
+                # characters inside the run are re-sent, because that costs
+                # no more than the cursor move needed to skip them.
+                run = pos
+                pos += 1
+
+                while pos < end:
+                    if force or fb[pos] != sent[pos]:
+                        pos += 1
+                    elif pos + 1 < end and fb[pos + 1] != sent[pos + 1]:
+                        pos += 2
+                    else:
+                        break
+
+                addr = self.row_offsets[row] + run - start
+
+                if self._addr != addr:
+                    self.command(LCD_SETDDRAMADDR | addr)
+
+                self._send_data(memoryview(fb)[run:pos])
+                sent[run:pos] = fb[run:pos]
+
+                count += pos - run
+                self._addr = addr + pos - run
+
+        return count
 
     def create_char(self, location, charmap):
         """Create a custom character in given memory location.
@@ -257,37 +602,45 @@ class HD44780:
 
         """
         self.command(LCD_SETCGRAMADDR | ((location & 0x7) << 3))
-
-        for c in charmap:
-            self.send_byte(c)
+        # Address counter now points to CGRAM
+        self._addr = None
+        self._send_data(charmap)
 
     # internal helper methods
-    def _pulse_enable(self):
-        """Pulse the EN pin, by setting it low, then high, then low again."""
-        self._set_pin('EN', LOW)
-        self._usleep(E_PULSE)
-        self._set_pin('EN', HIGH)
-        self._usleep(E_PULSE)
-        self._set_pin('EN', LOW)
-        self._usleep(E_DELAY)
+    def _delay(self, us):
+        """Wait for an instruction to execute, unless polling the busy flag."""
+        if not self._poll_busy:
+            self._usleep(us)
+
+    def _send_data(self, data):
+        """Send a string or sequence of bytes as character data."""
+        data = encode(data)
+
+        if self._batch:
+            if self._poll_busy:
+                self._wait_ready()
+
+            self.bus.write(data, LCD_CHR)
+        else:
+            for byte in data:
+                self.send_byte(byte)
+
+    def _wait_ready(self):
+        """Poll the busy flag until the controller is ready."""
+        read_busy = self.bus.read_busy
+
+        for _ in range(BUSY_TIMEOUT):
+            if not read_busy():
+                return
+
+        raise OSError("LCD controller busy timeout")
 
     def _usleep(self, us):
         """Delay by (sleep) us microseconds."""
         # Wrapped as a method for portability
         pyb.udelay(us)
 
-    def _set_pin(self, pin, state):
-        """Set output pin high or low."""
-        # Wrapped as a method for portability
-        if state:
-            self.pins[pin].high()
-        else:
-            self.pins[pin].low()
-
     def _send_nibble(self, nibble):
         """Send a nibble (4 bits) by setting data pins D4-7 and pulsing EN."""
-        self._set_pin('D4', nibble & 1)
-        self._set_pin('D5', nibble >> 1 & 1)
-        self._set_pin('D6', nibble >> 2 & 1)
-        self._set_pin('D7', nibble >> 3 & 1)
-        self._pulse_enable()
+        self.bus.write_nibble(nibble)
+        self._usleep(E_DELAY)
@@ -1,12 +1,184 @@
-from uasyncio.core import coroutine, sleep
+# -*- coding: utf-8 -*-
+"""Asynchronous HD44780 display controller library for MicroPython.
 
-from hd44780 import HD44780
+Usage::
+
+    import asyncio
+    from time import ticks_ms
+    from hd44780_async import AsyncHD44780
+
+    async def main():
+        lcd = AsyncHD44780()
+        asyncio.create_task(lcd.run())
+        lcd.write("Uptime:")
+
+        while True:
+            lcd.write("%5i s" % (ticks_ms() // 1000), col=0, row=1)
+            await asyncio.sleep_ms(100)
+
+"""
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+from hd44780 import (HD44780, LCD_BLINKON, LCD_CLEARDISPLAY, LCD_CURSORON,
+                     LCD_ENTRYMODESET, LCD_RETURNHOME)
 
 
 class AsyncHD44780(HD44780):
-    """Async interface to a HD44780 LCD controller in 4-bit mode."""
+    """Async interface to a HD44780 LCD controller in 4-bit mode.
+
+    Text written with ``write()`` goes to the framebuffer, so repeated writes
+    to the same display cell between updates are coalesced. All other
+    operations are put in a queue. Methods which change the display only
+    record the change and return immediately.
+
+    The background task ``run()`` executes queued operations and then sends
+    the changed framebuffer contents to the display. It only yields to other
+    tasks during the long waits after initialization, ``clear()`` and
+    ``home()``. All other instructions execute in a few dozen microseconds.
+
+    """
+
+    def __init__(self, width=16, lines=2, pins=None, init=True, bus=None,
+                 rw=None):
+        self._queue = []
+        self._event = asyncio.Event()
+        self._force = False
+        # Position in framebuffer for write() without col / row
+        self._pos = 0
+        # Cursor position to set after updating, if cursor was set
+        self._cursor = None
+        super().__init__(width, lines, pins, False, bus, rw)
+
+        if init:
+            self.init()
+
+    def _post(self, func, *args):
+        self._queue.append((func, args))
+        self._event.set()
+
+    async def run(self):
+        """Update the display whenever there are changes."""
+        while True:
+            await self._event.wait()
+            self._event.clear()
+            await self.update()
+
+    async def update(self):
+        """Execute all queued operations and send framebuffer changes."""
+        queue = self._queue
+
+        while queue:
+            func, args = queue.pop(0)
+
+            if func is HD44780.init:
+                await self._init()
+            elif func is HD44780.clear:
+                await self._clear()
+            elif func is HD44780.home:
+                self.command(LCD_RETURNHOME)
+                self._addr = 0
+                await self._sleep_ms(2)
+            else:
+                func(self, *args)
+
+        force, self._force = self._force, False
+        HD44780.flush(self, force)
+
+        if self._cursor and self._displaycontrol & (LCD_CURSORON |
+                                                    LCD_BLINKON):
+            HD44780.set_cursor(self, *self._cursor)
+
+    async def _init(self):
+        await self._sleep_ms(50)
+        self._init_interface()
+        await self._clear()
+        self.command(LCD_ENTRYMODESET | self._displaymode)
+
+    async def _clear(self):
+        self.command(LCD_CLEARDISPLAY)
+        self._addr = 0
+        # The framebuffer was already cleared by clear()
+        sent = self._sent
+
+        for i in range(len(sent)):
+            sent[i] = 0x20
+
+        await self._sleep_ms(2)
+
+    async def _sleep_ms(self, ms):
+        """Delay by (sleep) ms milliseconds, yielding to other tasks."""
+        # Wrapped as a method for portability
+        await asyncio.sleep(ms / 1000)
+
+    def init(self):
+        """Queue initialization of the display."""
+        self._post(HD44780.init)
+
+    def clear(self):
+        """Clear the framebuffer and queue clearing the display."""
+        self.fb_clear()
+        self._pos = 0
+        self._post(HD44780.clear)
+
+    def home(self):
+        """Queue returning the cursor to the home position."""
+        self._pos = 0
+        self._post(HD44780.home)
+
+    def display(self, on=True):
+        """Queue turning the display on or off."""
+        self._post(HD44780.display, on)
+
+    def cursor(self, on=True):
+        """Queue turning the underscore cursor on or off."""
+        self._post(HD44780.cursor, on)
+
+    def blink(self, on=True):
+        """Queue turning the blinking cursor on or off."""
+        self._post(HD44780.blink, on)
+
+    def scroll(self, *args):
+        """Queue scrolling the display without changing the RAM."""
+        self._post(HD44780.scroll, *args)
+
+    def direction(self, *args):
+        """Queue setting the text flow direction."""
+        self._post(HD44780.direction, *args)
+
+    def autoscroll(self, on=True):
+        """Queue turning autoscrolling on or off."""
+        self._post(HD44780.autoscroll, on)
+
+    def create_char(self, location, charmap):
+        """Queue creating a custom character in given memory location."""
+        self._post(HD44780.create_char, location, bytes(charmap))
+
+    def set_cursor(self, col, row=0):
+        """Set the position for ``write()`` and of the visible cursor."""
+        self._pos = row * self.width + col
+        self._cursor = (col, row)
+        self._event.set()
+
+    def write(self, message, col=None, row=None):
+        """Write message to the framebuffer at given or current position."""
+        if col is not None or row is not None:
+            self._pos = (row or 0) * self.width + (col or 0)
+
+        col = self._pos % self.width
+        row = self._pos // self.width
+        self.fb_write(message, col, row)
+        self._pos += min(len(message), self.width - col)
+
+    def fb_write(self, message, col=0, row=0):
+        """Write message to the framebuffer and request an update."""
+        super().fb_write(message, col, row)
+        self._event.set()
 
-    @coroutine
-    def _usleep(self, us):
-        """Delay by (sleep) us microseconds."""
-        yield from sleep(us / 1000)
+    def flush(self, force=False):
+        """Request sending framebuffer changes to the display."""
+        self._force |= force
+        self._event.set()
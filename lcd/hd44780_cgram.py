@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Custom character cache and bar graphs for the HD44780 library.
+
+Usage::
+
+    from hd44780 import HD44780
+    from hd44780_cgram import BarGraph, CGRAMCache
+
+    lcd = HD44780()
+    cache = CGRAMCache(lcd)
+    left = BarGraph(lcd, col=2, row=0, length=14, cache=cache)
+    right = BarGraph(lcd, col=2, row=1, length=14, cache=cache)
+    lcd.fb_write("L")
+    lcd.fb_write("R", row=1)
+
+    while True:
+        left.set(read_level(0))
+        right.set(read_level(1))
+        lcd.flush()
+
+"""
+
+try:
+    const
+except NameError:
+    def const(x):
+        return x
+
+# Number of custom character slots in CGRAM (5x8 font)
+CGRAM_SLOTS = const(8)
+# Character codes for empty and completely filled cells (ROM code A00)
+CHAR_EMPTY = const(0x20)
+CHAR_FULL = const(0xFF)
+
+
+def bar_glyph(pixels, vertical=False):
+    """Return bitmap of a bar cell with given number of pixels filled.
+
+    Horizontal bars grow from left to right, vertical bars from bottom to
+    top.
+
+    """
+    if vertical:
+        return bytes(0x1F if row >= 8 - pixels else 0 for row in range(8))
+
+    return bytes([(0x1F << (5 - pixels)) & 0x1F] * 8)
+
+
+class CGRAMCache:
+    """Manage custom character slots of a HD44780 display.
+
+    Remembers the bitmap of the glyph in each slot, so requesting a glyph,
+    which is already loaded, costs no bus traffic. When a new glyph is needed
+    and all slots are in use, the least recently requested one is replaced.
+
+    Note that all display cells showing the character of a replaced slot
+    change their appearance immediately.
+
+    """
+
+    def __init__(self, lcd, slots=CGRAM_SLOTS):
+        self.lcd = lcd
+        # Bitmap of the glyph in each slot, None if unknown
+        self.glyphs = [None] * slots
+        # Slot numbers, least recently used first
+        self._lru = list(range(slots))
+        self.uploads = 0
+
+    def get(self, glyph):
+        """Return character code for glyph, uploading it to CGRAM if needed.
+
+        ``glyph`` is a sequence of eight bytes with the pixel rows of the
+        character.
+
+        """
+        glyph = bytes(glyph)
+        lru = self._lru
+
+        try:
+            slot = self.glyphs.index(glyph)
+            lru.remove(slot)
+        except ValueError:
+            slot = lru.pop(0)
+            self.lcd.create_char(slot, glyph)
+            self.glyphs[slot] = glyph
+            self.uploads += 1
+
+        lru.append(slot)
+        return slot
+
+    def invalidate(self):
+        """Forget the contents of all slots, e.g. after re-initialization."""
+        for slot in range(len(self.glyphs)):
+            self.glyphs[slot] = None
+
+
+class BarGraph:
+    """A horizontal or vertical bar graph drawn into the LCD framebuffer.
+
+    A horizontal bar starts at the given column and row and grows to the
+    right. A vertical bar starts at the given row and grows upwards. Each
+    cell has a resolution of five (horizontal) or eight (vertical) levels.
+    Partially filled cells use custom characters from ``cache``.
+
+    Only cells between the old and the new level are rewritten and the
+    changes are sent to the display with the next ``lcd.flush()``.
+
+    """
+
+    def __init__(self, lcd, col=0, row=0, length=None, vertical=False,
+                 cache=None):
+        self.lcd = lcd
+        self.col = col
+        self.row = row
+        self.vertical = vertical
+
+        if length is None:
+            length = row + 1 if vertical else lcd.width - col
+
+        self.length = length
+        self.cell = 8 if vertical else 5
+        self.max_level = length * self.cell
+        self.cache = cache if cache else CGRAMCache(lcd)
+        self._glyphs = [bar_glyph(n, vertical) for n in range(self.cell)]
+        # Character code of the partially filled cell, if any
+        self._partial = None
+        self.level = 0
+
+        for i in range(length):
+            self._put(i, CHAR_EMPTY)
+
+    def _put(self, i, char):
+        lcd = self.lcd
+
+        if self.vertical:
+            lcd.fb[(self.row - i) * lcd.width + self.col] = char
+        else:
+            lcd.fb[self.row * lcd.width + self.col + i] = char
+
+    def set(self, value, max_value=100):
+        """Set bar length to value in range 0 to max_value.
+
+        Returns True if any cells were changed.
+
+        """
+        return self.set_level(value * self.max_level // max_value)
+
+    def set_level(self, level):
+        """Set bar length in pixels.
+
+        Returns True if any cells were changed.
+
+        """
+        level = min(max(level, 0), self.max_level)
+        old = self.level
+        cell = self.cell
+        partial = self._partial
+        # The glyph of the partial cell was replaced in the cache?
+        stale = (partial is not None and
+                 self.cache.glyphs[partial] != self._glyphs[old % cell])
+
+        if level == old and not stale:
+            return False
+
+        full, pixels = divmod(level, cell)
+        self._partial = None
+
+        for i in range(min(old, level) // cell,
+                       min(max(old, level) // cell, self.length - 1) + 1):
+            if i < full:
+                self._put(i, CHAR_FULL)
+            elif i == full and pixels:
+                self._partial = self.cache.get(self._glyphs[pixels])
+                self._put(i, self._partial)
+            else:
+                self._put(i, CHAR_EMPTY)
+
+        self.level = level
+        return True
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""PCF8574 I2C backpack bus backend for the HD44780 library.
+
+Usage::
+
+    from machine import I2C
+    from hd44780 import HD44780
+    from hd44780_i2c import PCF8574Bus
+
+    lcd = HD44780(bus=PCF8574Bus(I2C(1), 0x27))
+    lcd.write("Hello, I2C!")
+
+"""
+
+try:
+    const
+except NameError:
+    def const(x):
+        return x
+
+# Wiring of the PCF8574 port bits on common LCD backpacks
+PCF_RS = const(0x01)
+PCF_RW = const(0x02)
+PCF_EN = const(0x04)
+PCF_BACKLIGHT = const(0x08)
+
+# Expander states per data byte (two nibbles with EN high, then low)
+STATES_PER_BYTE = const(4)
+# Max. number of data bytes sent in one I2C transfer
+BATCH_SIZE = const(40)
+
+
+class PCF8574Bus:
+    """Send data to the LCD controller via a PCF8574 I2C port expander.
+
+    Changing a single pin of the expander takes a whole I2C transfer, so
+    instead each data byte is encoded as the sequence of port states needed
+    to send it (both nibbles with EN high and then low) and a whole string is
+    sent with a single ``writeto`` call. At 100 or 400 kHz bus clock, each
+    byte takes longer to transfer than the controller needs to execute it,
+    so no delays are needed between bytes.
+
+    ``i2c`` is a ``machine.I2C`` instance or any object with a compatible
+    ``writeto`` method, ``addr`` is the I2C address of the expander.
+
+    """
+
+    batch = True
+    can_read = False
+
+    def __init__(self, i2c, addr=0x27, backlight=True):
+        self.i2c = i2c
+        self.addr = addr
+        self._backlight = PCF_BACKLIGHT if backlight else 0
+        self._ctrl = self._backlight
+        self._buf = bytearray(BATCH_SIZE * STATES_PER_BYTE)
+        self._nibble = bytearray(2)
+        self._nibble[0] = self._ctrl
+        self.i2c.writeto(self.addr, memoryview(self._nibble)[:1])
+
+    def backlight(self, on=True):
+        """Turn the backlight on or off."""
+        self._backlight = PCF_BACKLIGHT if on else 0
+        self._ctrl = self._ctrl & PCF_RS | self._backlight
+        self._nibble[0] = self._ctrl
+        self.i2c.writeto(self.addr, memoryview(self._nibble)[:1])
+
+    def set_mode(self, mode):
+        """Set RS to send a command (LCD_CMD) or data (LCD_CHR)."""
+        self._ctrl = (PCF_RS if mode else 0) | self._backlight
+
+    def write_nibble(self, nibble):
+        """Set data lines to the lower four bits of nibble and pulse EN."""
+        buf = self._nibble
+        state = (nibble & 0xF) << 4 | self._ctrl
+        buf[0] = state | PCF_EN
+        buf[1] = state
+        self.i2c.writeto(self.addr, buf)
+
+    def write(self, data, mode):
+        """Send a sequence of bytes with as few I2C transfers as possible."""
+        self.set_mode(mode)
+        ctrl = self._ctrl
+        buf = self._buf
+        size = len(buf)
+        i = 0
+
+        for byte in data:
+            state = byte & 0xF0 | ctrl
+            buf[i] = state | PCF_EN
+            buf[i + 1] = state
+            state = (byte & 0xF) << 4 | ctrl
+            buf[i + 2] = state | PCF_EN
+            buf[i + 3] = state
+            i += STATES_PER_BYTE
+
+            if i == size:
+                self.i2c.writeto(self.addr, buf)
+                i = 0
+
+        if i:
+            self.i2c.writeto(self.addr, memoryview(buf)[:i])
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""Simple text widgets for the HD44780 library.
+
+Widgets render into the framebuffer of a ``HD44780`` (or ``AsyncHD44780``)
+instance, so only the cells which actually changed are sent to the display
+by ``flush()``. Animated widgets advance by one frame on each call to their
+``tick()`` method, which a ``Screen`` calls for all its widgets before
+flushing.
+
+Usage::
+
+    from hd44780 import HD44780
+    from hd44780_widgets import Label, Marquee, NumberField, Screen
+
+    lcd = HD44780()
+    title = Marquee(lcd, 0, 0, 16, "Now playing: a very long song title")
+    Label(lcd, 0, 1, 6, "Tempo:")
+    tempo = NumberField(lcd, 7, 1, 3, 120)
+    screen = Screen(lcd, title)
+
+    while True:
+        tempo.set(read_tempo())
+        screen.update()
+        pyb.delay(100)
+
+"""
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+from hd44780 import encode
+
+try:
+    const
+except NameError:
+    def const(x):
+        return x
+
+# Character used to mark the selected menu item
+MENU_MARKER = const(0x7E)  # right arrow in ROM code A00
+
+
+class Widget:
+    """Base class for widgets occupying ``width`` cells of a display row."""
+
+    def __init__(self, lcd, col, row, width):
+        self.lcd = lcd
+        self.col = col
+        self.row = row
+        self.width = width
+
+    def tick(self):
+        """Advance animation by one frame. Return True if anything changed."""
+        return False
+
+    def _draw(self, data, offset=0, row=None):
+        self.lcd.fb_write(data, self.col + offset,
+                          self.row if row is None else row)
+
+
+class Label(Widget):
+    """Static text, padded or cut to the widget width.
+
+    ``align`` is one of ``'<'`` (left), ``'>'`` (right) or ``'^'`` (center).
+
+    """
+
+    def __init__(self, lcd, col, row, width, text='', align='<'):
+        super().__init__(lcd, col, row, width)
+        self.align = align
+        self._text = None
+        self.set(text)
+
+    def _layout(self, text):
+        text = text[:self.width]
+        pad = self.width - len(text)
+
+        if self.align == '>':
+            left = pad
+        elif self.align == '^':
+            left = pad // 2
+        else:
+            left = 0
+
+        return b' ' * left + text + b' ' * (pad - left)
+
+    def set(self, text):
+        """Set label text. Return True if it changed."""
+        text = encode(text)
+
+        if text == self._text:
+            return False
+
+        self._text = text
+        self._draw(self._layout(text))
+        return True
+
+
+class NumberField(Label):
+    """Right-aligned numeric value formatted with ``fmt``."""
+
+    def __init__(self, lcd, col, row, width, value=0, fmt='%d'):
+        Widget.__init__(self, lcd, col, row, width)
+        self.align = '>'
+        self.fmt = fmt
+        self.value = None
+        self._text = None
+        self.set(value)
+
+    def set(self, value):
+        """Set displayed value. Return True if it changed."""
+        if value == self.value:
+            return False
+
+        self.value = value
+        return super().set(self.fmt % value)
+
+
+class Marquee(Widget):
+    """Text which scrolls to the left if it is wider than the widget.
+
+    The text moves by one cell every ``speed`` ticks. ``gap`` is the number of
+    spaces between the end of the text and its next repetition.
+
+    Each frame copies exactly ``width`` bytes from a pre-built buffer, so the
+    cost of a frame doesn't depend on the length of the text.
+
+    """
+
+    def __init__(self, lcd, col, row, width, text='', speed=3, gap=4):
+        super().__init__(lcd, col, row, width)
+        self.speed = speed
+        self.gap = gap
+        self.set(text)
+
+    def set(self, text):
+        """Set text and restart scrolling."""
+        text = encode(text)
+        self._ticks = 0
+        self._offset = 0
+
+        if len(text) <= self.width:
+            self._buf = None
+            self._draw(text + b' ' * (self.width - len(text)))
+        else:
+            text += b' ' * self.gap
+            self._len = len(text)
+            # Append start of text to end, so any window is a single slice
+            self._buf = memoryview(text + text[:self.width])
+            self._draw(self._buf[:self.width])
+
+    def tick(self):
+        if self._buf is None:
+            return False
+
+        self._ticks += 1
+
+        if self._ticks < self.speed:
+            return False
+
+        self._ticks = 0
+        self._offset = offset = (self._offset + 1) % self._len
+        self._draw(self._buf[offset:offset + self.width])
+        return True
+
+
+class Menu(Widget):
+    """Scrollable list of items, one per row, with a selection marker.
+
+    Shows ``rows`` items starting at display row ``row``. Moving the
+    selection within the visible items only redraws the two marker cells.
+
+    """
+
+    def __init__(self, lcd, col, row, width, items, rows=None):
+        super().__init__(lcd, col, row, width)
+        self.items = [encode(item) for item in items]
+        self.rows = rows if rows else lcd.lines - row
+        self.selected = 0
+        self._top = 0
+        self._draw_items()
+
+    def _draw_items(self):
+        width = self.width - 1
+
+        for i in range(self.rows):
+            index = self._top + i
+            item = self.items[index] if index < len(self.items) else b''
+            item = item[:width]
+            self._draw(item + b' ' * (width - len(item)), 1, self.row + i)
+            self._draw_marker(index)
+
+    def _draw_marker(self, index):
+        row = index - self._top
+
+        if 0 <= row < self.rows:
+            marker = MENU_MARKER if index == self.selected else 0x20
+            self._draw(bytes((marker,)), 0, self.row + row)
+
+    def select(self, index):
+        """Select item with given index. Return True if selection changed."""
+        index = min(max(index, 0), len(self.items) - 1)
+        old = self.selected
+
+        if index == old:
+            return False
+
+        self.selected = index
+
+        if index < self._top:
+            self._top = index
+            self._draw_items()
+        elif index >= self._top + self.rows:
+            self._top = index - self.rows + 1
+            self._draw_items()
+        else:
+            self._draw_marker(old)
+            self._draw_marker(index)
+
+        return True
+
+    def next(self):
+        return self.select(self.selected + 1)
+
+    def prev(self):
+        return self.select(self.selected - 1)
+
+
+class Screen:
+    """Group of widgets which are animated and flushed together."""
+
+    def __init__(self, lcd, *widgets):
+        self.lcd = lcd
+        self.widgets = list(widgets)
+
+    def add(self, widget):
+        self.widgets.append(widget)
+
+    def update(self):
+        """Advance all widgets by one frame and flush changes to the display.
+
+        Call this regularly from the main loop or from a callback scheduled by
+        a timer interrupt with ``micropython.schedule``.
+
+        """
+        for widget in self.widgets:
+            widget.tick()
+
+        return self.lcd.flush()
+
+    async def run(self, interval=100):
+        """Update the screen every ``interval`` milliseconds."""
+        while True:
+            self.update()
+            await asyncio.sleep(interval / 1000)
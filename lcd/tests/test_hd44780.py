@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for MicroPython HD44780 library."""
+
+import sys
+sys.path.insert(0, '..')
+
+from hd44780 import (HD44780, GPIOBus, LCD_CHR, LCD_CMD, LCD_2LINE,
+                     LCD_FUNCTIONSET, bsrr_table, gpio_bus)
+
+
+class MockPin:
+    IN = 0
+    OUT = 1
+
+    def __init__(self, name, controller):
+        self.name = name
+        self.controller = controller
+        self.mode = self.OUT
+        self.state = 0
+
+    def init(self, mode):
+        self.controller.now += 1
+        self.mode = mode
+
+    def value(self, state=None):
+        self.controller.now += 1
+
+        if state is None:
+            return self.state
+
+        old, self.state = self.state, int(bool(state))
+        self.controller.pin_changed(self, old)
+
+
+class MockController:
+    """Simulates a HD44780 controller connected in 4-bit mode.
+
+    Time is simulated in microseconds. Each pin access takes 1 us.
+
+    """
+
+    def __init__(self):
+        self.pins = [MockPin(name, self)
+                     for name in ('RS', 'EN', 'D4', 'D5', 'D6', 'D7')]
+        self.rs, self.en = self.pins[:2]
+        self.data = self.pins[2:]
+        self.rw = MockPin('RW', self)
+        self.now = 0
+        self.busy_until = 0
+        # Instructions received while busy
+        self.lost = 0
+        # Data pins driven by both sides
+        self.contention = 0
+        self.read_low = False
+        self.ddram = bytearray(b' ' * 128)
+        self.cgram = bytearray(64)
+        self.addr = 0
+        self.use_cgram = False
+        self.eight_bit = True
+        self.nibble = None
+        self.log = []
+
+    def pin_changed(self, pin, old):
+        if pin is not self.en or self.rw.state and not pin.state:
+            return
+
+        if self.rw.state:
+            self.drive()
+        elif old and not pin.state:
+            self.latch()
+
+    def drive(self):
+        if any(pin.mode == MockPin.OUT for pin in self.data):
+            self.contention += 1
+
+        if self.read_low:
+            nibble = self.addr & 0xF
+        else:
+            nibble = (self.now < self.busy_until) << 3 | self.addr >> 4 & 7
+
+        self.read_low = not self.read_low
+
+        for i, pin in enumerate(self.data):
+            pin.state = nibble >> i & 1
+
+    def latch(self):
+        if self.now < self.busy_until:
+            self.lost += 1
+            return
+
+        nibble = sum(pin.state << i for i, pin in enumerate(self.data))
+
+        if self.eight_bit:
+            # Lower four data lines are not connected
+            self.execute(self.rs.state, nibble << 4)
+        elif self.nibble is None:
+            self.nibble = nibble
+        else:
+            self.execute(self.rs.state, self.nibble << 4 | nibble)
+            self.nibble = None
+
+    def execute(self, rs, byte):
+        self.log.append((rs, byte))
+        self.busy_until = self.now + (1520 if not rs and byte < 4 else 37)
+
+        if rs:
+            if self.use_cgram:
+                self.cgram[self.addr & 0x3F] = byte
+            else:
+                self.ddram[self.addr & 0x7F] = byte
+
+            self.addr += 1
+        elif byte & 0x80:
+            self.addr = byte & 0x7F
+            self.use_cgram = False
+        elif byte & 0x40:
+            self.addr = byte & 0x3F
+            self.use_cgram = True
+        elif byte & 0x20:
+            self.eight_bit = bool(byte & 0x10)
+        elif byte in (0x01, 0x02):
+            if byte == 0x01:
+                self.ddram[:] = b' ' * 128
+
+            self.addr = 0
+            self.use_cgram = False
+
+    def row(self, row, width=16):
+        offset = HD44780.row_offsets[row]
+        return bytes(self.ddram[offset:offset + width])
+
+    def data_written(self):
+        return [byte for rs, byte in self.log if rs]
+
+
+class MockLCD(HD44780):
+    def __init__(self, ctrl, rw=False, **kwargs):
+        self.ctrl = ctrl
+        bus = GPIOBus(ctrl.pins, ctrl.rw if rw else None)
+        super().__init__(bus=bus, **kwargs)
+
+    def _usleep(self, us):
+        self.ctrl.now += us
+
+
+def make_lcd(**kwargs):
+    ctrl = MockController()
+    lcd = MockLCD(ctrl, **kwargs)
+    ctrl.log = []
+    return lcd, ctrl
+
+
+def test_init():
+    ctrl = MockController()
+    MockLCD(ctrl)
+    assert not ctrl.eight_bit
+    assert (LCD_CMD, LCD_FUNCTIONSET | LCD_2LINE) in ctrl.log
+
+
+def test_gpio_bus_with_pin_objects():
+    ctrl = MockController()
+    bus = gpio_bus(ctrl.pins)
+    assert isinstance(bus, GPIOBus)
+    assert bus.pins == tuple(ctrl.pins)
+
+
+def test_write():
+    lcd, ctrl = make_lcd()
+    lcd.write("Hello", row=1)
+    assert ctrl.row(1).startswith(b"Hello")
+    assert ctrl.data_written() == list(b"Hello")
+
+
+def test_bsrr_table():
+    table = bsrr_table((3, 4, 5, 6), 1 << 1)
+    assert len(table) == 16
+    assert table[0] == 0b1111000 << 16 | 1 << 1
+    assert table[0xF] == 0b1111000 | 1 << 1
+    assert table[0b0101] == 0b0101000 | 0b1010000 << 16 | 1 << 1
+
+
+def test_flush_sends_only_changes():
+    lcd, ctrl = make_lcd()
+    lcd.fb_write("90 3C 7F", row=1)
+    assert lcd.flush() == 8
+    assert ctrl.row(1) == b"90 3C 7F        "
+
+    ctrl.log = []
+    lcd.fb_write("90 3D 7F", row=1)
+    assert lcd.flush() == 1
+    assert ctrl.log == [(LCD_CMD, 0x80 | 0x44), (LCD_CHR, ord("D"))]
+    assert ctrl.row(1) == b"90 3D 7F        "
+
+    ctrl.log = []
+    assert lcd.flush() == 0
+    assert ctrl.log == []
+
+
+def test_flush_force():
+    lcd, ctrl = make_lcd()
+    lcd.fb_write("Hi")
+    assert lcd.flush(force=True) == 32
+    assert ctrl.row(0) == b"Hi              "
+
+
+def test_flush_merges_runs_and_skips_cursor():
+    lcd, ctrl = make_lcd()
+    lcd.fb_write("abcdefgh")
+    lcd.flush()
+    ctrl.log = []
+    # The unchanged character between two changes is re-sent
+    lcd.fb_write("AbC", col=0)
+    assert lcd.flush() == 3
+    assert ctrl.log == [(LCD_CMD, 0x80), (LCD_CHR, ord("A")),
+                        (LCD_CHR, ord("b")), (LCD_CHR, ord("C"))]
+    ctrl.log = []
+    # Address counter already points behind "C"
+    lcd.fb_write("D", col=3)
+    lcd.fb_write("g", col=6)
+    lcd.fb_write("X", col=7)
+    assert lcd.flush() == 2
+    assert ctrl.log == [(LCD_CHR, ord("D")), (LCD_CMD, 0x87),
+                        (LCD_CHR, ord("X"))]
+    assert ctrl.row(0) == b"AbCDefgX        "
+
+
+def test_busy_flag():
+    lcd, ctrl = make_lcd(rw=True)
+    lcd.clear()
+    lcd.write("Busy flag", row=1)
+    assert ctrl.row(1).startswith(b"Busy flag")
+    assert ctrl.lost == 0
+    assert ctrl.contention == 0
+    assert ctrl.rw.state == 0
+    assert all(pin.mode == MockPin.OUT for pin in ctrl.data)
+
+
+def test_busy_flag_faster_than_delays():
+    elapsed = {}
+    text = b"0123456789ABCDEF"
+
+    for rw in (False, True):
+        lcd, ctrl = make_lcd(rw=rw)
+        start = ctrl.now
+        lcd.clear()
+        lcd.write(text)
+        lcd.write(text, row=1)
+        elapsed[rw] = ctrl.now - start
+        assert ctrl.lost == 0
+        assert ctrl.row(0) == text and ctrl.row(1) == text
+
+    print("Timed delays: %i us, busy flag: %i us" %
+          (elapsed[False], elapsed[True]))
+    assert elapsed[True] < elapsed[False]
+
+
+def test_busy_flag_timeout():
+    lcd, ctrl = make_lcd(rw=True)
+    ctrl.busy_until = 10 ** 9
+
+    try:
+        lcd.write("x")
+    except OSError:
+        pass
+    else:
+        assert False, "Expected OSError"
+
+
+def test_fb_write_rom_characters():
+    lcd, ctrl = make_lcd()
+    lcd.fb_write("25\xdfC")
+    lcd.flush()
+    assert ctrl.row(0) == b"25\xdfC            "
+
+
+def test_write_rom_characters():
+    lcd, ctrl = make_lcd()
+    # Degree sign of the HD44780 character ROM
+    lcd.write(chr(0xDF) + 'C')
+    assert ctrl.data_written() == [0xDF, 0x43]
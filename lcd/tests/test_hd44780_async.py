@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for MicroPython asynchronous HD44780 library."""
+
+import sys
+sys.path.insert(0, '..')
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+from hd44780 import GPIOBus, LCD_CMD, LCD_CLEARDISPLAY
+from hd44780_async import AsyncHD44780
+from test_hd44780 import MockController
+
+
+class MockAsyncLCD(AsyncHD44780):
+    def __init__(self, ctrl, **kwargs):
+        self.ctrl = ctrl
+        super().__init__(bus=GPIOBus(ctrl.pins), **kwargs)
+
+    def _usleep(self, us):
+        self.ctrl.now += us
+
+    async def _sleep_ms(self, ms):
+        self.ctrl.now += ms * 1000
+        await asyncio.sleep(0)
+
+
+def test_init_is_queued():
+    ctrl = MockController()
+    lcd = MockAsyncLCD(ctrl)
+    assert ctrl.eight_bit
+    assert ctrl.log == []
+    asyncio.run(lcd.update())
+    assert not ctrl.eight_bit
+    assert (LCD_CMD, LCD_CLEARDISPLAY) in ctrl.log
+
+
+def test_writes_are_coalesced():
+    ctrl = MockController()
+    lcd = MockAsyncLCD(ctrl)
+    asyncio.run(lcd.update())
+    ctrl.log = []
+
+    for i in range(10):
+        lcd.write("%3i" % i, col=4, row=1)
+
+    lcd.write("!")
+    assert ctrl.log == []
+    asyncio.run(lcd.update())
+    assert ctrl.row(1) == b"      9!        "
+    assert ctrl.data_written() == list(b"9!")
+
+
+def test_clear_keeps_later_writes():
+    ctrl = MockController()
+    lcd = MockAsyncLCD(ctrl)
+    lcd.write("Old text")
+    asyncio.run(lcd.update())
+    lcd.clear()
+    lcd.write("New", col=2)
+    asyncio.run(lcd.update())
+    assert ctrl.row(0) == b"  New           "
+    assert ctrl.log.count((LCD_CMD, LCD_CLEARDISPLAY)) == 2
+
+
+def test_run_task():
+    ctrl = MockController()
+    lcd = MockAsyncLCD(ctrl)
+
+    async def main():
+        task = asyncio.create_task(lcd.run())
+        lcd.write("Hello")
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(main())
+    assert ctrl.row(0).startswith(b"Hello")
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for HD44780 custom character cache and bar graphs."""
+
+import sys
+sys.path.insert(0, '..')
+
+from hd44780 import LCD_CMD, LCD_SETCGRAMADDR
+from hd44780_cgram import BarGraph, CGRAMCache, bar_glyph
+from test_hd44780 import make_lcd
+
+
+def glyph(n):
+    return bytes([n] * 8)
+
+
+def cgram_uploads(ctrl):
+    return [byte for rs, byte in ctrl.log
+            if rs == LCD_CMD and byte & 0xC0 == LCD_SETCGRAMADDR]
+
+
+def test_bar_glyph():
+    assert bar_glyph(0) == bytes(8)
+    assert bar_glyph(2) == bytes([0b11000] * 8)
+    assert bar_glyph(5) == bytes([0b11111] * 8)
+    assert bar_glyph(3, vertical=True) == bytes([0] * 5 + [0x1F] * 3)
+
+
+def test_cache_hit():
+    lcd, ctrl = make_lcd()
+    cache = CGRAMCache(lcd)
+    assert cache.get(glyph(1)) == 0
+    assert cache.get(glyph(2)) == 1
+    assert cache.get(glyph(1)) == 0
+    assert cache.uploads == 2
+    assert len(cgram_uploads(ctrl)) == 2
+    assert bytes(ctrl.cgram[8:16]) == glyph(2)
+
+
+def test_cache_lru_eviction():
+    lcd, ctrl = make_lcd()
+    cache = CGRAMCache(lcd)
+
+    for n in range(8):
+        assert cache.get(glyph(n)) == n
+
+    # Use slot 0 again, so slot 1 is least recently used
+    cache.get(glyph(0))
+    assert cache.get(glyph(8)) == 1
+    assert cache.glyphs[1] == glyph(8)
+    assert bytes(ctrl.cgram[8:16]) == glyph(8)
+    assert cache.uploads == 9
+
+
+def test_horizontal_bar():
+    lcd, ctrl = make_lcd()
+    bar = BarGraph(lcd, col=2, row=1, length=4)
+    assert bar.set(40)
+    lcd.flush()
+    slot = bar.cache.get(bar_glyph(3))
+    assert ctrl.row(1) == b"  \xff" + bytes([slot]) + b"            "
+
+    ctrl.log = []
+    assert not bar.set(40)
+    assert bar.set_level(13)
+    assert lcd.flush() == 2
+    assert ctrl.row(1)[2:6] == b"\xff\xff" + bytes([bar._partial]) + b" "
+    assert bar.cache.uploads == 1
+
+    assert bar.set(100)
+    lcd.flush()
+    assert ctrl.row(1)[2:6] == b"\xff" * 4
+
+
+def test_vertical_bar():
+    lcd, ctrl = make_lcd()
+    bar = BarGraph(lcd, col=15, row=1, vertical=True)
+    assert bar.max_level == 16
+    bar.set_level(11)
+    lcd.flush()
+    assert ctrl.row(1)[15] == 0xFF
+    assert bytes(ctrl.cgram[bar._partial * 8:][:8]) == bar_glyph(3, True)
+
+
+def test_bar_redrawn_after_eviction():
+    lcd, ctrl = make_lcd()
+    cache = CGRAMCache(lcd, slots=1)
+    bar = BarGraph(lcd, length=2, cache=cache)
+    bar.set_level(3)
+    cache.get(glyph(7))
+    assert bar.set_level(3)
+    assert cache.glyphs[0] == bar_glyph(3)
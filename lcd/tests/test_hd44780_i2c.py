@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for MicroPython HD44780 PCF8574 I2C backend."""
+
+import sys
+sys.path.insert(0, '..')
+
+from hd44780 import HD44780, LCD_CHR, LCD_CMD
+from hd44780_i2c import PCF8574Bus, PCF_BACKLIGHT
+from test_hd44780 import MockController
+
+# Transfer time of one byte at 400 kHz bus clock in us
+BYTE_TIME = 22
+
+
+class MockI2C:
+    """Feeds the port states written to a PCF8574 to a mock controller."""
+
+    def __init__(self, ctrl):
+        self.ctrl = ctrl
+        self.transfers = []
+
+    def writeto(self, addr, buf):
+        self.transfers.append((addr, bytes(buf)))
+        ctrl = self.ctrl
+
+        for state in buf:
+            ctrl.now += BYTE_TIME
+            ctrl.rs.value(state & 1)
+            ctrl.rw.value(state >> 1 & 1)
+
+            for i, pin in enumerate(ctrl.data):
+                pin.value(state >> (4 + i) & 1)
+
+            ctrl.en.value(state >> 2 & 1)
+
+
+class MockLCD(HD44780):
+    def __init__(self, ctrl, **kwargs):
+        self.ctrl = ctrl
+        super().__init__(**kwargs)
+
+    def _usleep(self, us):
+        self.ctrl.now += us
+
+
+def make_lcd():
+    ctrl = MockController()
+    i2c = MockI2C(ctrl)
+    lcd = MockLCD(ctrl, bus=PCF8574Bus(i2c, 0x3F))
+    ctrl.log = []
+    i2c.transfers = []
+    return lcd, ctrl, i2c
+
+
+def test_init():
+    lcd, ctrl, i2c = make_lcd()
+    assert not ctrl.eight_bit
+    assert ctrl.lost == 0
+
+
+def test_write_single_transfer():
+    lcd, ctrl, i2c = make_lcd()
+    lcd.write("Hello, I2C world", row=1)
+    assert ctrl.row(1) == b"Hello, I2C world"
+    assert ctrl.lost == 0
+    # One transfer for setting the cursor, one for the text
+    assert len(i2c.transfers) == 2
+    assert i2c.transfers[0] == (0x3F, bytes([0xCC, 0xC8, 0x0C, 0x08]))
+    assert len(i2c.transfers[1][1]) == 16 * 4
+    assert all(state & PCF_BACKLIGHT for state in i2c.transfers[1][1])
+
+
+def test_write_long_string():
+    lcd, ctrl, i2c = make_lcd()
+    lcd.write(b"x" * 100)
+    assert ctrl.data_written() == list(b"x" * 100)
+    assert len(i2c.transfers) == 3
+
+
+def test_flush():
+    lcd, ctrl, i2c = make_lcd()
+    lcd.fb_write("Level: 10")
+    lcd.flush()
+    i2c.transfers = []
+    ctrl.log = []
+    lcd.fb_write("Level: 11")
+    assert lcd.flush() == 1
+    assert ctrl.log == [(LCD_CMD, 0x88), (LCD_CHR, ord("1"))]
+    assert len(i2c.transfers) == 2
+    assert ctrl.row(0) == b"Level: 11       "
+
+
+def test_backlight():
+    lcd, ctrl, i2c = make_lcd()
+    lcd.bus.backlight(False)
+    assert not i2c.transfers[-1][1][0] & PCF_BACKLIGHT
+    lcd.write("x")
+    assert not any(state & PCF_BACKLIGHT for state in i2c.transfers[-1][1])
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for HD44780 text widgets."""
+
+import sys
+sys.path.insert(0, '..')
+
+from hd44780_widgets import Label, Marquee, Menu, NumberField, Screen
+from test_hd44780 import MockController, make_lcd
+from test_hd44780_async import MockAsyncLCD
+
+
+def test_label():
+    lcd, ctrl = make_lcd()
+    label = Label(lcd, 2, 0, 6, "abc", align='>')
+    lcd.flush()
+    assert ctrl.row(0) == b"     abc        "
+    assert not label.set("abc")
+    assert label.set("abcdefgh")
+    assert lcd.flush() == 6
+    assert ctrl.row(0) == b"  abcdef        "
+    assert label.set("abcdeg")
+    assert lcd.flush() == 1
+
+
+def test_number_field():
+    lcd, ctrl = make_lcd()
+    field = NumberField(lcd, 0, 1, 4, 120)
+    lcd.flush()
+    assert ctrl.row(1).startswith(b" 120")
+    assert not field.set(120)
+    assert field.set(121)
+    assert lcd.flush() == 1
+    assert ctrl.row(1).startswith(b" 121")
+
+
+def test_marquee():
+    lcd, ctrl = make_lcd()
+    text = "A long text which scrolls"
+    marquee = Marquee(lcd, 0, 0, 8, text, speed=2, gap=2)
+    screen = Screen(lcd, marquee)
+    screen.update()
+    assert ctrl.row(0, 8) == b"A long t"
+    screen.update()
+    assert ctrl.row(0, 8) == b" long te"
+
+    for i in range(2 * (len(text) + 2 - 1)):
+        screen.update()
+
+    assert ctrl.row(0, 8) == b"A long t"
+    # Frame cost doesn't depend on text length
+    marquee.set(text * 10)
+    lcd.flush()
+    ctrl.log = []
+    marquee.tick()
+    marquee.tick()
+    assert lcd.flush() <= 8
+
+
+def test_short_marquee_is_static():
+    lcd, ctrl = make_lcd()
+    marquee = Marquee(lcd, 0, 0, 8, "short", speed=1)
+    screen = Screen(lcd, marquee)
+    screen.update()
+    assert screen.update() == 0
+    assert ctrl.row(0, 8) == b"short   "
+
+
+def test_menu():
+    lcd, ctrl = make_lcd()
+    menu = Menu(lcd, 0, 0, 10, ["Tempo", "Swing", "Channel"])
+    lcd.flush()
+    assert ctrl.row(0, 10) == b"\x7eTempo    "
+    assert ctrl.row(1, 10) == b" Swing    "
+    assert menu.next()
+    assert lcd.flush() == 2
+    assert ctrl.row(1, 10) == b"\x7eSwing    "
+    assert menu.next()
+    lcd.flush()
+    assert ctrl.row(0, 10) == b" Swing    "
+    assert ctrl.row(1, 10) == b"\x7eChannel  "
+    assert not menu.next()
+    assert menu.select(0)
+    lcd.flush()
+    assert ctrl.row(0, 10) == b"\x7eTempo    "
+
+
+def test_clipped_at_row_end():
+    lcd, ctrl = make_lcd()
+    Label(lcd, 10, 1, 10, "overflowing")
+    Label(lcd, 12, 0, 8, "\xdf" * 8)
+    assert len(lcd.fb) == 32
+    lcd.flush()
+    assert ctrl.row(0) == b"            \xdf\xdf\xdf\xdf"
+    assert ctrl.row(1) == b"          overfl"
+
+
+def test_async_lcd_update_requested():
+    lcd = MockAsyncLCD(MockController(), init=False)
+    label = Label(lcd, 0, 0, 8, "Tempo")
+    lcd._event.clear()
+    assert label.set("Volume")
+    assert lcd._event.is_set()
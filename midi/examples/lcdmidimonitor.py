@@ -20,7 +20,9 @@ class MidiMonitor:
 
     def __call__(self, msg):
         s = " ".join("%02X " % b for b in msg) + "   " * (3 - len(msg))
-        self.lcd.write(s, row=1)
+        # Only characters which differ from the previous message are sent
+        self.lcd.fb_write(s, row=1)
+        self.lcd.flush()
         print(tuple(msg))
 
 
@@ -29,11 +31,14 @@ def main():
     lcd = STM_LCDShield()
     monitor = MidiMonitor(lcd)
     midiin = MidiIn(serial, monitor, debug=True)
-    lcd.write("MIDI Mon ")
+    lcd.fb_write("MIDI Mon ")
+    lcd.flush()
     pyb.delay(1000)
-    lcd.write("ready")
+    lcd.fb_write("ready", col=9)
+    lcd.flush()
     pyb.delay(1000)
-    lcd.write("     ", col=9)
+    lcd.fb_write("     ", col=9)
+    lcd.flush()
 
     while True:
         midiin.poll()
@@ -0,0 +1,128 @@
+#
+# flashbdev.py
+#
+# Block device interface for SPI flash chips, to host a filesystem
+#
+# Usage:
+#
+#   import os
+#   from spiflash import SPIFlash
+#   from flashbdev import FlashBlockDev
+#
+#   bdev = FlashBlockDev(SPIFlash(spi, cs), 2 * 1024 * 1024)
+#   os.VfsLfs2.mkfs(bdev)
+#   os.mount(bdev, '/flash')
+
+__all__ = ('FlashBlockDev',)
+
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
+
+from spiflash import ERASED_PAGE, PAGE_SIZE, SECTOR_SIZE
+
+IOCTL_INIT = const(1)
+IOCTL_DEINIT = const(2)
+IOCTL_SYNC = const(3)
+IOCTL_BLOCK_COUNT = const(4)
+IOCTL_BLOCK_SIZE = const(5)
+IOCTL_BLOCK_ERASE = const(6)
+
+
+class FlashBlockDev:
+    """Block device on (a part of) a SPIFlash chip.
+
+    Implements the extended block device protocol (``readblocks``,
+    ``writeblocks`` and ``ioctl``) for use with ``os.VfsLfs2``. The device
+    covers ``size`` bytes of the chip starting at address ``start``.
+    ``block_size`` must be a multiple of the 4 KiB erase sector size.
+    ``os.VfsFat`` only accepts such large sectors with a firmware built with
+    ``FF_MAX_SS`` of at least 4096, most ports use 512.
+
+    Flash is only erased when needed. When writing whole blocks (the simple
+    interface used by FAT), each sector is read and compared first: unchanged
+    sectors are skipped and sectors, where bits only need to change from 1 to
+    0, are programmed without erasing. Erase requests from littlefs (ioctl 6)
+    are skipped for sectors which are already erased.
+
+    """
+
+    def __init__(self, flash, size, start=0, block_size=SECTOR_SIZE):
+        if block_size % SECTOR_SIZE or start % SECTOR_SIZE:
+            raise ValueError("Block size and start must be multiples of %i"
+                             % SECTOR_SIZE)
+
+        self.flash = flash
+        self.start = start
+        self.block_size = block_size
+        self.blocks = size // block_size
+        self._buf = bytearray(SECTOR_SIZE)
+
+    def readblocks(self, block, buf, offset=0):
+        self.flash.read_block(self.start + block * self.block_size + offset,
+                              buf)
+
+    def writeblocks(self, block, buf, offset=None):
+        addr = self.start + block * self.block_size
+
+        if offset is None:
+            mv = memoryview(buf)
+
+            for pos in range(0, len(buf), SECTOR_SIZE):
+                self._write_sector(addr + pos, mv[pos:pos + SECTOR_SIZE])
+        else:
+            # Extended interface: blocks were erased with ioctl before
+            self._program(addr + offset, buf)
+
+    def ioctl(self, op, arg):
+        if op == IOCTL_BLOCK_COUNT:
+            return self.blocks
+
+        if op == IOCTL_BLOCK_SIZE:
+            return self.block_size
+
+        if op == IOCTL_BLOCK_ERASE:
+            self.flash.erase_range(self.start + arg * self.block_size,
+                                   self.block_size)
+            return 0
+
+        if op in (IOCTL_INIT, IOCTL_DEINIT, IOCTL_SYNC):
+            return 0
+
+    def _write_sector(self, addr, data):
+        cur = self._buf
+        self.flash.read_block(addr, cur)
+
+        if cur == data:
+            return
+
+        for i in range(SECTOR_SIZE):
+            if cur[i] & data[i] != data[i]:
+                # Some bits need to change from 0 to 1
+                self.flash.erase(addr, '4k')
+                self._program(addr, data)
+                return
+
+        # Only program pages which change
+        for pos in range(0, SECTOR_SIZE, PAGE_SIZE):
+            page = data[pos:pos + PAGE_SIZE]
+
+            if memoryview(cur)[pos:pos + PAGE_SIZE] != page:
+                self.flash.write_block(addr + pos, page)
+
+    def _program(self, addr, data):
+        """Program data in page-sized chunks, skipping erased pages."""
+        mv = memoryview(data)
+        length = len(data)
+        pos = 0
+
+        while pos < length:
+            size = min(length - pos, PAGE_SIZE - (addr + pos) % PAGE_SIZE)
+            chunk = mv[pos:pos + size]
+
+            if size < PAGE_SIZE or chunk != ERASED_PAGE:
+                self.flash.write_block(addr + pos, chunk)
+
+            pos += size
@@ -0,0 +1,455 @@
+#
+# flashkv.py
+#
+# Log-structured, wear-leveling key-value store on SPI flash
+#
+# Usage:
+#
+#   from spiflash import SPIFlash
+#   from flashkv import FlashKV
+#
+#   kv = FlashKV(SPIFlash(spi, cs, cache_size=8192), 64 * 1024)
+#   kv[1] = b'some value'
+#   kv.flush()
+#   print(kv.get(1))
+#
+#   while True:
+#       ...
+#       # in idle time
+#       kv.maintain()
+
+__all__ = ('FlashKV',)
+
+import struct
+
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
+
+from spiflash import SECTOR_SIZE
+
+MAGIC = b'FKV1'
+# Sector header: magic, erase count, sequence number
+SECTOR_HEADER = '<4sII'
+SECTOR_HEADER_SIZE = const(12)
+# Header of free sectors, written right after erasing: magic, erase count
+FREE_HEADER = '<4sI'
+NO_SEQ = const(0xFFFFFFFF)
+# Bytes per sector available for records
+SECTOR_CAPACITY = SECTOR_SIZE - SECTOR_HEADER_SIZE
+# Least garbage in a sector worth an erase for reclaiming it
+MIN_GARBAGE = const(256)
+# Record header: key, value length
+RECORD_HEADER = '<HH'
+RECORD_HEADER_SIZE = const(4)
+# Value length of records marking a deleted key
+DELETED = const(0xFFFF)
+# Key value of erased flash, marks the end of the records in a sector
+NO_KEY = const(0xFFFF)
+MAX_KEY = const(0xFFFE)
+MAX_VALUE_SIZE = SECTOR_SIZE - SECTOR_HEADER_SIZE - RECORD_HEADER_SIZE
+ENOSPC = const(28)
+
+
+class FlashKV:
+    """Key-value store on a range of SPIFlash sectors, with wear leveling.
+
+    Keys are integers from 0 to 0xFFFE, values are bytes objects of up to
+    ``MAX_VALUE_SIZE`` bytes.
+
+    Values set with ``set()`` are kept in RAM, so repeated updates of the
+    same key are coalesced, until ``flush()`` is called or more than
+    ``buffer_size`` bytes are pending. They are then appended as records to
+    the current head sector, instead of being written in place. An in-RAM
+    index maps each key to the flash offset of its latest record.
+
+    When the head sector is full, the erased sector with the lowest erase
+    count becomes the new head. The erase count of each sector is kept in
+    its header, which is written right after erasing, so it survives
+    restarts. Sectors holding only a few current records are reclaimed by
+    copying those to the head and erasing the sector. This happens in
+    ``maintain()``, which should be called in idle time, or ``run_gc()`` for
+    asyncio applications. When no free sectors are left, sectors are also
+    reclaimed when needed for writing. ``reserve`` sectors are always kept
+    free for this. Sectors are only reclaimed if they hold enough garbage to
+    make the erase worthwhile, so a store full of current data is not
+    erased over and over again.
+
+    On start-up the records of all sectors are scanned in the order of their
+    sequence numbers to rebuild the index.
+
+    """
+
+    def __init__(self, flash, size, start=0, buffer_size=256, reserve=1,
+                 gc_threshold=2):
+        self.flash = flash
+        self.start = start
+        self.sectors = size // SECTOR_SIZE
+
+        if self.sectors < reserve + 2:
+            raise ValueError("Need at least %i sectors" % (reserve + 2))
+
+        self.buffer_size = buffer_size
+        self.reserve = reserve
+        self.gc_threshold = gc_threshold
+        self.erase_counts = [0] * self.sectors
+        # Sequence number of each sector, None for free sectors
+        self._seqs = [None] * self.sectors
+        # Bytes used by current records in each sector
+        self._live = [0] * self.sectors
+        # Maps keys to offset of their latest record in flash region
+        self._index = {}
+        # Maps keys to values (None for deleted keys) not yet written
+        self._pending = {}
+        self._pending_size = 0
+        self._free = []
+        self._head = None
+        self._head_pos = SECTOR_SIZE
+        self._seq = 0
+        self._collecting = False
+        self._hdr = bytearray(RECORD_HEADER_SIZE)
+        # RAM buffer for appended records not yet programmed
+        self._wbuf = bytearray(buffer_size)
+        self._wlen = 0
+        self._waddr = 0
+        # Records in the write buffer: (key, offset, size)
+        self._unindexed = []
+        self._scan()
+
+    # dict-like interface
+    def __getitem__(self, key):
+        value = self.get(key)
+
+        if value is None:
+            raise KeyError(key)
+
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        self.delete(key)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def keys(self):
+        """Return list of keys with values."""
+        keys = [key for key in self._index if key not in self._pending and
+                self._read_header(self._index[key])[1] != DELETED]
+        keys.extend(key for key, value in self._pending.items()
+                    if value is not None)
+        return keys
+
+    def get(self, key, default=None):
+        """Return value of key or default if the key is not set."""
+        if key in self._pending:
+            value = self._pending[key]
+            return default if value is None else value
+
+        offset = self._index.get(key)
+
+        if offset is None:
+            return default
+
+        length = self._read_header(offset)[1]
+
+        if length == DELETED:
+            return default
+
+        value = bytearray(length)
+        self.flash.read(self.start + offset + RECORD_HEADER_SIZE, value)
+        return bytes(value)
+
+    def set(self, key, value):
+        """Set value of key. The write is buffered until ``flush()``."""
+        if not 0 <= key <= MAX_KEY:
+            raise ValueError("Invalid key")
+
+        if value is not None and len(value) > MAX_VALUE_SIZE:
+            raise ValueError("Value too large")
+
+        if key in self._pending:
+            # Replaces a value, which wasn't written yet
+            old = self._pending[key]
+            self._pending_size -= RECORD_HEADER_SIZE + (len(old) if old else 0)
+
+        self._pending_size += RECORD_HEADER_SIZE + (len(value) if value else 0)
+        self._pending[key] = None if value is None else bytes(value)
+
+        if self._pending_size > self.buffer_size:
+            self.flush()
+
+    def delete(self, key):
+        """Delete key. The write is buffered until ``flush()``."""
+        self.set(key, None)
+
+    def flush(self):
+        """Write all pending values to flash."""
+        pending = self._pending
+
+        try:
+            for key, value in list(pending.items()):
+                self._append(key, value)
+                # Only dropped once appended, so a failed write loses nothing
+                del pending[key]
+                self._pending_size -= RECORD_HEADER_SIZE + (
+                    len(value) if value else 0)
+        finally:
+            self._sync()
+
+    def maintain(self):
+        """Reclaim sectors until enough sectors are free.
+
+        Stops when reclaiming a sector didn't increase the number of free
+        sectors. Returns the number of reclaimed sectors.
+
+        """
+        count = 0
+
+        for _ in range(self.sectors):
+            free = len(self._free)
+
+            if free >= self.gc_threshold or not self.collect():
+                break
+
+            count += 1
+
+            if len(self._free) <= free:
+                break
+
+        return count
+
+    async def run_gc(self, interval=1000):
+        """Call ``maintain()`` every ``interval`` milliseconds."""
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
+
+        while True:
+            self.maintain()
+            await asyncio.sleep(interval / 1000)
+
+    def collect(self):
+        """Reclaim the used sector with the least live data.
+
+        The sector is only reclaimed if its garbage is at least
+        ``MIN_GARBAGE`` bytes and more than the free space left in the head
+        sector. Otherwise copying its records would use up as much space as
+        erasing it gains. Returns True if a sector was erased.
+
+        """
+        seqs = self._seqs
+        live = self._live
+        counts = self.erase_counts
+        victim = None
+
+        # Prefer sectors erased less often, if they hold as little live data
+        for sector in range(self.sectors):
+            if seqs[sector] is None or sector == self._head:
+                continue
+
+            if (victim is None or live[sector] < live[victim] or
+                    (live[sector] == live[victim] and
+                     counts[sector] < counts[victim])):
+                victim = sector
+
+        if victim is None:
+            return False
+
+        garbage = SECTOR_CAPACITY - live[victim]
+        head_free = 0 if self._head is None else SECTOR_SIZE - self._head_pos
+
+        if garbage < MIN_GARBAGE or garbage <= head_free:
+            return False
+
+        start = victim * SECTOR_SIZE
+        end = start + SECTOR_SIZE
+        self._collecting = True
+
+        try:
+            for key, offset in list(self._index.items()):
+                if start <= offset < end:
+                    self._append(key, self._read_value(offset))
+
+            self._sync()
+        finally:
+            self._collecting = False
+
+        self._erase(victim)
+        return True
+
+    # internal helper methods
+    def _read_header(self, offset):
+        self.flash.read(self.start + offset, self._hdr)
+        return struct.unpack(RECORD_HEADER, self._hdr)
+
+    def _read_value(self, offset):
+        """Return value of record at offset, None for deleted keys."""
+        length = self._read_header(offset)[1]
+
+        if length == DELETED:
+            return None
+
+        value = bytearray(length)
+        self.flash.read(self.start + offset + RECORD_HEADER_SIZE, value)
+        return value
+
+    def _record_size(self, offset):
+        length = self._read_header(offset)[1]
+        return RECORD_HEADER_SIZE + (0 if length == DELETED else length)
+
+    def _update_index(self, key, offset, size):
+        old = self._index.get(key)
+
+        if old is not None:
+            self._live[old // SECTOR_SIZE] -= self._record_size(old)
+
+        self._index[key] = offset
+        self._live[offset // SECTOR_SIZE] += size
+
+    def _append(self, key, value):
+        size = RECORD_HEADER_SIZE + (0 if value is None else len(value))
+
+        if self._head_pos + size > SECTOR_SIZE:
+            self._open_sector()
+
+        offset = self._head * SECTOR_SIZE + self._head_pos
+        self._head_pos += size
+        # Records are added to the write buffer, larger ones in parts
+        buf = self._wbuf
+
+        if self._wlen + size > len(buf):
+            self._sync()
+
+        if not self._wlen:
+            self._waddr = offset
+
+        struct.pack_into(RECORD_HEADER, buf, self._wlen, key,
+                         DELETED if value is None else len(value))
+        self._wlen += RECORD_HEADER_SIZE
+
+        if value:
+            mv = memoryview(value)
+            pos = 0
+
+            while pos < len(value):
+                if self._wlen == len(buf):
+                    self._sync()
+                    self._waddr = offset + RECORD_HEADER_SIZE + pos
+
+                n = min(len(value) - pos, len(buf) - self._wlen)
+                buf[self._wlen:self._wlen + n] = mv[pos:pos + n]
+                self._wlen += n
+                pos += n
+
+        # Index is updated after programming, so get() never reads a record,
+        # which is still in the write buffer
+        self._unindexed.append((key, offset, size))
+
+    def _sync(self):
+        """Program the contents of the write buffer and update the index."""
+        if self._wlen:
+            self.flash.write_block(self.start + self._waddr,
+                                   memoryview(self._wbuf)[:self._wlen])
+            self._waddr += self._wlen
+            self._wlen = 0
+
+        for key, offset, size in self._unindexed:
+            self._update_index(key, offset, size)
+
+        self._unindexed[:] = []
+
+    def _open_sector(self):
+        self._sync()
+
+        if not self._collecting:
+            # Collecting a sector may need a new sector itself, so don't loop
+            # forever if there's not enough garbage to gain a free sector
+            for _ in range(self.sectors):
+                if len(self._free) > self.reserve or not self.collect():
+                    break
+
+            if len(self._free) <= self.reserve:
+                raise OSError(ENOSPC)
+        elif not self._free:
+            raise OSError(ENOSPC)
+
+        # Wear leveling: use the free sector erased least often
+        counts = self.erase_counts
+        sector = self._free[0]
+
+        for s in self._free:
+            if counts[s] < counts[sector]:
+                sector = s
+
+        self._free.remove(sector)
+        self._seq += 1
+        self._seqs[sector] = self._seq
+        # Magic and erase count are usually programmed already, programming
+        # them again with the same value doesn't change any bits
+        self.flash.write_block(self.start + sector * SECTOR_SIZE,
+                               struct.pack(SECTOR_HEADER, MAGIC,
+                                           counts[sector], self._seq))
+        self._head = sector
+        self._head_pos = SECTOR_HEADER_SIZE
+
+    def _erase(self, sector):
+        self.flash.erase(self.start + sector * SECTOR_SIZE, '4k')
+        self.erase_counts[sector] += 1
+        # Keep the erase count in flash, until the sector is used again
+        self.flash.write_block(self.start + sector * SECTOR_SIZE,
+                               struct.pack(FREE_HEADER, MAGIC,
+                                           self.erase_counts[sector]))
+        self._seqs[sector] = None
+        self._live[sector] = 0
+        self._free.append(sector)
+
+    def _scan(self):
+        """Rebuild index from the records in all sectors."""
+        hdr = bytearray(SECTOR_HEADER_SIZE)
+        used = []
+
+        for sector in range(self.sectors):
+            self.flash.read(self.start + sector * SECTOR_SIZE, hdr)
+            magic, count, seq = struct.unpack(SECTOR_HEADER, hdr)
+
+            if magic == MAGIC:
+                self.erase_counts[sector] = count
+
+                if seq == NO_SEQ:
+                    self._free.append(sector)
+                else:
+                    used.append((seq, sector))
+            elif hdr == b'\xff' * SECTOR_HEADER_SIZE:
+                # Never used
+                self._free.append(sector)
+            else:
+                # Unknown data or interrupted sector header write
+                self._erase(sector)
+
+        used.sort()
+
+        for seq, sector in used:
+            self._seqs[sector] = seq
+            pos = SECTOR_HEADER_SIZE
+
+            while pos + RECORD_HEADER_SIZE <= SECTOR_SIZE:
+                offset = sector * SECTOR_SIZE + pos
+                key, length = self._read_header(offset)
+
+                if key == NO_KEY:
+                    break
+
+                size = RECORD_HEADER_SIZE + (0 if length == DELETED
+                                             else length)
+                self._update_index(key, offset, size)
+                pos += size
+
+            self._head = sector
+            self._head_pos = pos
+            self._seq = seq
@@ -0,0 +1,245 @@
+#
+# flashlog.py
+#
+# Circular log of fixed-size records on SPI flash, e.g. for sensor data
+#
+# Usage:
+#
+#   from spiflash import SPIFlash
+#   from flashlog import FlashLog
+#
+#   log = FlashLog(SPIFlash(spi, cs), 256 * 1024, '<Ihhh')
+#
+#   while logging:
+#       log.append(ticks_ms(), *accel.xyz())
+#
+#   log.flush()
+#
+#   for timestamp, x, y, z in log:
+#       print(timestamp, x, y, z)
+
+__all__ = ('FlashLog',)
+
+import struct
+
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
+
+from spiflash import ERASED_PAGE, PAGE_SIZE, SECTOR_SIZE
+
+MAGIC = b'FLG1'
+# Sector header: magic, sequence number, record size
+SECTOR_HEADER = '<4sIH'
+# Space reserved for the sector header at the start of each sector
+HEADER_SIZE = const(16)
+PAGES_PER_SECTOR = SECTOR_SIZE // PAGE_SIZE
+
+
+class FlashLog:
+    """Append-only ring buffer of ``struct`` records on a SPIFlash range.
+
+    Each record is packed with format ``fmt`` into a page-sized RAM buffer,
+    which is programmed when it is full, so flash is written one page at a
+    time. ``flush()`` writes records which are still buffered. Records don't
+    cross page boundaries.
+
+    Sectors are filled in order. Before the log wraps around to a used
+    sector, the sector is erased, dropping its (oldest) records. Each sector
+    starts with a header holding a sequence number, so on start-up only the
+    sector headers and the first records of the pages in the newest sector
+    need to be read to find the end of the log.
+
+    An erased record slot marks the end of the data, so records must never
+    consist only of 0xFF bytes (e.g. include a timestamp or counter).
+
+    """
+
+    def __init__(self, flash, size, fmt, start=0):
+        self.flash = flash
+        self.start = start
+        self.sectors = size // SECTOR_SIZE
+        self.fmt = fmt
+        self.record_size = rs = struct.calcsize(fmt)
+
+        if rs > PAGE_SIZE - HEADER_SIZE:
+            raise ValueError("Record too large")
+
+        if start % SECTOR_SIZE or self.sectors < 2:
+            raise ValueError("Need at least two sectors starting at a "
+                             "sector boundary")
+
+        self._erased = ERASED_PAGE[:rs]
+        self._buf = bytearray(PAGE_SIZE)
+        self._hdr = bytearray(HEADER_SIZE)
+        self._seq = 0
+        self._sector = 0
+        self._page = 0
+        # Position of next record and end of programmed data in current page
+        self._wpos = 0
+        self._flushed = 0
+        self._scan()
+
+    def __iter__(self):
+        return self.records()
+
+    def append(self, *values):
+        """Append a record with the given field values."""
+        rs = self.record_size
+        struct.pack_into(self.fmt, self._buf, self._wpos, *values)
+        self._wpos += rs
+
+        if self._wpos + rs > PAGE_SIZE:
+            self.flush()
+            self._next_page()
+
+    def flush(self):
+        """Program the buffered records of the current page."""
+        flushed, wpos = self._flushed, self._wpos
+
+        if wpos > flushed:
+            self.flash.write_block(self._page_addr() + flushed,
+                                   memoryview(self._buf)[flushed:wpos])
+            self._flushed = wpos
+
+    def records(self):
+        """Iterate over all records from oldest to newest.
+
+        Yields tuples of field values. Reads one page at a time and includes
+        records, which are not flushed yet.
+
+        """
+        rs = self.record_size
+        fmt = self.fmt
+        erased = self._erased
+        buf = bytearray(PAGE_SIZE)
+        mv = memoryview(buf)
+        head = self._sector
+
+        for i in range(1, self.sectors + 1):
+            sector = (head + i) % self.sectors
+
+            if self._read_header(sector) is None:
+                continue
+
+            base = self.start + sector * SECTOR_SIZE
+
+            for page in range(PAGES_PER_SECTOR):
+                pos = HEADER_SIZE if page == 0 else 0
+                end = PAGE_SIZE
+
+                if sector == head:
+                    if page == self._page:
+                        end = self._flushed
+                    elif page > self._page:
+                        break
+
+                if end - pos < rs:
+                    continue
+
+                self.flash.read(base + page * PAGE_SIZE + pos, mv[pos:end])
+
+                while pos + rs <= end:
+                    if mv[pos:pos + rs] == erased:
+                        break
+
+                    yield struct.unpack_from(fmt, buf, pos)
+                    pos += rs
+                else:
+                    continue
+
+                # End of data in this sector
+                break
+
+        for pos in range(self._flushed, self._wpos, rs):
+            yield struct.unpack_from(fmt, self._buf, pos)
+
+    def clear(self):
+        """Erase all records."""
+        self._wpos = self._flushed = 0
+        self.flash.erase_range(self.start, self.sectors * SECTOR_SIZE)
+        self._seq = 0
+        self._open_sector(0)
+
+    # internal helper methods
+    def _page_addr(self):
+        return (self.start + self._sector * SECTOR_SIZE +
+                self._page * PAGE_SIZE)
+
+    def _read_header(self, sector):
+        """Return sequence number of sector or None if it's not in use."""
+        self.flash.read(self.start + sector * SECTOR_SIZE, self._hdr)
+        magic, seq, rs = struct.unpack_from(SECTOR_HEADER, self._hdr)
+
+        if magic != MAGIC or rs != self.record_size or seq == 0xFFFFFFFF:
+            return None
+
+        return seq
+
+    def _next_page(self):
+        self._page += 1
+
+        if self._page == PAGES_PER_SECTOR:
+            self._open_sector((self._sector + 1) % self.sectors)
+        else:
+            self._wpos = self._flushed = 0
+
+    def _open_sector(self, sector):
+        addr = self.start + sector * SECTOR_SIZE
+        # Drops the oldest records when the log wraps around
+        self.flash.erase_range(addr, SECTOR_SIZE)
+        self._seq += 1
+        self.flash.write_block(addr, struct.pack(SECTOR_HEADER, MAGIC,
+                                                 self._seq, self.record_size))
+        self._sector = sector
+        self._page = 0
+        self._wpos = self._flushed = HEADER_SIZE
+
+    def _is_erased(self, addr):
+        slot = memoryview(self._buf)[:self.record_size]
+        self.flash.read(addr, slot)
+        return slot == self._erased
+
+    def _scan(self):
+        """Find the end of the log from the sector headers."""
+        head = None
+
+        for sector in range(self.sectors):
+            seq = self._read_header(sector)
+
+            if seq is not None and (head is None or seq > self._seq):
+                head = sector
+                self._seq = seq
+
+        if head is None:
+            self._open_sector(0)
+            return
+
+        rs = self.record_size
+        base = self.start + head * SECTOR_SIZE
+        self._sector = head
+        self._page = 0
+        self._wpos = HEADER_SIZE
+
+        # Last page with records, then first free slot in it
+        for page in range(PAGES_PER_SECTOR):
+            pos = HEADER_SIZE if page == 0 else 0
+
+            if self._is_erased(base + page * PAGE_SIZE + pos):
+                break
+
+            self._page = page
+            self._wpos = pos
+
+        addr = base + self._page * PAGE_SIZE
+
+        while (self._wpos + rs <= PAGE_SIZE and
+               not self._is_erased(addr + self._wpos)):
+            self._wpos += rs
+
+        self._flushed = self._wpos
+
+        if self._wpos + rs > PAGE_SIZE:
+            self._next_page()
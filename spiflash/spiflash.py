@@ -7,15 +7,32 @@
 # SPI 1 42mhz max   SPI 2  21 mhz max
 # SPI1 X5-X8 CS CLK MISO MOSI   3.3v grnd
 
-__all__ = ('SPIFLash',)
+__all__ = ('SPIFlash',)
 
-from micropython import const
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
+
+try:
+    from time import ticks_diff, ticks_ms
+except ImportError:
+    from time import monotonic
+
+    def ticks_ms():
+        return int(monotonic() * 1000)
+
+    def ticks_diff(a, b):
+        return a - b
 
 
 CMD_JEDEC_ID = const(0x9F)
 CMD_READ_STATUS = const(0x05)    # Read status register
 CMD_READ = const(0x03)           # Read @ low speed
 CMD_READ_HI_SPEED = const(0x0B)  # Read @ high speed
+CMD_READ_DUAL_OUT = const(0x3B)  # Read @ high speed, data on 2 lines
+CMD_READ_QUAD_OUT = const(0x6B)  # Read @ high speed, data on 4 lines
 CMD_WRITE_ENABLE = const(0x06)   # Write enable
 CMD_PROGRAM_PAGE = const(0x02)   # Write page
 CMD_ERASE_4K = const(0x20)
@@ -23,37 +40,358 @@ CMD_ERASE_32K = const(0x52)
 CMD_ERASE_64K = const(0xD8)
 CMD_ERASE_CHIP = const(0xC7)
 CMD_READ_UID = const(0x4B)
+CMD_READ_SFDP = const(0x5A)      # Read serial flash discoverable parameters
+CMD_ENTER_4B = const(0xB7)       # Enter 4-byte address mode
+STATUS_BUSY = const(0x01)        # Write in progress bit of status register
 PAGE_SIZE = const(256)
+SECTOR_SIZE = const(4096)
 COMMANDS = {
     '4k': CMD_ERASE_4K,
     '32k': CMD_ERASE_32K,
     '64k': CMD_ERASE_64K
 }
+ERASE_SIZES = {
+    '4k': 4096,
+    '32k': 32768,
+    '64k': 65536
+}
+# Typical erase times in ms (W25Q128JV datasheet)
+ERASE_TIMES = {
+    '4k': 45,
+    '32k': 120,
+    '64k': 150
+}
+# Maximum erase and program times in ms, used as timeouts
+ERASE_TIMEOUTS = {
+    '4k': 400,
+    '32k': 1600,
+    '64k': 2000
+}
+# Typical chip erase time in ms per MiB (W25Q128JV: 40 s for 16 MiB)
+CHIP_ERASE_TIME = const(2500)
+CHIP_ERASE_TIMEOUT = const(200000)
+PROGRAM_TIMEOUT = const(10)
+WAIT_TIMEOUT = const(1000)
+ERASED_PAGE = b'\xff' * PAGE_SIZE
+# Read mode: (command, number of dummy bytes, number of data lines)
+READ_MODES = {
+    'slow': (CMD_READ, 0, 1),
+    'fast': (CMD_READ_HI_SPEED, 1, 1),
+    'dual': (CMD_READ_DUAL_OUT, 1, 2),
+    'quad': (CMD_READ_QUAD_OUT, 1, 4)
+}
+# Chips without SFDP or with incomplete tables:
+# JEDEC ID: (name, size in bytes, max. SPI clock for fast read in Hz)
+CHIPS = {
+    b'\xef\x40\x14': ('W25Q80', 1 << 20, 104000000),
+    b'\xef\x40\x15': ('W25Q16', 2 << 20, 104000000),
+    b'\xef\x40\x16': ('W25Q32', 4 << 20, 104000000),
+    b'\xef\x40\x17': ('W25Q64', 8 << 20, 104000000),
+    b'\xef\x40\x18': ('W25Q128', 16 << 20, 133000000),
+    b'\xef\x40\x19': ('W25Q256', 32 << 20, 133000000),
+    b'\xef\x70\x18': ('W25Q128JV-M', 16 << 20, 133000000),
+    b'\xc8\x40\x16': ('GD25Q32', 4 << 20, 120000000),
+    b'\xc8\x40\x17': ('GD25Q64', 8 << 20, 120000000),
+    b'\xc2\x20\x17': ('MX25L64', 8 << 20, 133000000),
+}
+SFDP_SIGNATURE = b'SFDP'
+MAX_3B_SIZE = const(1 << 24)
+
+
+def parse_bfpt(table):
+    """Parse JEDEC basic flash parameter table (JESD216).
+
+    Returns a tuple of size in bytes, supported read modes, supported erase
+    types and the number of address bytes required by the chip.
+
+    """
+    dw = [table[i] | table[i + 1] << 8 | table[i + 2] << 16 |
+          table[i + 3] << 24 for i in range(0, len(table) - 3, 4)]
+    density = dw[1]
+
+    if density & 0x80000000:
+        size = (1 << (density & 0x7FFFFFFF)) // 8
+    else:
+        size = (density + 1) // 8
+
+    modes = ['slow', 'fast']
+
+    if dw[0] & 0x10000:
+        modes.append('dual')
+
+    if dw[0] & 0x400000:
+        modes.append('quad')
+
+    # Address bytes: 0 - 3-byte only, 1 - 3 or 4-byte, 2 - 4-byte only
+    addr_bytes = 4 if (dw[0] >> 17) & 3 == 2 else 3
+    erase_types = []
+
+    if len(dw) >= 9:
+        # Erase types 1 to 4: size as power of two and instruction
+        for value in (dw[7], dw[7] >> 16, dw[8], dw[8] >> 16):
+            shift, cmd = value & 0xFF, value >> 8 & 0xFF
+
+            for name, esize in ERASE_SIZES.items():
+                if 1 << shift == esize and cmd == COMMANDS[name]:
+                    erase_types.append(name)
+    elif dw[0] & 3 == 1 and (dw[0] >> 8) & 0xFF == CMD_ERASE_4K:
+        erase_types.append('4k')
+
+    # Keep the order of ERASE_SIZES
+    erase_types = tuple(name for name in ERASE_SIZES if name in erase_types)
+    return size, tuple(modes), erase_types, addr_bytes
 
 
 class SPIFlash:
-    def __init__(self, spi, cs):
+    """Driver for Winbond W25Q* and compatible SPI NOR flash chips.
+
+    ``read()`` serves reads from a RAM cache of whole 4 KiB sectors, if
+    ``cache_size`` (in bytes) is at least ``SECTOR_SIZE``. Cached sectors are
+    evicted in least recently used order. ``write_block()`` and ``erase()``
+    drop affected sectors from the cache.
+
+    ``read_mode`` selects the read command (see ``set_read_mode()``).
+
+    Program and erase operations wait for the chip by polling the BUSY bit
+    of the status register and raise ``OSError`` if it doesn't clear within
+    the maximum time given in the datasheet. The ``*_async`` variants of
+    these methods yield to other asyncio tasks while the chip is busy.
+
+    ``erase_range()`` erases any sector-aligned range with the fewest 64k,
+    32k and 4k erase commands, skipping sectors which are already erased.
+
+    With ``probe=True``, the chip geometry is detected on initialization
+    (see ``probe()``), otherwise the size of the chip is unknown (``None``)
+    and all read modes and erase sizes are assumed to be supported.
+
+    """
+
+    def __init__(self, spi, cs, cache_size=0, read_mode='slow', probe=False):
         self._spi = spi
         self._cs = cs
         self._cs.high()
         self._buf = bytearray([0])
+        # Command, 24/32-bit address and dummy byte, sent in one transfer
+        self._hdr = bytearray(6)
+        self._set_addr_bytes(3)
+        self._page = bytearray(PAGE_SIZE)
+        # Maps sector number to its cached data
+        self._cache = {}
+        # Cached sector numbers, least recently used first
+        self._lru = []
+        self.cache_sectors = cache_size // SECTOR_SIZE
+        self.name = None
+        self.size = None
+        self.max_freq = None
+        self.read_modes = tuple(READ_MODES)
+        self.erase_types = tuple(ERASE_SIZES)
+        self.set_read_mode(read_mode)
+
+        if probe:
+            self.probe()
+
+    def probe(self):
+        """Detect chip geometry and configure the driver for it.
+
+        Reads the JEDEC ID and the basic flash parameter table from the SFDP
+        area of the chip. For chips without SFDP, the size is taken from the
+        table ``CHIPS`` or derived from the capacity byte of the ID.
+
+        Sets the ``name``, ``size``, ``max_freq`` (in Hz, if known),
+        ``read_modes`` and ``erase_types`` attributes, selects the fastest
+        read mode supported by chip and SPI bus and switches to 4-byte
+        addressing for chips larger than 16 MiB.
+
+        Raises ``OSError`` if no chip responds.
+
+        """
+        jedec_id = bytes(self.getid())
+
+        if jedec_id in (b'\x00\x00\x00', b'\xff\xff\xff'):
+            raise OSError("No SPI flash chip found")
+
+        name, size, max_freq = CHIPS.get(jedec_id, (None, None, None))
+        params = self.read_sfdp_params()
+
+        if params:
+            size, self.read_modes, self.erase_types, addr_bytes = params
+        else:
+            addr_bytes = 3
+
+            if size is None and 0x10 <= jedec_id[2] <= 0x20:
+                size = 1 << jedec_id[2]
+
+        self.name = name
+        self.size = size
+        self.max_freq = max_freq
+
+        if size and size > MAX_3B_SIZE and addr_bytes != 4:
+            self._cs.low()
+            self._write(CMD_ENTER_4B)
+            self._cs.high()
+            addr_bytes = 4
+
+        self._set_addr_bytes(addr_bytes)
+        multi = hasattr(self._spi, 'readinto_multi')
+
+        for mode in ('quad', 'dual', 'fast', 'slow'):
+            if mode in self.read_modes and (multi or READ_MODES[mode][2] == 1):
+                self.set_read_mode(mode)
+                break
+
+    def read_sfdp(self, addr, buf):
+        """Read SFDP area of the chip starting at addr into buf."""
+        hdr = self._page
+        hdr[0] = CMD_READ_SFDP
+        hdr[1] = addr >> 16 & 0xFF
+        hdr[2] = addr >> 8 & 0xFF
+        hdr[3] = addr & 0xFF
+        hdr[4] = 0
+        self._cs.low()
+        self._spi.write(memoryview(hdr)[:5])
+        self._spi.readinto(buf)
+        self._cs.high()
+
+    def read_sfdp_params(self):
+        """Return parameters from the basic flash parameter table.
+
+        Returns a tuple of size in bytes, supported read modes, supported
+        erase types and the number of address bytes, which the chip
+        requires (3, or 4 if 4-byte mode is always used) or None if the chip
+        has no (valid) SFDP.
+
+        """
+        buf = bytearray(16)
+        self.read_sfdp(0, buf)
+
+        # First parameter header must be the JEDEC basic flash parameters
+        if buf[:4] != SFDP_SIGNATURE or buf[8] != 0 or buf[15] != 0xFF:
+            return None
+
+        length = min(buf[11], 9)
+        ptp = buf[12] | buf[13] << 8 | buf[14] << 16
+        table = bytearray(4 * length)
+        self.read_sfdp(ptp, table)
+        return parse_bfpt(table)
+
+    def _set_addr_bytes(self, count):
+        self._addr_bytes = count
+        hdr = memoryview(self._hdr)
+        self._hdrs = (hdr[:1 + count], hdr[:2 + count])
+
+    def set_read_mode(self, mode):
+        """Set command used for reading.
+
+        * ``'slow'`` - Read (0x03), limited to a lower SPI clock by many chips
+        * ``'fast'`` - Fast Read (0x0B) with dummy byte, for full SPI clock
+        * ``'dual'`` - Fast Read Dual Output (0x3B)
+        * ``'quad'`` - Fast Read Quad Output (0x6B)
+
+        The dual and quad output modes need an SPI peripheral, which can
+        receive on several data lines. The SPI bus object must provide a
+        ``readinto_multi(buf, lines)`` method for this, which reads the data
+        phase of a transfer using the given number of data lines.
+
+        """
+        cmd, dummy, lines = READ_MODES[mode]
+
+        if lines > 1 and not hasattr(self._spi, 'readinto_multi'):
+            raise ValueError("SPI bus doesn't support read mode '%s'" % mode)
+
+        self.read_mode = mode
+        self._read_cmd = cmd
+        self._read_dummy = dummy
+        self._read_lines = lines
 
     def _write(self, val):
         if isinstance(val, int):
-            self._buf[0] = val
+            self._buf[0] = val & 0xFF
             self._spi.write(self._buf)
         else:
             self._spi.write(val)
 
+    def _write_cmd_addr(self, cmd, addr, dummy=0):
+        hdr = self._hdr
+        hdr[0] = cmd
+        i = 1
+
+        if self._addr_bytes == 4:
+            hdr[1] = addr >> 24 & 0xFF
+            i = 2
+
+        hdr[i] = addr >> 16 & 0xFF
+        hdr[i + 1] = addr >> 8 & 0xFF
+        hdr[i + 2] = addr & 0xFF
+        hdr[i + 3] = 0
+        self._spi.write(self._hdrs[dummy])
+
     def read_block(self, addr, buf):
         self._cs.low()
-        self._write(CMD_READ)
-        self._write(addr >> 16)
-        self._write(addr >> 8)
-        self._write(addr)
-        self._spi.readinto(buf)
+        self._write_cmd_addr(self._read_cmd, addr, self._read_dummy)
+
+        if self._read_lines > 1:
+            self._spi.readinto_multi(buf, self._read_lines)
+        else:
+            self._spi.readinto(buf)
+
         self._cs.high()
 
+    def read(self, addr, buf):
+        """Read len(buf) bytes starting at addr into buf, using the cache.
+
+        Reads may span several sectors. Without a cache, this is the same as
+        ``read_block()``.
+
+        """
+        if not self.cache_sectors:
+            return self.read_block(addr, buf)
+
+        mv = memoryview(buf)
+        pos = 0
+        length = len(buf)
+
+        while pos < length:
+            sector, offset = divmod(addr + pos, SECTOR_SIZE)
+            size = min(length - pos, SECTOR_SIZE - offset)
+            data = self._cached_sector(sector)
+            mv[pos:pos + size] = memoryview(data)[offset:offset + size]
+            pos += size
+
+    def _cached_sector(self, sector):
+        lru = self._lru
+        data = self._cache.get(sector)
+
+        if data is None:
+            if len(lru) >= self.cache_sectors:
+                # Re-use buffer of least recently used sector
+                data = self._cache.pop(lru.pop(0))
+            else:
+                data = bytearray(SECTOR_SIZE)
+
+            self.read_block(sector * SECTOR_SIZE, data)
+            self._cache[sector] = data
+        else:
+            lru.remove(sector)
+
+        lru.append(sector)
+        return data
+
+    def invalidate(self, addr=0, length=None):
+        """Drop sectors overlapping given address range from the cache.
+
+        Without a length, the whole cache is dropped.
+
+        """
+        if length is None:
+            self._cache.clear()
+            self._lru[:] = []
+            return
+
+        for sector in range(addr // SECTOR_SIZE,
+                            (addr + length - 1) // SECTOR_SIZE + 1):
+            if self._cache.pop(sector, None) is not None:
+                self._lru.remove(sector)
+
     def getid(self):
         self._cs.low()
         self._write(CMD_JEDEC_ID)  # id
@@ -61,59 +399,267 @@ class SPIFlash:
         self._cs.high()
         return res
 
-    def wait(self):
+    def read_status(self):
+        """Return value of status register 1."""
+        self._cs.low()
+        self._write(CMD_READ_STATUS)
+        self._spi.readinto(self._buf)
+        self._cs.high()
+        return self._buf[0]
+
+    def busy(self):
+        """Return True while a program or erase operation is in progress."""
+        return bool(self.read_status() & STATUS_BUSY)
+
+    def wait(self, timeout=WAIT_TIMEOUT):
+        """Wait until the chip is not busy.
+
+        Raises ``OSError`` if it is still busy after ``timeout`` ms.
+
+        """
+        t0 = ticks_ms()
+
+        while self.read_status() & STATUS_BUSY:
+            if ticks_diff(ticks_ms(), t0) > timeout:
+                raise OSError("SPI flash busy timeout")
+
+    async def wait_async(self, timeout=WAIT_TIMEOUT, interval=1,
+                         max_interval=50):
+        """Wait until the chip is not busy, yielding to other tasks.
+
+        The status register is polled after ``interval`` ms, with the
+        interval doubling after each poll up to ``max_interval`` ms.
+
+        """
+        t0 = ticks_ms()
+
         while True:
-            self._cs.low()
-            self._write(CMD_READ_STATUS)
-            r = self._spi.read(1)[0]
-            self._cs.high()
+            await self._sleep_ms(interval)
 
-            if r == 0:
+            if not self.read_status() & STATUS_BUSY:
                 return
 
-    def write_block(self, addr, buf):
-        # Write in 256-byte chunks
-        # XXX: Should check that write doesn't go past end of flash ...
-        length = len(buf)
-        pos = 0
+            if ticks_diff(ticks_ms(), t0) > timeout:
+                raise OSError("SPI flash busy timeout")
 
-        while pos < length:
-            size = min(length - pos, PAGE_SIZE)
-            self._cs.low()
-            self._write(CMD_WRITE_ENABLE)
-            self._cs.high()
+            interval = min(interval * 2, max_interval)
 
-            self._cs.low()
-            self._write(CMD_PROGRAM_PAGE)
-            self._write(addr >> 16)
-            self._write(addr >> 8)
-            self._write(addr)
-            self._write(buf[pos:pos + size])
-            self._cs.high()
-            self.wait()
+    async def _sleep_ms(self, ms):
+        """Delay by (sleep) ms milliseconds, yielding to other tasks."""
+        # Wrapped as a method for portability. asyncio is only imported
+        # here, so synchronous use doesn't need the RAM for it
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
 
-            addr += size
-            pos += size
+        await asyncio.sleep(ms / 1000)
 
-    def erase(self, addr, cmd):
+    def _write_enable(self):
         self._cs.low()
         self._write(CMD_WRITE_ENABLE)
         self._cs.high()
 
+    def _program_page(self, addr, data):
+        self._write_enable()
         self._cs.low()
-        self._write(COMMANDS[cmd])
-        self._write(addr >> 16)
-        self._write(addr >> 8)
-        self._write(addr)
+        self._write_cmd_addr(CMD_PROGRAM_PAGE, addr)
+        self._write(data)
         self._cs.high()
-        self.wait()
 
-    def erase_chip(self):
+    def _pages(self, addr, buf):
+        """Check the write range and yield (addr, data) for each page.
+
+        The data is split at 256-byte page boundaries without copying.
+
+        """
+        mv = memoryview(buf)
+        length = len(buf)
+
+        if self.size and addr + length > self.size:
+            raise ValueError("Write past end of flash")
+
+        pos = 0
+        self.invalidate(addr, length)
+
+        while pos < length:
+            size = min(length - pos, PAGE_SIZE - addr % PAGE_SIZE)
+            yield addr, mv[pos:pos + size]
+            addr += size
+            pos += size
+
+    def _verify(self, addr, data):
+        check = memoryview(self._page)[:len(data)]
+        self.read_block(addr, check)
+
+        if check != data:
+            raise OSError("SPI flash verify failed at 0x%06X" % addr)
+
+    def write_block(self, addr, buf, verify=False):
+        """Program buf at addr, which needs not to be page-aligned.
+
+        The data is split at 256-byte page boundaries and sent without
+        copying. With ``verify``, each page is read back after programming and
+        ``OSError`` is raised if it doesn't match, e.g. because the target
+        wasn't erased.
+
+        """
+        for addr, data in self._pages(addr, buf):
+            self._program_page(addr, data)
+            self.wait(PROGRAM_TIMEOUT)
+
+            if verify:
+                self._verify(addr, data)
+
+    async def write_async(self, addr, buf, verify=False):
+        """Like ``write_block()``, but yield while pages are programmed."""
+        for addr, data in self._pages(addr, buf):
+            self._program_page(addr, data)
+            await self.wait_async(PROGRAM_TIMEOUT, max_interval=1)
+
+            if verify:
+                self._verify(addr, data)
+
+    def _start_erase(self, addr, cmd):
+        size = ERASE_SIZES[cmd]
+        self.invalidate(addr & ~(size - 1), size)
+        self._write_enable()
         self._cs.low()
-        self._write(CMD_WRITE_ENABLE)
+        self._write_cmd_addr(COMMANDS[cmd], addr)
         self._cs.high()
 
+    def erase(self, addr, cmd):
+        self._start_erase(addr, cmd)
+        self.wait(ERASE_TIMEOUTS[cmd])
+
+    async def erase_async(self, addr, cmd):
+        """Like ``erase()``, but yield to other tasks while erasing."""
+        self._start_erase(addr, cmd)
+        # Poll at most every quarter of the typical erase time
+        await self.wait_async(ERASE_TIMEOUTS[cmd],
+                              max_interval=ERASE_TIMES[cmd] // 4)
+
+    def is_erased(self, addr, length):
+        """Return True if the given range reads as all 0xFF."""
+        mv = memoryview(self._page)
+        erased = memoryview(ERASED_PAGE)
+        end = addr + length
+
+        while addr < end:
+            size = min(end - addr, PAGE_SIZE)
+
+            if size < PAGE_SIZE:
+                # Last, partial page
+                mv = mv[:size]
+                erased = erased[:size]
+
+            self.read_block(addr, mv)
+
+            if mv != erased:
+                return False
+
+            addr += size
+
+        return True
+
+    def plan_erase(self, start, length, skip_erased=True):
+        """Return list of (addr, cmd) erases for range and estimated time.
+
+        ``start`` and ``length`` must be multiples of the 4 KiB sector size.
+        The range is split into the largest aligned blocks, which fit into
+        it. Blocks are erased as a whole or by their 32k / 4k parts,
+        whichever is estimated to be faster. If ``skip_erased`` is true,
+        sectors which read as all 0xFF are left out. If the range is the
+        whole chip and no sector is left out, the plan is a single chip
+        erase ``(0, 'chip')``.
+
+        The estimated time is in milliseconds, based on ``ERASE_TIMES``.
+
+        """
+        if start % SECTOR_SIZE or length % SECTOR_SIZE:
+            raise ValueError("Erase range must be aligned to %i bytes"
+                             % SECTOR_SIZE)
+
+        end = start + length
+        dirty = [not (skip_erased and self.is_erased(addr, SECTOR_SIZE))
+                 for addr in range(start, end, SECTOR_SIZE)]
+
+        if start == 0 and length == self.size and all(dirty):
+            return [(0, 'chip')], CHIP_ERASE_TIME * length >> 20
+
+        plan = []
+        total = 0
+        addr = start
+
+        while addr < end:
+            for cmd in ('64k', '32k', '4k'):
+                size = ERASE_SIZES[cmd]
+
+                if (not addr % size and addr + size <= end and
+                        (cmd in self.erase_types or cmd == '4k')):
+                    break
+
+            time, erases = self._plan_block(addr, cmd, dirty, start)
+            plan.extend(erases)
+            total += time
+            addr += size
+
+        return plan, total
+
+    def _plan_block(self, addr, cmd, dirty, start):
+        size = ERASE_SIZES[cmd]
+        first = (addr - start) // SECTOR_SIZE
+
+        if not any(dirty[first:first + size // SECTOR_SIZE]):
+            return 0, []
+
+        if cmd == '4k':
+            return ERASE_TIMES[cmd], [(addr, cmd)]
+
+        part = '32k' if cmd == '64k' and '32k' in self.erase_types else '4k'
+        part_size = ERASE_SIZES[part]
+        time = 0
+        erases = []
+
+        for pos in range(addr, addr + size, part_size):
+            t, e = self._plan_block(pos, part, dirty, start)
+            time += t
+            erases.extend(e)
+
+        if time < ERASE_TIMES[cmd]:
+            return time, erases
+
+        return ERASE_TIMES[cmd], [(addr, cmd)]
+
+    def erase_range(self, start, length, skip_erased=True):
+        """Erase range with the fewest erase commands (see ``plan_erase()``).
+
+        Returns the estimated and the measured time in milliseconds.
+
+        """
+        t0 = ticks_ms()
+        plan, estimated = self.plan_erase(start, length, skip_erased)
+
+        for addr, cmd in plan:
+            if cmd == 'chip':
+                self.erase_chip()
+            else:
+                self.erase(addr, cmd)
+
+        return estimated, ticks_diff(ticks_ms(), t0)
+
+    def _start_erase_chip(self):
+        self.invalidate()
+        self._write_enable()
         self._cs.low()
         self._write(CMD_ERASE_CHIP)
         self._cs.high()
-        self.wait()
+
+    def erase_chip(self):
+        self._start_erase_chip()
+        self.wait(CHIP_ERASE_TIMEOUT)
+
+    async def erase_chip_async(self):
+        """Like ``erase_chip()``, but yield to other tasks while erasing."""
+        self._start_erase_chip()
+        await self.wait_async(CHIP_ERASE_TIMEOUT, max_interval=500)
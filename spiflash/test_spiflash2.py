@@ -17,6 +17,9 @@ def test(spi=3, cs='PB0'):
     flash.wait()
     id_ = flash.getid()
     print("ID:", ubinascii.hexlify(id_))
+    flash.probe()
+    print("Chip: {}, {} bytes, read mode '{}', erase sizes {}".format(
+        flash.name, flash.size, flash.read_mode, flash.erase_types))
 
     print("Reading block (32b) from address 0...")
     buf = bytearray(32)
@@ -54,14 +57,96 @@ def test(spi=3, cs='PB0'):
     else:
         print("write/read FAILed")
 
+    start, length = 1024 * 1024, 132 * 1024
+    print("Erasing {}k range at address {}...".format(length // 1024, start))
+    estimated, measured = flash.erase_range(start, length)
+    print("erase_range: estimated {} ms, measured {} ms".format(estimated,
+                                                               measured))
+
     print("Timing 32k read from address 0...")
     gc.collect()
     buf = bytearray(32 * 1024)
-    t1 = ticks_us()
-    flash.read_block(0, buf)
-    t = ticks_diff(ticks_us(), t1)
-    mbs = len(buf) * 8. / t
-    print("read({}) {} us, {} mbs".format(len(buf), t, mbs))
+    bench_read_modes(flash, buf)
+    del buf
+    bench_writes(flash)
+
+
+def bench_read_modes(flash, buf, modes=('slow', 'fast', 'dual', 'quad')):
+    """Report read speed in MB/s for each read mode supported by the bus."""
+    for mode in modes:
+        try:
+            flash.set_read_mode(mode)
+        except ValueError as exc:
+            print("{}: {}".format(mode, exc))
+            continue
+
+        t1 = ticks_us()
+        flash.read_block(0, buf)
+        t = ticks_diff(ticks_us(), t1)
+        print("{}: read({}) {} us, {:.2f} MB/s".format(
+            mode, len(buf), t, len(buf) / t))
+
+
+def _write_block_sliced(flash, addr, buf):
+    # Previous write path: single-byte writes for command and address and
+    # copying slices, for comparison
+    pos = 0
+
+    while pos < len(buf):
+        size = min(len(buf) - pos, 256 - addr % 256)
+        flash._write_enable()
+        flash._cs.low()
+        flash._write(0x02)
+        flash._write(addr >> 16)
+        flash._write(addr >> 8)
+        flash._write(addr)
+        flash._write(buf[pos:pos + size])
+        flash._cs.high()
+        flash.wait()
+        addr += size
+        pos += size
+
+
+def bench_writes(flash, addr=1024 * 1024, size=16 * 1024):
+    """Compare write speed of write_block() with the previous write path."""
+    buf = bytearray(range(256)) * (size // 256)
+    tests = (
+        ('sliced', lambda a: _write_block_sliced(flash, a, buf)),
+        ('write_block', lambda a: flash.write_block(a, buf)),
+        ('write_block verify', lambda a: flash.write_block(a, buf, True)),
+    )
+
+    for name, func in tests:
+        flash.erase_range(addr, size)
+        gc.collect()
+        t1 = ticks_us()
+        func(addr)
+        t = ticks_diff(ticks_us(), t1)
+        print("{}: write({}) {} us, {:.3f} MB/s".format(
+            name, size, t, size / t))
+
+
+def bench_reads(spi=3, cs='PB0', count=1000, size=16, span=16 * 4096,
+                cache_size=32 * 1024):
+    """Compare small random reads with and without sector cache."""
+    from random import getrandbits, seed
+
+    cs = Pin(cs, Pin.OUT)
+    spi = SPI(spi, baudrate=42000000, polarity=0, phase=0)
+    buf = bytearray(size)
+
+    for cache in (0, cache_size):
+        gc.collect()
+        flash = SPIFlash(spi, cs, cache_size=cache)
+        seed(42)
+        t1 = ticks_us()
+
+        for _ in range(count):
+            flash.read(getrandbits(24) % (span - size), buf)
+
+        t = ticks_diff(ticks_us(), t1)
+        print("{} random reads ({}b) with {}b cache: {} us, {} us/read"
+              .format(count, size, cache, t, t / count))
 
 
 if __name__ == 'main':
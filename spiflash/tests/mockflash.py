@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Simulated SPI NOR flash chip for testing the SPIFlash library.
+
+Models a Winbond W25Q-like chip: bits can only be programmed from 1 to 0,
+programming and erasing need the write enable latch to be set, page programs
+wrap around within their 256-byte page and the chip reports busy for a number
+of status reads after program and erase operations.
+
+"""
+
+PAGE_SIZE = 256
+SECTOR_SIZE = 4096
+
+CMD_READ_STATUS = 0x05
+CMD_WRITE_ENABLE = 0x06
+CMD_PROGRAM_PAGE = 0x02
+ERASE_SIZES = {0x20: 4096, 0x52: 32768, 0xD8: 65536}
+CMD_ERASE_CHIP = 0xC7
+CMD_JEDEC_ID = 0x9F
+CMD_READ_SFDP = 0x5A
+CMD_ENTER_4B = 0xB7
+# command: number of dummy bytes after the address
+READ_COMMANDS = {0x03: 0, 0x0B: 1, 0x3B: 1, 0x6B: 1}
+
+
+class MockCS:
+    def __init__(self, flash):
+        self.flash = flash
+        self.state = 1
+
+    def low(self):
+        self.state = 0
+        self.flash.select()
+
+    def high(self):
+        if not self.state:
+            self.state = 1
+            self.flash.deselect()
+
+    def value(self, state=None):
+        if state is None:
+            return self.state
+
+        self.high() if state else self.low()
+
+    __call__ = value
+
+
+class MockSPI:
+    """SPI bus interface of the mock flash chip."""
+
+    def __init__(self, flash):
+        self.flash = flash
+        self.calls = 0
+
+    def write(self, buf):
+        self.calls += 1
+        self.flash.receive(bytes(buf))
+
+    def read(self, nbytes, write=0):
+        buf = bytearray(nbytes)
+        self.readinto(buf)
+        return bytes(buf)
+
+    def readinto(self, buf, write=0):
+        self.calls += 1
+        self.flash.send(buf)
+
+    def write_readinto(self, wbuf, rbuf):
+        self.calls += 1
+        self.flash.receive(bytes(wbuf))
+        self.flash.send(rbuf)
+
+
+class MockQSPI(MockSPI):
+    """SPI bus interface supporting multiple data lines for reading."""
+
+    def __init__(self, flash):
+        super().__init__(flash)
+        self.lines_used = []
+
+    def readinto_multi(self, buf, lines):
+        self.lines_used.append(lines)
+        self.readinto(buf)
+
+
+class MockFlash:
+    def __init__(self, size=1 << 20, jedec_id=b'\xef\x40\x14', busy_polls=0,
+                 spi=MockSPI, sfdp=b''):
+        self.mem = bytearray(b'\xff' * size)
+        self.size = size
+        self.jedec_id = jedec_id
+        # Contents of the SFDP area, reads as 0xFF where not given
+        self.sfdp = sfdp
+        self.addr_bytes = 3
+        # Number of status reads the chip reports busy after program / erase
+        self.busy_polls = busy_polls
+        self.busy = 0
+        self.wel = False
+        self.cs = MockCS(self)
+        self.spi = spi(self)
+        self.erase_counts = [0] * (size // SECTOR_SIZE)
+        self.commands = {}
+        self.transactions = 0
+        self.bytes_read = 0
+        self.status_reads = 0
+        self.ignored = 0
+        self.read_commands = []
+        self._tx = None
+
+    def select(self):
+        self._tx = bytearray()
+        self._read_pos = 0
+
+    def receive(self, data):
+        assert self._tx is not None, "CS not active"
+        self._tx.extend(data)
+
+    def send(self, buf):
+        tx = self._tx
+        assert tx is not None, "CS not active"
+        cmd = tx[0]
+        n = len(buf)
+
+        if cmd == CMD_READ_STATUS:
+            self.status_reads += 1
+            status = (1 if self.busy else 0) | (2 if self.wel else 0)
+
+            if self.busy:
+                self.busy -= 1
+
+            buf[:] = bytes([status]) * n
+        elif cmd == CMD_JEDEC_ID:
+            buf[:] = (self.jedec_id * n)[:n]
+        elif cmd == CMD_READ_SFDP:
+            assert len(tx) == 5, "Invalid SFDP read command"
+            addr = int.from_bytes(tx[1:4], 'big') + self._read_pos
+            data = self.sfdp[addr:addr + n]
+            buf[:] = data + b'\xff' * (n - len(data))
+            self._read_pos += n
+        elif cmd in READ_COMMANDS:
+            header = 1 + self.addr_bytes + READ_COMMANDS[cmd]
+            assert len(tx) == header, "Invalid read command header"
+            addr = self._addr(tx) + self._read_pos
+            buf[:] = bytes(self.mem[(addr + i) % self.size] for i in range(n))
+            self._read_pos += n
+            self.read_commands.append(cmd)
+            self.bytes_read += n
+        else:
+            raise AssertionError("Unexpected read for command 0x%02X" % cmd)
+
+    def deselect(self):
+        tx, self._tx = self._tx, None
+
+        if not tx:
+            return
+
+        cmd = tx[0]
+        self.transactions += 1
+        self.commands[cmd] = self.commands.get(cmd, 0) + 1
+
+        if cmd == CMD_WRITE_ENABLE:
+            self.wel = True
+        elif cmd == CMD_ENTER_4B:
+            self.addr_bytes = 4
+        elif cmd == CMD_PROGRAM_PAGE:
+            self._write_op(self.program, self._addr(tx),
+                           tx[1 + self.addr_bytes:])
+        elif cmd in ERASE_SIZES:
+            assert len(tx) == 1 + self.addr_bytes, "Invalid erase command"
+            self._write_op(self.erase, self._addr(tx), ERASE_SIZES[cmd])
+        elif cmd == CMD_ERASE_CHIP:
+            self._write_op(self.erase, 0, self.size)
+
+    def _addr(self, tx):
+        return int.from_bytes(tx[1:1 + self.addr_bytes], 'big') % self.size
+
+    def _write_op(self, func, addr, arg):
+        if self.busy or not self.wel:
+            self.ignored += 1
+            return
+
+        self.wel = False
+        self.busy = self.busy_polls
+        func(addr, arg)
+
+    def program(self, addr, data):
+        page = addr & ~(PAGE_SIZE - 1)
+
+        for i, byte in enumerate(data[-PAGE_SIZE:]):
+            # Addresses wrap around within the page
+            pos = page + (addr + i) % PAGE_SIZE
+            self.mem[pos] &= byte
+
+    def erase(self, addr, size):
+        addr &= ~(size - 1)
+        self.mem[addr:addr + size] = b'\xff' * size
+
+        for sector in range(addr // SECTOR_SIZE, (addr + size) // SECTOR_SIZE):
+            self.erase_counts[sector] += 1
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for status polling and the async API of SPIFlash."""
+
+import asyncio
+import sys
+sys.path.insert(0, '..')
+
+from spiflash import SPIFlash
+from mockflash import MockFlash
+
+
+def make_flash(**kwargs):
+    mock = MockFlash(**kwargs)
+    return mock, SPIFlash(mock.spi, mock.cs)
+
+
+def test_wait_ignores_wel():
+    mock, flash = make_flash()
+    # Write enable latch set, but not busy
+    flash._write_enable()
+    assert flash.read_status() == 0x02
+    assert not flash.busy()
+    flash.wait()
+
+
+def test_wait_timeout():
+    mock, flash = make_flash()
+    mock.busy = 10 ** 9
+
+    try:
+        flash.wait(timeout=10)
+    except OSError:
+        pass
+    else:
+        raise AssertionError("Expected OSError")
+
+
+def test_erase_async_yields():
+    mock, flash = make_flash(busy_polls=6)
+    mock.mem[:] = b'\x00' * mock.size
+    ticks = []
+
+    async def other_task():
+        while True:
+            ticks.append(mock.busy)
+            await asyncio.sleep(0)
+
+    async def main():
+        task = asyncio.create_task(other_task())
+        await flash.erase_async(4096, '4k')
+        task.cancel()
+
+    asyncio.run(main())
+    assert mock.mem[4096:8192] == b'\xff' * 4096
+    assert mock.mem[0] == 0
+    # Other task ran while the chip was busy
+    assert any(ticks)
+    assert mock.status_reads == 7
+
+
+def test_write_async():
+    mock, flash = make_flash(busy_polls=2)
+    data = bytes(range(256)) * 3
+    asyncio.run(flash.write_async(100, data))
+    assert mock.mem[100:100 + len(data)] == data
+    assert mock.ignored == 0
+    # Four pages touched, each polled until not busy
+    assert mock.status_reads == 4 * 3
+
+
+def test_write_async_checks_like_write_block():
+    mock, flash = make_flash()
+    flash.size = mock.size
+    asyncio.run(flash.write_async(10, b'\x0f' * 300, verify=True))
+
+    for addr, data, exc_type in ((300, b'\xf0' * 20, OSError),
+                                 (flash.size - 10, bytes(20), ValueError)):
+        try:
+            asyncio.run(flash.write_async(addr, data, verify=True))
+        except exc_type:
+            pass
+        else:
+            raise AssertionError("Expected %s" % exc_type.__name__)
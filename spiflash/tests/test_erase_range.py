@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for SPIFlash.erase_range()."""
+
+import sys
+sys.path.insert(0, '..')
+
+from spiflash import SPIFlash
+from mockflash import MockFlash
+
+KB = 1024
+
+
+def make_flash():
+    mock = MockFlash()
+    # Fill flash with non-erased data
+    mock.mem[:] = b'\x00' * mock.size
+    return mock, SPIFlash(mock.spi, mock.cs)
+
+
+def erases(mock):
+    return {size: mock.commands.get(cmd, 0)
+            for cmd, size in ((0x20, '4k'), (0x52, '32k'), (0xD8, '64k'))}
+
+
+def test_aligned_range_uses_large_blocks():
+    mock, flash = make_flash()
+    estimated, measured = flash.erase_range(64 * KB, 128 * KB)
+    assert erases(mock) == {'4k': 0, '32k': 0, '64k': 2}
+    assert estimated == 300
+    assert measured >= 0
+    assert mock.mem[64 * KB:192 * KB] == b'\xff' * 128 * KB
+    assert mock.mem[64 * KB - 1] == 0
+    assert mock.mem[192 * KB] == 0
+
+
+def test_unaligned_range():
+    mock, flash = make_flash()
+    # 4k..32k: seven 4k sectors, 32k..64k: 32k block, 64k..72k: two sectors
+    plan, estimated = flash.plan_erase(4 * KB, 68 * KB)
+    assert [cmd for addr, cmd in plan] == ['4k'] * 7 + ['32k'] + ['4k'] * 2
+    assert plan[7] == (32 * KB, '32k')
+    assert estimated == 9 * 45 + 120
+    flash.erase_range(4 * KB, 68 * KB)
+    assert mock.mem[:4 * KB] == b'\x00' * 4 * KB
+    assert mock.mem[4 * KB:72 * KB] == b'\xff' * 68 * KB
+    assert mock.mem[72 * KB] == 0
+
+
+def test_skip_erased_sectors():
+    mock, flash = make_flash()
+    mock.mem[:] = b'\xff' * mock.size
+    mock.mem[20 * KB] = 0
+    flash.erase_range(0, 256 * KB)
+    # Only the one dirty sector is erased
+    assert erases(mock) == {'4k': 1, '32k': 0, '64k': 0}
+    assert flash.erase_range(0, 256 * KB)[0] == 0
+    assert sum(mock.erase_counts) == 1
+    # Four dirty sectors in one half of a 64k block: a 32k erase is faster
+    for sector in (1, 2, 3, 5):
+        mock.mem[sector * 4 * KB] = 0
+
+    assert flash.plan_erase(0, 64 * KB) == ([(0, '32k')], 120)
+    # Without skipping, everything is erased
+    assert flash.plan_erase(0, 64 * KB, skip_erased=False) == \
+        ([(0, '64k')], 150)
+
+
+def test_whole_chip():
+    mock, flash = make_flash()
+    flash.size = mock.size
+    plan, estimated = flash.plan_erase(0, mock.size)
+    assert plan == [(0, 'chip')]
+    assert estimated == 2500 * mock.size >> 20
+    flash.erase_range(0, mock.size)
+    assert mock.commands[0xC7] == 1
+    assert erases(mock) == {'4k': 0, '32k': 0, '64k': 0}
+    assert mock.mem == b'\xff' * mock.size
+    # Erased sectors are skipped instead
+    mock.mem[0] = 0
+    assert flash.plan_erase(0, mock.size) == ([(0, '4k')], 45)
+
+
+def test_alignment():
+    mock, flash = make_flash()
+
+    try:
+        flash.erase_range(100, 4 * KB)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected ValueError")
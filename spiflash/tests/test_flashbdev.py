@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the SPIFlash block device adapter."""
+
+import sys
+sys.path.insert(0, '..')
+
+from spiflash import SPIFlash
+from flashbdev import FlashBlockDev
+from mockflash import CMD_PROGRAM_PAGE, MockFlash
+
+BLOCK_SIZE = 4096
+
+
+def make_bdev(**kwargs):
+    mock = MockFlash()
+    flash = SPIFlash(mock.spi, mock.cs)
+    return mock, FlashBlockDev(flash, 256 * 1024, **kwargs)
+
+
+def programs(mock):
+    return mock.commands.get(CMD_PROGRAM_PAGE, 0)
+
+
+def test_ioctl():
+    mock, bdev = make_bdev(start=64 * 1024)
+    assert bdev.ioctl(1, 0) == 0
+    assert bdev.ioctl(4, 0) == 64
+    assert bdev.ioctl(5, 0) == BLOCK_SIZE
+    assert bdev.ioctl(3, 0) == 0
+
+
+def test_write_read_blocks():
+    mock, bdev = make_bdev(start=64 * 1024)
+    data = bytearray(range(256)) * 16
+    bdev.writeblocks(1, data)
+    assert mock.mem[68 * 1024:72 * 1024] == data
+    buf = bytearray(2 * BLOCK_SIZE)
+    bdev.readblocks(0, buf)
+    assert buf == b'\xff' * BLOCK_SIZE + data
+    # Writing to erased flash needs no erase
+    assert sum(mock.erase_counts) == 0
+
+
+def test_rewrite_erases_only_when_needed():
+    mock, bdev = make_bdev()
+    data = bytearray(b'\xf0' * BLOCK_SIZE)
+    bdev.writeblocks(2, data)
+    count = programs(mock)
+
+    # Same data: nothing to do
+    bdev.writeblocks(2, data)
+    assert programs(mock) == count
+    assert sum(mock.erase_counts) == 0
+
+    # Only 1 -> 0 changes in one page: program that page only
+    data[300] = 0x00
+    bdev.writeblocks(2, data)
+    assert programs(mock) == count + 1
+    assert sum(mock.erase_counts) == 0
+
+    # 0 -> 1 change needs an erase
+    data[300] = 0xFF
+    bdev.writeblocks(2, data)
+    assert mock.erase_counts[2] == 1
+    assert mock.mem[2 * BLOCK_SIZE:3 * BLOCK_SIZE] == data
+
+
+def test_erase_skips_erased_blocks():
+    mock, bdev = make_bdev()
+    assert bdev.ioctl(6, 3) == 0
+    assert mock.erase_counts[3] == 0
+    bdev.writeblocks(3, b'\x00' * 16, 100)
+    assert bdev.ioctl(6, 3) == 0
+    assert mock.erase_counts[3] == 1
+    assert mock.mem[3 * BLOCK_SIZE:4 * BLOCK_SIZE] == b'\xff' * BLOCK_SIZE
+
+
+def test_write_with_offset_across_pages():
+    mock, bdev = make_bdev()
+    data = bytes(range(200)) * 2
+    bdev.writeblocks(1, data, 200)
+    buf = bytearray(len(data))
+    bdev.readblocks(1, buf, 200)
+    assert buf == data
+
+
+def test_large_blocks():
+    mock, bdev = make_bdev(block_size=2 * BLOCK_SIZE)
+    assert bdev.ioctl(4, 0) == 32
+    bdev.writeblocks(0, b'\x00' * 2 * BLOCK_SIZE)
+    bdev.writeblocks(0, b'\xff' * 2 * BLOCK_SIZE)
+    assert mock.erase_counts[:3] == [1, 1, 0]
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the wear-leveling key-value store on SPIFlash."""
+
+import sys
+sys.path.insert(0, '..')
+
+from spiflash import SPIFlash
+from flashkv import FlashKV
+from mockflash import CMD_PROGRAM_PAGE, MockFlash
+
+SECTORS = 8
+SIZE = SECTORS * 4096
+START = 64 * 1024
+
+
+def make_kv(mock=None, **kwargs):
+    if mock is None:
+        mock = MockFlash()
+
+    flash = SPIFlash(mock.spi, mock.cs, cache_size=8192)
+    return mock, FlashKV(flash, SIZE, start=START, **kwargs)
+
+
+def region_erases(mock):
+    first = START // 4096
+    return mock.erase_counts[first:first + SECTORS]
+
+
+def test_set_get_delete():
+    mock, kv = make_kv()
+    kv[1] = b'one'
+    kv[2] = b'two'
+    # Buffered in RAM until flushed
+    assert kv[1] == b'one'
+    assert mock.commands.get(CMD_PROGRAM_PAGE, 0) == 0
+    kv.flush()
+    assert kv.get(1) == b'one'
+    assert kv.get(2) == b'two'
+    del kv[1]
+    kv.flush()
+    assert kv.get(1) is None
+    assert 1 not in kv
+    assert kv.keys() == [2]
+
+    try:
+        kv[1]
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("Expected KeyError")
+
+
+def test_coalesce_writes():
+    mock, kv = make_kv()
+
+    for i in range(100):
+        kv.set(5, b'%i' % i)
+
+    kv.flush()
+    assert kv.get(5) == b'99'
+    # One sector header and one record
+    assert mock.commands[CMD_PROGRAM_PAGE] == 2
+
+
+def test_recover_after_restart():
+    mock, kv = make_kv()
+
+    for i in range(500):
+        kv.set(i % 20, b'value %i' % i)
+        kv.flush()
+
+    kv.delete(3)
+    kv.flush()
+    mock, kv2 = make_kv(mock)
+
+    for key in range(20):
+        expected = None if key == 3 else kv.get(key)
+        assert kv2.get(key) == expected
+        assert expected is None or expected.startswith(b'value')
+
+    assert sorted(kv2.keys()) == sorted(kv.keys())
+    # New records continue after the recovered ones
+    kv2[3] = b'back'
+    kv2.flush()
+    assert make_kv(mock)[1].get(3) == b'back'
+
+
+def test_wear_leveling():
+    mock, kv = make_kv()
+    value = bytes(range(100))
+    writes = 2000
+
+    for i in range(writes):
+        kv.set(i % 4, value)
+        kv.flush()
+
+        if i % 50 == 0:
+            kv.maintain()
+
+    erases = region_erases(mock)
+    print("%i writes, %i erases: %s" % (writes, sum(erases), erases))
+    assert sum(erases) < writes // 30
+    # Erases are spread evenly over all sectors
+    assert max(erases) - min(erases) <= 2
+
+    for key in range(4):
+        assert kv.get(key) == value
+
+
+def test_no_space():
+    mock, kv = make_kv()
+    value = b'x' * 2000
+
+    try:
+        for key in range(SECTORS * 2):
+            kv.set(key, value)
+            kv.flush()
+    except OSError as exc:
+        assert exc.args[0] == 28
+    else:
+        raise AssertionError("Expected OSError")
+
+
+def test_maintain_full_store_does_not_erase():
+    for size in (20, 1500):
+        mock = MockFlash()
+        flash = SPIFlash(mock.spi, mock.cs, cache_size=8192)
+        kv = FlashKV(flash, 4 * 4096, start=START)
+        key = 0
+
+        try:
+            while True:
+                kv.set(key, bytes([key & 0xFF]) * size)
+                kv.flush()
+                key += 1
+        except OSError as exc:
+            assert exc.args[0] == 28
+
+        erases = sum(region_erases(mock))
+
+        for _ in range(10):
+            kv.maintain()
+
+        # All records are current, so no sector is worth an erase
+        assert sum(region_erases(mock)) == erases
+
+        for k in range(key):
+            assert kv.get(k) == bytes([k & 0xFF]) * size
+
+
+def test_erase_counts_survive_restart():
+    mock, kv = make_kv()
+
+    for i in range(1000):
+        kv.set(i % 4, b'x' * 100)
+        kv.flush()
+        kv.maintain()
+
+    counts = list(kv.erase_counts)
+    assert sum(counts) > SECTORS
+    assert len(kv._free) >= 2
+    mock, kv2 = make_kv(mock)
+    assert kv2.erase_counts == counts
+    assert region_erases(mock) == counts
+
+
+def test_flush_keeps_value_on_error():
+    mock, kv = make_kv()
+    value = b'x' * 2000
+    key = 0
+
+    try:
+        while True:
+            kv.set(key, value)
+            kv.flush()
+            key += 1
+    except OSError as exc:
+        assert exc.args[0] == 28
+
+    # The value, which didn't fit, is still pending
+    assert kv.get(key) == value
+    assert kv.get(key - 1) == value
+    assert kv._pending_size == 4 + len(value)
+    kv.delete(key)
+    kv.flush()
+    assert kv.get(key) is None
+    assert kv._pending_size == 0
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the circular record log on SPIFlash."""
+
+import sys
+sys.path.insert(0, '..')
+
+from spiflash import SPIFlash
+from flashlog import FlashLog
+from mockflash import CMD_PROGRAM_PAGE, MockFlash
+
+FMT = '<Ihhh'
+SECTORS = 4
+# 10-byte records: 24 in the first page of a sector, 25 in the others
+PER_SECTOR = 24 + 15 * 25
+
+
+def make_log(mock=None, fmt=FMT):
+    if mock is None:
+        mock = MockFlash()
+
+    flash = SPIFlash(mock.spi, mock.cs)
+    return mock, FlashLog(flash, SECTORS * 4096, fmt, start=8192)
+
+
+def records(first, count):
+    return [(i, i % 100, -i % 50, 7) for i in range(first, first + count)]
+
+
+def test_append_and_read():
+    mock, log = make_log()
+    data = records(1, 100)
+
+    for rec in data:
+        log.append(*rec)
+
+    # Buffered records are included
+    assert list(log) == data
+    log.flush()
+    assert list(log) == data
+
+
+def test_full_pages_only():
+    mock, log = make_log()
+    programs = mock.commands[CMD_PROGRAM_PAGE]
+
+    for rec in records(1, 24 + 25 + 3):
+        log.append(*rec)
+
+    assert mock.commands[CMD_PROGRAM_PAGE] - programs == 2
+    log.flush()
+    assert mock.commands[CMD_PROGRAM_PAGE] - programs == 3
+
+
+def test_recovery():
+    mock, log = make_log()
+    data = records(1, 1000)
+
+    for rec in data[:500]:
+        log.append(*rec)
+
+    log.flush()
+    mock, log = make_log(mock)
+    assert list(log) == data[:500]
+
+    for rec in data[500:]:
+        log.append(*rec)
+
+    log.flush()
+    mock, log = make_log(mock)
+    assert list(log) == data
+
+
+def test_wrap_around():
+    mock, log = make_log()
+    data = records(1, 5000)
+
+    for rec in data:
+        log.append(*rec)
+
+    result = list(log)
+    # Oldest sectors were dropped, the newest records are kept in order
+    assert result == data[-len(result):]
+    assert 3 * PER_SECTOR < len(result) <= 4 * PER_SECTOR
+    mock, log = make_log(mock)
+    flushed = list(log)
+    assert flushed == result[:len(flushed)]
+    # Sectors used after the first round were erased once
+    assert sum(mock.erase_counts) == 5000 // PER_SECTOR + 1 - SECTORS
+
+
+def test_clear():
+    mock, log = make_log()
+
+    for rec in records(1, 50):
+        log.append(*rec)
+
+    log.clear()
+    assert list(log) == []
+    log.append(*records(7, 1)[0])
+    log.flush()
+    assert list(make_log(mock)[1]) == records(7, 1)
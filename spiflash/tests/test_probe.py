@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for chip detection using JEDEC ID and SFDP in SPIFlash."""
+
+import sys
+sys.path.insert(0, '..')
+
+from binascii import unhexlify
+
+from spiflash import SPIFlash
+from mockflash import MockFlash, MockQSPI
+
+MB = 1 << 20
+
+
+def sfdp_dump(header, bfpt):
+    # Parameter table located at 0x80 as on Winbond chips
+    header = unhexlify(header.replace(' ', ''))
+    bfpt = unhexlify(bfpt.replace(' ', ''))
+    return header + b'\xff' * (0x80 - len(header)) + bfpt
+
+
+# SFDP header and basic flash parameter table of a W25Q128JV
+W25Q128JV_SFDP = sfdp_dump(
+    '53464450 050100ff 00050110 800000ff',
+    'e520f9ff ffffff07 44eb086b 083b42bb feffffff ffff0000 ffff40eb 0c200f52'
+    '10d80000 3602a600 82ea14c9 e9637633 7a757a75 f7a2d55c 19f74dff e930f880')
+# W25Q256JV: 256 Mbit, 3 or 4-byte addressing
+W25Q256JV_SFDP = sfdp_dump(
+    '53464450 060101ff 00060110 800000ff',
+    'e520fbff ffffff0f 44eb086b 083b42bb feffffff ffff0000 ffff40eb 0c200f52'
+    '10d80000 3602a600 82ea14c9 e9637633 7a757a75 f7a2d55c 19f74dff e930f880')
+
+
+def test_w25q128_sfdp():
+    mock = MockFlash(16 * MB, b'\xef\x40\x18', spi=MockQSPI,
+                     sfdp=W25Q128JV_SFDP)
+    flash = SPIFlash(mock.spi, mock.cs, probe=True)
+    assert flash.name == 'W25Q128'
+    assert flash.size == 16 * MB
+    assert flash.max_freq == 133000000
+    assert set(flash.read_modes) == {'slow', 'fast', 'dual', 'quad'}
+    assert flash.erase_types == ('4k', '32k', '64k')
+    assert flash.read_mode == 'quad'
+    assert mock.addr_bytes == 3
+
+
+def test_w25q256_uses_4byte_addresses():
+    mock = MockFlash(32 * MB, b'\xef\x40\x19', sfdp=W25Q256JV_SFDP)
+    flash = SPIFlash(mock.spi, mock.cs, probe=True)
+    assert flash.size == 32 * MB
+    # No multi-line reads on this bus
+    assert flash.read_mode == 'fast'
+    assert mock.addr_bytes == 4
+    addr = 20 * MB + 4000
+    flash.write_block(addr, b'above 16 MB')
+    assert mock.mem[addr:addr + 11] == b'above 16 MB'
+    buf = bytearray(11)
+    flash.read_block(addr, buf)
+    assert buf == b'above 16 MB'
+    flash.erase_range(20 * MB, 64 * 1024)
+    assert mock.mem[addr] == 0xFF
+
+
+def test_no_sfdp():
+    # Known chip from table
+    mock = MockFlash(1 * MB)
+    flash = SPIFlash(mock.spi, mock.cs, probe=True)
+    assert (flash.name, flash.size) == ('W25Q80', 1 * MB)
+    assert flash.read_mode == 'fast'
+
+    # Unknown chip: size from capacity byte
+    mock = MockFlash(2 * MB, b'\x01\x40\x15')
+    flash = SPIFlash(mock.spi, mock.cs, probe=True)
+    assert (flash.name, flash.size) == (None, 2 * MB)
+
+    try:
+        flash.write_block(2 * MB - 4, b'too long')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected ValueError")
+
+
+def test_no_chip():
+    mock = MockFlash(jedec_id=b'\xff\xff\xff')
+
+    try:
+        SPIFlash(mock.spi, mock.cs, probe=True)
+    except OSError:
+        pass
+    else:
+        raise AssertionError("Expected OSError")
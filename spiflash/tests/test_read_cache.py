@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the SPIFlash sector read cache."""
+
+import sys
+sys.path.insert(0, '..')
+
+from spiflash import SECTOR_SIZE, SPIFlash
+from mockflash import MockFlash
+
+
+def make_flash(cache_size=0):
+    mock = MockFlash()
+
+    for i in range(0, 64 * 1024, 256):
+        mock.mem[i:i + 256] = bytes(range(256))
+
+    return mock, SPIFlash(mock.spi, mock.cs, cache_size=cache_size)
+
+
+def test_read_block_single_transfer_header():
+    mock, flash = make_flash()
+    buf = bytearray(4)
+    flash.read_block(0x1234, buf)
+    assert buf == bytes([0x34, 0x35, 0x36, 0x37])
+    # Header and data
+    assert mock.spi.calls == 2
+
+
+def test_uncached_read():
+    mock, flash = make_flash()
+    buf = bytearray(8)
+    flash.read(10, buf)
+    flash.read(10, buf)
+    assert buf == bytes(range(10, 18))
+    assert mock.bytes_read == 16
+
+
+def test_cached_read():
+    mock, flash = make_flash(2 * SECTOR_SIZE)
+    buf = bytearray(8)
+
+    for _ in range(10):
+        flash.read(300, buf)
+
+    assert buf == bytes(range(44, 52))
+    assert mock.bytes_read == SECTOR_SIZE
+
+
+def test_read_across_sectors():
+    mock, flash = make_flash(2 * SECTOR_SIZE)
+    buf = bytearray(16)
+    flash.read(SECTOR_SIZE - 8, buf)
+    assert buf == bytes(range(248, 256)) + bytes(range(8))
+    assert mock.bytes_read == 2 * SECTOR_SIZE
+
+
+def test_lru_eviction():
+    mock, flash = make_flash(2 * SECTOR_SIZE)
+    buf = bytearray(1)
+    flash.read(0, buf)
+    flash.read(SECTOR_SIZE, buf)
+    flash.read(0, buf)
+    # Evicts sector 1
+    flash.read(2 * SECTOR_SIZE, buf)
+    assert sorted(flash._cache) == [0, 2]
+    flash.read(0, buf)
+    assert mock.bytes_read == 3 * SECTOR_SIZE
+
+
+def test_write_and_erase_invalidate():
+    mock, flash = make_flash(4 * SECTOR_SIZE)
+    buf = bytearray(4)
+    flash.read(0x10000, buf)
+    flash.erase(0x10000, '4k')
+    flash.read(0x10000, buf)
+    assert buf == b'\xff' * 4
+    flash.write_block(0x10000, b'abcd')
+    flash.read(0x10000, buf)
+    assert buf == b'abcd'
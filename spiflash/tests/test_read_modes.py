@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the SPIFlash read modes."""
+
+import sys
+sys.path.insert(0, '..')
+
+from spiflash import CMD_READ, CMD_READ_HI_SPEED, SPIFlash
+from mockflash import MockFlash, MockQSPI
+
+
+def make_flash(spi=None, **kwargs):
+    mock = MockFlash(spi=spi) if spi else MockFlash()
+    mock.mem[0x100:0x200] = bytes(range(256))
+    return mock, SPIFlash(mock.spi, mock.cs, **kwargs)
+
+
+def test_default_slow_read():
+    mock, flash = make_flash()
+    buf = bytearray(4)
+    flash.read_block(0x110, buf)
+    assert buf == bytes(range(0x10, 0x14))
+    assert mock.read_commands == [CMD_READ]
+
+
+def test_fast_read():
+    mock, flash = make_flash(read_mode='fast')
+    buf = bytearray(4)
+    flash.read_block(0x110, buf)
+    assert buf == bytes(range(0x10, 0x14))
+    assert mock.read_commands == [CMD_READ_HI_SPEED]
+    # Command, address and dummy byte in one transfer, then data
+    assert mock.spi.calls == 2
+
+
+def test_multi_line_modes_need_support():
+    mock, flash = make_flash()
+
+    for mode in ('dual', 'quad'):
+        try:
+            flash.set_read_mode(mode)
+        except ValueError:
+            pass
+        else:
+            assert False, "Expected ValueError"
+
+    assert flash.read_mode == 'slow'
+
+
+def test_multi_line_modes():
+    mock, flash = make_flash(MockQSPI)
+    buf = bytearray(4)
+
+    for mode in ('dual', 'quad'):
+        flash.set_read_mode(mode)
+        flash.read_block(0x1FE, buf)
+        assert buf == b'\xfe\xff\xff\xff'
+
+    assert mock.read_commands == [0x3B, 0x6B]
+    assert mock.spi.lines_used == [2, 4]
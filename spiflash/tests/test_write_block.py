@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for SPIFlash.write_block()."""
+
+import sys
+sys.path.insert(0, '..')
+
+from spiflash import SPIFlash
+from mockflash import CMD_PROGRAM_PAGE, MockFlash
+
+
+def make_flash():
+    mock = MockFlash()
+    return mock, SPIFlash(mock.spi, mock.cs)
+
+
+def test_unaligned_write():
+    mock, flash = make_flash()
+    data = bytes(i * 7 & 0xFF for i in range(1000))
+
+    for addr in (0, 1, 255, 4000):
+        flash.write_block(addr + 8192, data)
+        assert mock.mem[addr + 8192:addr + 8192 + len(data)] == data
+        mock.erase(8192, 8192)
+
+    # 1000 bytes starting at offset 1 touch four pages
+    mock.commands.clear()
+    flash.write_block(1, data)
+    assert mock.commands[CMD_PROGRAM_PAGE] == 4
+
+
+def test_transfers_per_page():
+    mock, flash = make_flash()
+    flash.write_block(0, bytearray(512))
+    # Per page: write enable, command + address, data, status read
+    assert mock.spi.calls == 2 * 5
+
+
+def test_verify():
+    mock, flash = make_flash()
+    flash.write_block(10, b'\x0f' * 300, verify=True)
+    flash.write_block(10, b'\x0f' * 300, verify=True)
+
+    try:
+        # Can't program bits back to 1 without erasing
+        flash.write_block(300, b'\xf0' * 20, verify=True)
+    except OSError:
+        pass
+    else:
+        raise AssertionError("Expected OSError")
@@ -22,74 +22,483 @@ To test, wire the two boards together like this:
 | GND      | GND                   | GND               |
 +----------+-----------------------+-------------------+
 
+``write_data`` and ``read_data`` exchange raw 32-byte messages. ``send`` and
+``recv`` transfer payloads of any length and content as a stream of frames,
+which the sketch on the ESP8266 must implement as well:
+
+Frame (32 bytes):
+
+* byte 0: sequence number (0-255, incremented for each frame)
+* byte 1: payload length (0-28), bit 7 set in the last frame of a payload
+* bytes 2-29: payload, padded with zeros
+* bytes 30-31: CRC-16/CCITT of bytes 0-29 (big-endian)
+
+Status register of the slave (read by the master):
+
+* bits 0-7: sequence number of the last frame received correctly
+* bit 8: ready to receive a frame
+* bit 9: a frame for the master is in the data buffer
+* bits 16-23: sequence number of that frame
+* bits 24-31: count of received frames, which were rejected
+
+Status written by the master:
+
+* bits 0-7: sequence number of the frame read from the slave
+* bit 8: frame was received correctly (ACK), so the slave can load the next
+  one; otherwise (NAK) the slave keeps the frame for reading it again
+
+Optionally, the slave can signal that it has a frame for the master with a
+data-ready GPIO (high while bit 9 of its status is set). The master then
+waits for this pin instead of polling the status register.
+
+``exchange`` and ``stream`` use full-duplex transfers: while a message is
+written with the write data command, the slave must shift out the contents
+of its data buffer, i.e. its response to the previous message. This halves
+the number of transactions compared to ``write_data`` plus ``read_data``.
+
 """
 
-from pyb import Pin, SPI
+try:
+    from pyb import Pin, SPI
+except ImportError:
+    Pin = SPI = None
+
+try:
+    from micropython import schedule
+except ImportError:
+    def schedule(func, arg):
+        func(arg)
+
+try:
+    from time import ticks_diff, ticks_ms
+except ImportError:
+    from time import monotonic
+
+    def ticks_ms():
+        return int(monotonic() * 1000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+try:
+    const
+except NameError:
+    def const(x):
+        return x
+
+FRAME_SIZE = const(32)
+FRAME_PAYLOAD = const(28)
+FRAME_LAST = const(0x80)
+# Slave status bits
+ST_RX_READY = const(0x100)
+ST_TX_READY = const(0x200)
+# Master status bits
+CTL_ACK = const(0x100)
+
+
+def _crc16_table():
+    table = []
+
+    for byte in range(256):
+        crc = byte << 8
+
+        for _ in range(8):
+            crc = (crc << 1 ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xFFFF
+
+        table.append(crc)
+
+    return table
+
+
+CRC16_TABLE = _crc16_table()
+
+
+def crc16(data, crc=0xFFFF):
+    """Return CRC-16/CCITT-FALSE checksum of data."""
+    table = CRC16_TABLE
+
+    for byte in data:
+        crc = (crc << 8 & 0xFF00) ^ table[(crc >> 8) ^ byte]
+
+    return crc
 
 
 class SpiMaster:
-    def __init__(self, bus=1, baudrate=328125, polarity=0, phase=0, ss='A4'):
-        self.ss = Pin(ss, Pin.OUT)
+    """SPI master for the ESP8266 SPISlave protocol.
+
+    ``ss`` is a pin name or a pin object, ``spi`` an already configured SPI
+    bus object with the ``pyb.SPI`` interface. If ``spi`` is not given, bus
+    number ``bus`` is set up with the given parameters.
+
+    ``ready`` is the name or object of the input pin connected to the
+    data-ready output of the slave. If given, ``recv`` doesn't touch the bus
+    until the pin is high, and ``callback(spi_master)`` is called via
+    ``micropython.schedule`` after a rising edge of the pin and again as
+    long as the pin stays high, so it should call ``recv``.
+
+    """
+
+    def __init__(self, bus=1, baudrate=328125, polarity=0, phase=0, ss='A4',
+                 spi=None, retries=3, timeout=100, ready=None, callback=None):
+        self.ss = Pin(ss, Pin.OUT) if isinstance(ss, str) else ss
         self.ss(1)
-        self.spi = SPI(bus, SPI.MASTER, baudrate=baudrate, polarity=polarity,
-                       phase=phase)
-        self.msgbuf = bytearray(32)
-        self.status = bytearray(4)
+        self.ready = Pin(ready, Pin.IN) if isinstance(ready, str) else ready
+        self.callback = callback
+
+        if spi is None:
+            spi = SPI(bus, SPI.MASTER, baudrate=baudrate, polarity=polarity,
+                      phase=phase)
+
+        self.spi = spi
+        self.retries = retries
+        self.timeout = timeout
+        # Command, address byte and 32 data bytes, sent in one transfer
+        self._buf = bytearray(34)
+        self.msgbuf = memoryview(self._buf)[2:]
+        # Number of bytes at the start of msgbuf, which may be non-zero
+        self._msglen = 32
+        # Command and 32-bit status value, sent in one transfer
+        self._status_tx = bytearray(5)
+        self._status_rx = bytearray(5)
+        self.status = memoryview(self._status_rx)[1:]
+        self.retransmits = 0
+        self._frame = bytearray(FRAME_SIZE)
+        self._tx_seq = 0
+        self._rx_seq = 0
+        # Double-buffered receive buffers for full-duplex transfers
+        self._xbufs = (bytearray(34), bytearray(34))
+        self._xviews = tuple(memoryview(buf)[2:] for buf in self._xbufs)
+        self._xindex = 0
+
+        if self.ready is not None:
+            # Bound method references allocate, so create them only once
+            self._on_ready_cb = self._on_ready
+            self.ready.irq(handler=self._irq, trigger=self.ready.IRQ_RISING)
+
+    def _irq(self, pin):
+        # Runs in interrupt context
+        if self.callback is not None:
+            self._schedule()
+
+    def _schedule(self):
+        try:
+            schedule(self._on_ready_cb, None)
+        except RuntimeError:
+            # Schedule queue full, a callback is pending anyway
+            pass
+
+    def _on_ready(self, arg):
+        self.callback(self)
+
+        # No rising edge, if the next payload was ready immediately
+        if self.ready.value():
+            self._schedule()
+
+    def data_ready(self):
+        """Return True if the slave has a frame for the master."""
+        if self.ready is not None:
+            return bool(self.ready.value())
+
+        return bool(self.read_status() & ST_TX_READY)
 
     def write_status(self, status):
+        buf = self._status_tx
+        buf[0] = 0x01
+        buf[1] = status & 0xFF
+        buf[2] = (status >> 8) & 0xFF
+        buf[3] = (status >> 16) & 0xFF
+        buf[4] = (status >> 24) & 0xFF
         self.ss(0)
-        self.spi.send(0x01)
-        self.spi.send(status & 0xFF)
-        self.spi.send((status >> 8) & 0xFF)
-        self.spi.send((status >> 16) & 0xFF)
-        self.spi.send((status >> 24) & 0xFF)
+        self.spi.send(buf)
         self.ss(1)
 
     def read_status(self):
+        tx = self._status_tx
+        tx[0] = 0x04
+        tx[1] = tx[2] = tx[3] = tx[4] = 0
         self.ss(0)
-        self.spi.send(0x04)
-        self.spi.recv(self.status)
+        self.spi.send_recv(tx, self._status_rx)
         self.ss(1)
+        status = self.status
         return (
-            self.status[0] |
-            (self.status[1] << 8) |
-            (self.status[2] << 16) |
-            (self.status[3] << 24)
+            status[0] |
+            (status[1] << 8) |
+            (status[2] << 16) |
+            (status[3] << 24)
         )
 
     def read_data(self):
+        """Receive 32 bytes of data.
+
+        Returns ``msgbuf``, a memoryview of the internal buffer, not a
+        bytearray as in earlier versions. It is overwritten by the next
+        transfer, so use ``bytes(spi.read_data())`` to keep the data or
+        to call ``decode()``.
+
+        """
+        buf = self._buf
+        buf[0] = 0x03
+        buf[1] = 0x00
         self.ss(0)
-        self.spi.send(0x03)
-        self.spi.send(0x00)
-        self.spi.recv(self.msgbuf)
+        self.spi.send_recv(buf, buf)
         self.ss(1)
+        self._msglen = 32
         return self.msgbuf
 
     def read_msg(self, encoding='utf-8'):
-        return bytes(self.read_data()).strip('\0').decode(encoding)
+        return bytes(self.read_data()).strip(b'\0').decode(encoding)
 
     def write_data(self, data):
-        self.msgbuf[:] = data[:32] + b'\0' * (32 - len(data[:32]))
+        """Send up to 32 bytes of data, padded with zeros.
+
+        Doesn't allocate memory, if data is a bytes, bytearray or memoryview
+        of at most 32 bytes.
+
+        """
+        self._fill(data)
         self.ss(0)
-        self.spi.send(0x02)
-        self.spi.send(0x00)
-        self.spi.send(self.msgbuf)
+        self.spi.send(self._buf)
         self.ss(1)
 
+    def exchange(self, data):
+        """Send up to 32 bytes of data and receive 32 bytes at the same time.
 
-if __name__ == '__main__':
-    # Example usage
-    from time import ticks_diff, ticks_ms
-    #from spimaster import SpiMaster
+        Returns the data received during the transfer, which the slave sent in
+        response to the previous message, as a memoryview. Receive buffers
+        are alternated, so the returned data stays valid until the next but
+        one call.
+
+        """
+        self._fill(data)
+        index = self._xindex ^ 1
+        self._xindex = index
+        self.ss(0)
+        self.spi.send_recv(self._buf, self._xbufs[index])
+        self.ss(1)
+        return self._xviews[index]
+
+    def stream(self, messages):
+        """Send messages with full-duplex transfers and yield the responses.
+
+        Each message is sent while receiving the response to the previous
+        one. After the last message, an empty message is sent to fetch the
+        last response, so one response is yielded per message.
+
+        """
+        first = True
+
+        for data in messages:
+            response = self.exchange(data)
+
+            if first:
+                first = False
+            else:
+                yield response
+
+        if not first:
+            yield self.exchange(b'')
 
-    def timeit():
+    def _fill(self, data):
+        buf = self._buf
+        msgbuf = self.msgbuf
+        size = len(data)
+
+        if size > 32:
+            data = memoryview(data)[:32]
+            size = 32
+
+        msgbuf[:size] = data
+
+        # Only the tail left over from the previous message needs zeroing
+        for i in range(size, self._msglen):
+            msgbuf[i] = 0
+
+        self._msglen = size
+        buf[0] = 0x02
+        buf[1] = 0x00
+
+    def send(self, payload):
+        """Send payload of any length as a sequence of checksummed frames.
+
+        Each frame is sent when the slave is ready and resent if the slave
+        rejects it. Raises ``OSError`` if a frame isn't acknowledged after
+        ``retries`` retransmissions.
+
+        """
+        mv = memoryview(payload)
+        length = len(payload)
+        pos = 0
+
+        while True:
+            size = min(length - pos, FRAME_PAYLOAD)
+            last = pos + size >= length
+            self._tx_seq = seq = (self._tx_seq + 1) & 0xFF
+            self._pack_frame(seq, mv[pos:pos + size], last)
+
+            for _ in range(self.retries + 1):
+                status = self._wait_status(ST_RX_READY, ST_RX_READY)
+                errors = status >> 24
+                self.write_data(self._frame)
+                status = self._wait_ack(seq, errors)
+
+                if status & 0xFF == seq:
+                    break
+
+                self.retransmits += 1
+            else:
+                raise OSError("SPI frame %i not acknowledged" % seq)
+
+            if last:
+                return
+
+            pos += size
+
+    def recv(self):
+        """Receive payload sent by the slave as a sequence of frames.
+
+        Frames with a wrong checksum are read again. Raises ``OSError`` if
+        no valid frame can be read after ``retries`` attempts or, with a
+        data-ready pin, if no frame is ready within ``timeout`` ms.
+
+        """
+        payload = bytearray()
+
+        while True:
+            if self.ready is not None:
+                self._wait_ready()
+
+            if self._recv_frame(payload):
+                return bytes(payload)
+
+    def _wait_ready(self):
+        start = ticks_ms()
+
+        while not self.ready.value():
+            if ticks_diff(ticks_ms(), start) > self.timeout:
+                raise OSError("SPI slave timeout (data not ready)")
+
+    def _recv_frame(self, payload):
+        """Read next frame and add its data to payload.
+
+        Returns True if it was the last frame of the payload.
+
+        """
+        frame = self.msgbuf
+        seq = (self._rx_seq + 1) & 0xFF
+
+        for _ in range(self.retries + 1):
+            self._wait_status(ST_TX_READY | 0xFF0000, ST_TX_READY | seq << 16)
+            self.read_data()
+
+            if frame[0] == seq and self._check_frame(frame):
+                break
+
+            # NAK: slave keeps the frame for reading it again
+            self.retransmits += 1
+            self.write_status(seq)
+        else:
+            raise OSError("SPI frame %i not received" % seq)
+
+        self._rx_seq = seq
+        size = frame[1] & 0x7F
+        payload.extend(memoryview(frame)[2:2 + size])
+        self.write_status(seq | CTL_ACK)
+        return bool(frame[1] & FRAME_LAST)
+
+    def _pack_frame(self, seq, data, last):
+        frame = self._frame
+        size = len(data)
+        frame[0] = seq
+        frame[1] = size | (FRAME_LAST if last else 0)
+        frame[2:2 + size] = data
+
+        for i in range(2 + size, 30):
+            frame[i] = 0
+
+        crc = crc16(memoryview(frame)[:30])
+        frame[30] = crc >> 8
+        frame[31] = crc & 0xFF
+
+    def _check_frame(self, frame):
+        if frame[1] & 0x7F > FRAME_PAYLOAD:
+            return False
+
+        return crc16(memoryview(frame)[:30]) == frame[30] << 8 | frame[31]
+
+    def _wait_status(self, mask, value):
+        """Poll slave status until masked bits have given value."""
+        start = ticks_ms()
+
+        while True:
+            status = self.read_status()
+
+            if status & mask == value:
+                return status
+
+            if ticks_diff(ticks_ms(), start) > self.timeout:
+                raise OSError("SPI slave timeout (status 0x%08X)" % status)
+
+    def _wait_ack(self, seq, errors):
+        """Wait until the slave acknowledged or rejected frame seq."""
+        start = ticks_ms()
+
+        while True:
+            status = self.read_status()
+
+            if status & 0xFF == seq or status >> 24 != errors:
+                return status
+
+            if ticks_diff(ticks_ms(), start) > self.timeout:
+                return status
+
+
+def timeit(spi=None, count=1024, data=b'abcdefgh' * 4):
+    """Benchmark raw message transfers and report frames/s and allocations.
+
+    Reports the results for ``write_data``, ``read_data``, ``read_status``,
+    a round trip with ``write_data`` and ``read_data`` and the full-duplex
+    ``exchange``. If ``spi`` is not given, a ``SpiMaster`` on bus 1 with a
+    baudrate of 1/16 of the peripheral clock is used.
+
+    Returns a dict mapping the name of each test to its frames/s.
+
+    """
+    import gc
+
+    if spi is None:
+        import pyb
         spi = SpiMaster(1, baudrate=int(pyb.freq()[3] / 16))
+
+    def round_trip():
+        spi.write_data(data)
+        spi.read_data()
+
+    tests = (
+        ('write_data', lambda: spi.write_data(data)),
+        ('read_data', spi.read_data),
+        ('read_status', spi.read_status),
+        ('write_data + read_data', round_trip),
+        ('exchange', lambda: spi.exchange(data)),
+    )
+    results = {}
+
+    for name, func in tests:
+        gc.collect()
+        mem_alloc = getattr(gc, 'mem_alloc', None)
+        before = mem_alloc() if mem_alloc else 0
         start = ticks_ms()
 
-        for i in range(2 ** 10):
-            spi.write_data(b'abcdefgh' * 4)
-            spi.read_data()
+        for i in range(count):
+            func()
 
-        print("Millisecond ticks elapsed: %i" % ticks_diff(ticks_ms(), start))
+        elapsed = max(ticks_diff(ticks_ms(), start), 1)
+        allocated = mem_alloc() - before if mem_alloc else None
+        results[name] = count * 1000 // elapsed
+        print("%s: %i ms, %i frames/s, %s bytes allocated" %
+              (name, elapsed, results[name], allocated))
 
+    return results
+
+
+if __name__ == '__main__':
     timeit()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Asynchronous receiving for the SpiMaster library.
+
+Usage::
+
+    import asyncio
+    from spimaster_async import AsyncSpiMaster
+
+    async def main():
+        spi = AsyncSpiMaster(ready='B0')
+
+        while True:
+            payload = await spi.recv()
+            print(payload)
+
+    asyncio.run(main())
+
+"""
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+from spimaster import ST_TX_READY, SpiMaster
+
+# CPython's asyncio has no ThreadSafeFlag. An Event can replace it here,
+# because _wait_ready_async() clears the flag after each wake-up, and the pin
+# interrupt of the tests doesn't run in another thread.
+ThreadSafeFlag = getattr(asyncio, 'ThreadSafeFlag', asyncio.Event)
+
+
+class AsyncSpiMaster(SpiMaster):
+    """SpiMaster with a coroutine ``recv``.
+
+    With a data-ready pin (``ready``), ``recv`` waits for its interrupt
+    without touching the bus or using CPU time. Without one, it polls the
+    status register of the slave every ``poll_interval`` milliseconds and
+    yields to other tasks in between.
+
+    Frames of a payload are read as soon as they are ready, without yielding
+    to other tasks in between.
+
+    """
+
+    def __init__(self, *args, poll_interval=10, **kwargs):
+        self.poll_interval = poll_interval
+        self._flag = ThreadSafeFlag()
+        super().__init__(*args, **kwargs)
+
+    def _irq(self, pin):
+        self._flag.set()
+        super()._irq(pin)
+
+    async def recv(self):
+        """Wait for and receive payload sent by the slave."""
+        payload = bytearray()
+
+        while True:
+            await self._wait_ready_async()
+
+            if self._recv_frame(payload):
+                return bytes(payload)
+
+    async def _wait_ready_async(self):
+        if self.ready is None:
+            while not self.read_status() & ST_TX_READY:
+                await asyncio.sleep(self.poll_interval / 1000)
+        else:
+            while not self.ready.value():
+                await self._flag.wait()
+                self._flag.clear()
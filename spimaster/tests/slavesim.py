@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""Python stand-in for the SPISlave sketch on the ESP8266.
+
+Implements the HSPI slave protocol of the SPISlave library (status and data
+registers) and the framing described in ``spimaster.py``. Frames, which are
+written to the slave or read from it, can be corrupted on purpose to test
+error handling.
+
+"""
+
+from binascii import crc_hqx
+
+CMD_WRITE_STATUS = 0x01
+CMD_WRITE_DATA = 0x02
+CMD_READ_DATA = 0x03
+CMD_READ_STATUS = 0x04
+ST_RX_READY = 0x100
+ST_TX_READY = 0x200
+CTL_ACK = 0x100
+
+
+class MockSS:
+    def __init__(self, slave):
+        self.slave = slave
+        self.state = 1
+
+    def __call__(self, state):
+        if state == self.state:
+            return
+
+        self.state = state
+        self.slave.end() if state else self.slave.begin()
+
+
+class ReadyPin:
+    """Data-ready output of the slave, as seen by the master."""
+
+    IN = 0
+    IRQ_RISING = 1
+
+    def __init__(self):
+        self.state = 0
+        self.handler = None
+        self.reads = 0
+
+    def irq(self, handler=None, trigger=IRQ_RISING):
+        self.handler = handler
+
+    def value(self):
+        self.reads += 1
+        return self.state
+
+    def drive(self, state):
+        old, self.state = self.state, state
+
+        if state and not old and self.handler:
+            self.handler(self)
+
+
+class MockSPI:
+    """Bus interface with the ``pyb.SPI`` methods used by SpiMaster."""
+
+    def __init__(self, slave):
+        self.slave = slave
+        self.transfers = 0
+
+    def send(self, data):
+        self.transfers += 1
+        self.slave.receive(bytes([data]) if isinstance(data, int)
+                           else bytes(data))
+
+    def recv(self, buf):
+        self.transfers += 1
+        self.slave.transmit(buf)
+
+    def send_recv(self, send, recv):
+        self.transfers += 1
+        send = bytes(send)
+        # Command and, for data commands, address byte
+        header = 2 if send[0] in (CMD_WRITE_DATA, CMD_READ_DATA) else 1
+        self.slave.receive(send[:header])
+
+        if send[0] in (CMD_READ_DATA, CMD_READ_STATUS):
+            recv[:header] = bytes(header)
+            self.slave.transmit(memoryview(recv)[header:])
+        else:
+            self.slave.receive(send[header:])
+
+
+class SlaveSim:
+    def __init__(self, corrupt_rx=(), corrupt_tx=()):
+        self.ss = MockSS(self)
+        self.spi = MockSPI(self)
+        self.ready = ReadyPin()
+        # Indices of frames to corrupt when written / read by the master
+        self.corrupt_rx = corrupt_rx
+        self.corrupt_tx = corrupt_tx
+        self.data = bytearray(32)
+        self.status = ST_RX_READY
+        self.messages = []
+        self.last_data = None
+        self.master_status = []
+        self.frames_written = 0
+        self.frames_read = 0
+        self._rx_seq = 0
+        self._rx_errors = 0
+        self._rx_payload = bytearray()
+        self._tx_frames = []
+        self._tx_seq = 0
+        self._tx = None
+
+    # SPI transaction
+    def begin(self):
+        self._tx = bytearray()
+
+    def receive(self, data):
+        assert self._tx is not None, "SS not active"
+        self._tx.extend(data)
+
+    def transmit(self, buf):
+        tx = self._tx
+        assert tx is not None, "SS not active"
+
+        if tx[0] == CMD_READ_STATUS:
+            buf[:] = self.status.to_bytes(4, 'little')
+        elif tx[0] == CMD_READ_DATA:
+            assert len(tx) == 2 and len(buf) == 32
+            buf[:] = self.data
+
+            if self.frames_read in self.corrupt_tx:
+                buf[5] ^= 0x10
+
+            self.frames_read += 1
+        else:
+            raise AssertionError("Unexpected read for command 0x%02X" % tx[0])
+
+    def end(self):
+        tx, self._tx = self._tx, None
+        cmd = tx[0]
+
+        if cmd == CMD_WRITE_STATUS:
+            assert len(tx) == 5
+            self.on_status(int.from_bytes(tx[1:5], 'little'))
+        elif cmd == CMD_WRITE_DATA:
+            assert len(tx) == 34
+            self.on_data(bytearray(tx[2:]))
+
+    # Sketch callbacks
+    def on_data(self, frame):
+        self.last_data = bytes(frame)
+
+        if self.frames_written in self.corrupt_rx:
+            frame[3] ^= 0x01
+
+        self.frames_written += 1
+        seq = frame[0]
+        size = frame[1] & 0x7F
+        crc = int.from_bytes(frame[30:32], 'big')
+
+        if (crc_hqx(bytes(frame[:30]), 0xFFFF) != crc or size > 28 or
+                seq != (self._rx_seq + 1) & 0xFF):
+            self._rx_errors = (self._rx_errors + 1) & 0xFF
+        else:
+            self._rx_seq = seq
+            self._rx_payload.extend(frame[2:2 + size])
+
+            if frame[1] & 0x80:
+                self.messages.append(bytes(self._rx_payload))
+                self._rx_payload = bytearray()
+
+        self._update_status()
+
+    def on_status(self, value):
+        self.master_status.append(value)
+
+        if value & CTL_ACK and value & 0xFF == self._tx_seq:
+            self._load_frame()
+
+    # Sending to the master
+    def queue(self, payload):
+        frames = self._tx_frames
+        pending = not frames and not self.status & ST_TX_READY
+        pos = 0
+
+        while True:
+            size = min(len(payload) - pos, 28)
+            last = pos + size >= len(payload)
+            frames.append((payload[pos:pos + size], last))
+
+            if last:
+                break
+
+            pos += size
+
+        if pending:
+            self._load_frame()
+
+    def _load_frame(self):
+        if not self._tx_frames:
+            self.status &= ~ST_TX_READY
+            self._update_status()
+            return
+
+        data, last = self._tx_frames.pop(0)
+        self._tx_seq = seq = (self._tx_seq + 1) & 0xFF
+        frame = bytearray(32)
+        frame[0] = seq
+        frame[1] = len(data) | (0x80 if last else 0)
+        frame[2:2 + len(data)] = data
+        frame[30:32] = crc_hqx(bytes(frame[:30]), 0xFFFF).to_bytes(2, 'big')
+        self.data[:] = frame
+        self.status |= ST_TX_READY
+        self._update_status()
+
+    def _update_status(self):
+        self.status = (self.status & (ST_RX_READY | ST_TX_READY) |
+                       self._rx_seq | self._tx_seq << 16 |
+                       self._rx_errors << 24)
+        self.ready.drive(1 if self.status & ST_TX_READY else 0)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for full-duplex transfers of SpiMaster with a loopback mock."""
+
+import sys
+import time
+sys.path.insert(0, '..')
+
+from spimaster import SpiMaster, timeit
+
+
+class LoopbackSPI:
+    """Slave echoing each message in response, with simulated bus timing.
+
+    A transaction takes ``overhead`` seconds plus the time for clocking the
+    bytes at ``baudrate``.
+
+    """
+
+    def __init__(self, baudrate=1000000, overhead=0.0002):
+        self.baudrate = baudrate
+        self.overhead = overhead
+        self.data = bytearray(32)
+        self.transfers = 0
+
+    def _transfer(self, nbytes):
+        self.transfers += 1
+        time.sleep(self.overhead + nbytes * 8 / self.baudrate)
+
+    def send(self, buf):
+        self._transfer(len(buf))
+
+        if buf[0] == 0x02:
+            self.data[:] = buf[2:34]
+
+    def send_recv(self, send, recv):
+        self._transfer(len(send))
+        cmd = send[0]
+
+        if cmd == 0x04:
+            recv[:] = b'\0\0\1\0\0'
+        elif cmd in (0x02, 0x03):
+            received = bytes(send[2:34])
+            recv[2:34] = self.data
+
+            if cmd == 0x02:
+                self.data[:] = received
+
+
+def make_master():
+    spi = LoopbackSPI()
+    return spi, SpiMaster(ss=lambda state: None, spi=spi)
+
+
+def test_exchange_returns_previous_response():
+    spi, master = make_master()
+    first = master.exchange(b'one')
+    assert bytes(first) == bytes(32)
+    second = master.exchange(b'two')
+    assert bytes(second[:3]) == b'one'
+    # Double buffering: previous response still valid
+    assert bytes(first) == bytes(32)
+    master.exchange(b'three')
+    assert bytes(second[:3]) == b'one'
+
+
+def test_stream():
+    spi, master = make_master()
+    messages = [b'message %i' % i for i in range(10)]
+    responses = [bytes(r).rstrip(b'\0') for r in master.stream(messages)]
+    assert responses == messages
+    # One transfer per message plus one to fetch the last response
+    assert spi.transfers == 11
+    assert list(master.stream([])) == []
+
+
+def test_throughput():
+    spi, master = make_master()
+    data = b'abcdefgh' * 4
+    count = 50
+
+    for i in range(count):
+        master.write_data(data)
+        master.read_data()
+
+    round_trip = spi.transfers
+    spi.transfers = 0
+
+    for i in range(count):
+        master.exchange(data)
+
+    # A full-duplex exchange needs half the bus transactions per message
+    assert round_trip == 2 * count
+    assert spi.transfers == count
+    # Timings depend on the machine, so they are only reported
+    results = timeit(master, count=10)
+    assert sorted(results) == sorted(['write_data', 'read_data',
+                                      'read_status', 'write_data + read_data',
+                                      'exchange'])
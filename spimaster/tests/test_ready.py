@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for data-ready pin handling and AsyncSpiMaster."""
+
+import asyncio
+import sys
+sys.path.insert(0, '..')
+
+import spimaster
+from spimaster import SpiMaster
+from spimaster_async import AsyncSpiMaster
+from slavesim import SlaveSim
+
+PAYLOAD = b'\0binary\0' * 10
+
+
+def make_master(cls=SpiMaster, **kwargs):
+    slave = SlaveSim()
+    return slave, cls(ss=slave.ss, spi=slave.spi, ready=slave.ready,
+                      timeout=20, **kwargs)
+
+
+def test_recv_waits_for_pin():
+    slave, master = make_master()
+
+    try:
+        master.recv()
+    except OSError:
+        pass
+    else:
+        raise AssertionError("Expected OSError")
+
+    # Waiting for data didn't touch the bus
+    assert slave.spi.transfers == 0
+    assert not master.data_ready()
+    slave.queue(PAYLOAD)
+    assert master.data_ready()
+    assert master.recv() == PAYLOAD
+
+
+def test_scheduled_callback():
+    scheduled = []
+    received = []
+    schedule = spimaster.schedule
+    spimaster.schedule = lambda func, arg: scheduled.append((func, arg))
+
+    try:
+        slave, master = make_master(
+            callback=lambda spi: received.append(spi.recv()))
+        slave.queue(PAYLOAD)
+        assert len(scheduled) == 1
+        slave.queue(b'next')
+
+        while scheduled:
+            func, arg = scheduled.pop(0)
+            func(arg)
+    finally:
+        spimaster.schedule = schedule
+
+    assert received == [PAYLOAD, b'next']
+
+
+def test_async_recv():
+    slave, master = make_master(AsyncSpiMaster)
+
+    async def sender():
+        await asyncio.sleep(0.01)
+        # No bus traffic while waiting for data
+        assert slave.spi.transfers == 0
+        slave.queue(PAYLOAD)
+
+    async def main():
+        asyncio.create_task(sender())
+        return await master.recv()
+
+    assert asyncio.run(main()) == PAYLOAD
+    # Pin was only checked when woken up by the interrupt
+    assert slave.ready.reads < 10
+
+
+def test_async_recv_polling():
+    slave = SlaveSim()
+    master = AsyncSpiMaster(ss=slave.ss, spi=slave.spi, poll_interval=1)
+    slave.queue(b'polled')
+    assert asyncio.run(master.recv()) == b'polled'
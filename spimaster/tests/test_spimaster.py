@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the SpiMaster frame transfer layer."""
+
+import sys
+sys.path.insert(0, '..')
+
+from spimaster import SpiMaster, crc16, timeit
+from slavesim import SlaveSim
+
+PAYLOAD = bytes(range(256)) + b'\0\0\0 trailing NULs\0\0'
+
+
+def make_master(**kwargs):
+    slave = SlaveSim(**kwargs)
+    return slave, SpiMaster(ss=slave.ss, spi=slave.spi, timeout=20)
+
+
+def test_crc16():
+    assert crc16(b'123456789') == 0x29B1
+
+
+def test_raw_messages():
+    slave, master = make_master()
+    master.write_data(b'hello')
+    assert slave.frames_written == 1
+    slave.data[:] = b'world'.ljust(32, b'\0')
+    assert master.read_msg() == 'world'
+    master.write_status(0x12345678)
+    assert slave.master_status == [0x12345678]
+    assert master.read_status() & 0x100
+
+
+def test_send():
+    slave, master = make_master()
+    master.send(PAYLOAD)
+    master.send(b'')
+    master.send(b'x' * 28)
+    assert slave.messages == [PAYLOAD, b'', b'x' * 28]
+    # 28 payload bytes per frame
+    assert slave.frames_written == 10 + 1 + 1
+    assert master.retransmits == 0
+
+
+def test_recv():
+    slave, master = make_master()
+    slave.queue(PAYLOAD)
+    slave.queue(b'second')
+    assert master.recv() == PAYLOAD
+    assert master.recv() == b'second'
+    assert master.retransmits == 0
+
+
+def test_retransmit():
+    slave, master = make_master(corrupt_rx=(1, 5), corrupt_tx=(0, 3))
+    master.send(PAYLOAD)
+    assert slave.messages == [PAYLOAD]
+    slave.queue(PAYLOAD)
+    assert master.recv() == PAYLOAD
+    assert master.retransmits == 4
+
+
+def test_give_up():
+    slave, master = make_master(corrupt_rx=range(100))
+
+    try:
+        master.send(b'data')
+    except OSError:
+        pass
+    else:
+        raise AssertionError("Expected OSError")
+
+    assert slave.frames_written == master.retries + 1
+    # Slave not ready
+    slave, master = make_master()
+    slave.status = 0
+
+    try:
+        master.send(b'data')
+    except OSError:
+        pass
+    else:
+        raise AssertionError("Expected OSError")
+
+
+def test_single_transfers():
+    slave, master = make_master()
+    spi = slave.spi
+    master.write_status(0x01020304)
+    assert master.read_status() == slave.status
+    master.write_data(b'abc')
+    master.read_data()
+    assert spi.transfers == 4
+
+
+def test_write_data_zeroes_tail():
+    slave, master = make_master()
+    master.write_data(b'x' * 40)
+    assert slave.last_data == b'x' * 32
+    master.write_data(bytearray(b'short'))
+    assert slave.last_data == b'short' + bytes(27)
+    master.write_data(memoryview(b'0123456789')[2:5])
+    assert slave.last_data == b'234' + bytes(29)
+    # Received data in msgbuf is cleared as well
+    slave.data[:] = b'y' * 32
+    master.read_data()
+    master.write_data(b'')
+    assert slave.last_data == bytes(32)
+
+
+def test_timeit():
+    slave, master = make_master()
+    master.write_data(b'abcdefgh' * 4)
+    slave.frames_written = 0
+    results = timeit(master, count=10)
+    assert set(results) == {'write_data', 'read_data', 'read_status',
+                            'write_data + read_data', 'exchange'}
+    # write_data, round trip and exchange
+    assert slave.frames_written == 30
+    assert slave.frames_read == 20